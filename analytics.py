@@ -1,217 +1,202 @@
-import pandas as pd
+"""
+The twelve recipe insights as a library, with a thin CLI on top.
 
-# ---------------------- Load CSV Files ----------------------
-recipes = pd.read_csv("recipes.csv")
-ingredients = pd.read_csv("ingredients.csv")
-interactions = pd.read_csv("interactions.csv")
+    from analytics import compute_insights
+    compute_insights(["avg_prep_time"])      # {'avg_prep_time': 27.5}
 
-analytics_output = []   # list to store final CSV rows
+Importing this module does not import pandas or numpy: the analytics
+engine (and with it the tables) is only loaded for insights that are not
+already in the result cache.
 
+Usage:
+- python analytics.py                          all insights + analytics_output.csv
+- python analytics.py --insight top_rated      print one insight
+"""
 
-# ---------------------- INSIGHT 1: Most Common Ingredients ----------------------
-most_common_ingredients = (
-    ingredients["ingredient_name"]
-    .str.lower()
-    .value_counts()
-    .head(10)
-)
+import argparse
+from collections import namedtuple
 
-analytics_output.append({
-    "insight_name": "Most Common Ingredients (Top 10)",
-    "insight_value": most_common_ingredients.to_string()
-})
+import instrument
+from result_cache import ENGINE_MODULES, ResultCache, inputs_fingerprint, make_key, module_fingerprint
 
-print("\n1️⃣ MOST COMMON INGREDIENTS:")
-print(most_common_ingredients)
+OUTPUT_FILE = "analytics_output.csv"
 
+# One insight: the engine method computing it, its row in analytics_output.csv,
+# the heading printed above it, and how its value is written and printed
+Insight = namedtuple("Insight", ["name", "title", "heading", "text", "display"])
 
-# ---------------------- INSIGHT 2: Average Preparation Time ----------------------
-recipes["prep_time"] = pd.to_numeric(recipes["prep_time"], errors="ignore")
-avg_prep_time = recipes["prep_time"].mean()
 
-analytics_output.append({
-    "insight_name": "Average Preparation Time",
-    "insight_value": f"{avg_prep_time:.2f} minutes"
-})
+def _table(value):
+    return value.to_string()
 
-print("\n2️⃣ AVERAGE PREPARATION TIME:")
-print(f"{avg_prep_time:.2f} minutes")
 
+def _as_is(value):
+    return value
 
-# ---------------------- INSIGHT 3: Average Cooking Time ----------------------
-recipes["cook_time"] = pd.to_numeric(recipes["cook_time"], errors="ignore")
-avg_cook_time = recipes["cook_time"].mean()
 
-analytics_output.append({
-    "insight_name": "Average Cooking Time",
-    "insight_value": f"{avg_cook_time:.2f} minutes"
-})
+def _minutes(value):
+    return f"{value:.2f} minutes"
 
-print("\n3️⃣ AVERAGE COOK TIME:")
-print(f"{avg_cook_time:.2f} minutes")
 
+def _two_decimals(value):
+    return f"{value:.2f}"
 
-# ---------------------- INSIGHT 4: Difficulty Distribution ----------------------
-difficulty_distribution = recipes["difficulty"].value_counts()
 
-analytics_output.append({
-    "insight_name": "Difficulty Distribution",
-    "insight_value": difficulty_distribution.to_string()
-})
+INSIGHTS = [
+    # ---------------------- INSIGHT 1: Most Common Ingredients ----------------------
+    Insight("most_common_ingredients", "Most Common Ingredients (Top 10)",
+            "1️⃣ MOST COMMON INGREDIENTS:", _table, _as_is),
 
-print("\n4️⃣ DIFFICULTY DISTRIBUTION:")
-print(difficulty_distribution)
+    # ---------------------- INSIGHT 2: Average Preparation Time ----------------------
+    Insight("avg_prep_time", "Average Preparation Time",
+            "2️⃣ AVERAGE PREPARATION TIME:", _minutes, _minutes),
 
+    # ---------------------- INSIGHT 3: Average Cooking Time ----------------------
+    Insight("avg_cook_time", "Average Cooking Time",
+            "3️⃣ AVERAGE COOK TIME:", _minutes, _minutes),
 
-# ---------------------- INSIGHT 5: Correlation Between Prep Time & Likes ----------------------
-interactions["likes"] = pd.to_numeric(interactions["likes"], errors="coerce")
-merged = pd.merge(recipes, interactions, on="recipe_id")
+    # ---------------------- INSIGHT 4: Difficulty Distribution ----------------------
+    Insight("difficulty_distribution", "Difficulty Distribution",
+            "4️⃣ DIFFICULTY DISTRIBUTION:", _table, _as_is),
 
-correlation = merged["prep_time"].corr(merged["likes"])
+    # ---------------------- INSIGHT 5: Correlation Between Prep Time & Likes ----------------------
+    Insight("prep_likes_correlation", "Correlation (Prep Time vs Likes)",
+            "5️⃣ CORRELATION: Prep Time vs Likes:",
+            lambda value: f"{value:.3f}", lambda value: f"Correlation score: {value:.3f}"),
 
-analytics_output.append({
-    "insight_name": "Correlation (Prep Time vs Likes)",
-    "insight_value": f"{correlation:.3f}"
-})
+    # ---------------------- INSIGHT 6: Most Viewed Recipes ----------------------
+    Insight("most_viewed", "Most Viewed Recipes (Top 10)",
+            "6️⃣ MOST VIEWED RECIPES:", _table, _as_is),
 
-print("\n5️⃣ CORRELATION: Prep Time vs Likes:")
-print(f"Correlation score: {correlation:.3f}")
+    # ---------------------- INSIGHT 7: Ingredients With High Engagement ----------------------
+    Insight("high_engagement_ingredients", "High Engagement Ingredients (Top 10)",
+            "7️⃣ INGREDIENTS WITH HIGHEST AVERAGE LIKES:", _table, _as_is),
 
+    # ---------------------- INSIGHT 8: Top Rated Recipes ----------------------
+    Insight("top_rated", "Top Rated Recipes (Top 10)",
+            "8️⃣ TOP RATED RECIPES:", _table, _as_is),
 
-# ---------------------- INSIGHT 6: Most Viewed Recipes ----------------------
-interactions["views"] = pd.to_numeric(interactions["views"], errors="coerce")
-
-most_viewed = (
-    merged.groupby("name")["views"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "Most Viewed Recipes (Top 10)",
-    "insight_value": most_viewed.to_string()
-})
-
-print("\n6️⃣ MOST VIEWED RECIPES:")
-print(most_viewed)
-
-
-# ---------------------- INSIGHT 7: Ingredients With High Engagement ----------------------
-merged_ing = pd.merge(ingredients, interactions, on="recipe_id")
-
-high_engagement_ingredients = (
-    merged_ing.groupby("ingredient_name")["likes"]
-    .mean()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "High Engagement Ingredients (Top 10)",
-    "insight_value": high_engagement_ingredients.to_string()
-})
-
-print("\n7️⃣ INGREDIENTS WITH HIGHEST AVERAGE LIKES:")
-print(high_engagement_ingredients)
-
-
-# ---------------------- INSIGHT 8: Top Rated Recipes ----------------------
-interactions["rating"] = pd.to_numeric(interactions["rating"], errors="coerce")
-
-top_rated = (
-    merged.groupby("name")["rating"]
-    .mean()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "Top Rated Recipes (Top 10)",
-    "insight_value": top_rated.to_string()
-})
-
-print("\n8️⃣ TOP RATED RECIPES:")
-print(top_rated)
-
-
-# ---------------------- INSIGHT 9: Most Liked Recipes ----------------------
-most_liked = (
-    merged.groupby("name")["likes"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "Most Liked Recipes (Top 10)",
-    "insight_value": most_liked.to_string()
-})
-
-print("\n9️⃣ MOST LIKED RECIPES:")
-print(most_liked)
-
-
-# ---------------------- INSIGHT 10: Avg Ingredients Per Recipe ----------------------
-ingredients_per_recipe = (
-    ingredients.groupby("recipe_id")["ingredient_name"]
-    .count()
-    .mean()
-)
-
-analytics_output.append({
-    "insight_name": "Average Ingredients Per Recipe",
-    "insight_value": f"{ingredients_per_recipe:.2f}"
-})
-
-print("\n🔟 AVERAGE INGREDIENT COUNT:")
-print(f"{ingredients_per_recipe:.2f}")
-
-
-# ---------------------- INSIGHT 11: Recipes With Most Ingredients ----------------------
-most_ingredients = (
-    ingredients.groupby("recipe_id")["ingredient_name"]
-    .count()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "Recipes With Most Ingredients (Top 10)",
-    "insight_value": most_ingredients.to_string()
-})
-
-print("\n1️⃣1️⃣ RECIPES WITH MOST INGREDIENTS:")
-print(most_ingredients)
-
-
-# ---------------------- INSIGHT 12: Highest Total Engagement ----------------------
-merged["total_engagement"] = (
-    merged["likes"] +
-    merged["views"] +
-    merged["cook_attempts"]
-)
-
-top_engagement = (
-    merged.groupby("name")["total_engagement"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-analytics_output.append({
-    "insight_name": "Highest Engagement Recipes (Top 10)",
-    "insight_value": top_engagement.to_string()
-})
-
-print("\n1️⃣2️⃣ HIGHEST ENGAGEMENT RECIPES:")
-print(top_engagement)
-
-
-# ---------------------- SAVE OUTPUT TO CSV ----------------------
-output_df = pd.DataFrame(analytics_output)
-output_df.to_csv("analytics_output.csv", index=False)
-
-print("\n📁 'analytics_output.csv' has been created successfully!")
+    # ---------------------- INSIGHT 9: Most Liked Recipes ----------------------
+    Insight("most_liked", "Most Liked Recipes (Top 10)",
+            "9️⃣ MOST LIKED RECIPES:", _table, _as_is),
 
+    # ---------------------- INSIGHT 10: Avg Ingredients Per Recipe ----------------------
+    Insight("avg_ingredients_per_recipe", "Average Ingredients Per Recipe",
+            "🔟 AVERAGE INGREDIENT COUNT:", _two_decimals, _two_decimals),
 
+    # ---------------------- INSIGHT 11: Recipes With Most Ingredients ----------------------
+    Insight("most_ingredients", "Recipes With Most Ingredients (Top 10)",
+            "1️⃣1️⃣ RECIPES WITH MOST INGREDIENTS:", _table, _as_is),
+
+    # ---------------------- INSIGHT 12: Highest Total Engagement ----------------------
+    Insight("top_engagement", "Highest Engagement Recipes (Top 10)",
+            "1️⃣2️⃣ HIGHEST ENGAGEMENT RECIPES:", _table, _as_is),
+]
+INSIGHTS_BY_NAME = {insight.name: insight for insight in INSIGHTS}
+
+
+# ---------------------- Library API ----------------------
+def insight_getter(engine=None, cache=None, content_hash=False, **engine_options):
+    """
+    Return insight(name) -> value of engine.<name>(), served from the
+    result cache when the input tables and the engine code are unchanged.
+
+    Without an engine, an AnalyticsEngine(**engine_options) is created on
+    the first cache miss.
+    """
+    if cache is not None:
+        inputs = inputs_fingerprint(content_hash=content_hash)
+        definition = module_fingerprint(*ENGINE_MODULES)
+    engines = [engine]
+
+    def compute(name):
+        if engines[0] is None:
+            from analytics_engine import AnalyticsEngine
+            engines[0] = AnalyticsEngine(**engine_options)
+        return getattr(engines[0], name)()
+
+    def insight(name):
+        with instrument.stage(f"insight:{name}"):
+            if cache is None:
+                return compute(name)
+            key = make_key("insight", name, definition, inputs)
+            return cache.get_or_compute(key, lambda: compute(name), label=f"insight:{name}")
+    return insight
+
+
+def compute_insights(names=None, engine=None, cache=None, content_hash=False, **engine_options):
+    """
+    Values of the named insights (default: all twelve, in report order)
+    as a dict. Nothing is printed or written.
+    """
+    names = list(names) if names else [insight.name for insight in INSIGHTS]
+    unknown = [name for name in names if name not in INSIGHTS_BY_NAME]
+    if unknown:
+        raise ValueError(f"Unknown insight(s): {', '.join(unknown)}")
+
+    insight = insight_getter(engine, cache, content_hash, **engine_options)
+    return {name: insight(name) for name in names}
+
+
+def print_insights(values):
+    for name, value in values.items():
+        insight = INSIGHTS_BY_NAME[name]
+        print(f"\n{insight.heading}")
+        print(insight.display(value))
+
+
+def save_insights(values, output_file=OUTPUT_FILE):
+    """Write the insights as (insight_name, insight_value) rows."""
+    import pandas as pd
+
+    rows = [
+        {"insight_name": INSIGHTS_BY_NAME[name].title, "insight_value": INSIGHTS_BY_NAME[name].text(value)}
+        for name, value in values.items()
+    ]
+    with instrument.stage(f"save_csv:{output_file}", rows_in=len(rows)) as st:
+        pd.DataFrame(rows).to_csv(output_file, index=False)
+        st.rows_out = len(rows)
+        st.bytes_written = instrument.file_size(output_file)
+    return rows
+
+
+# ---------------------- CLI ----------------------
+def run_analytics(engine=None, cache=None, content_hash=False, chunk_size=None, workers=None):
+    """
+    Compute the twelve insights, print them and save 'analytics_output.csv'.
+    With chunk_size, interactions are streamed in chunks of that many rows;
+    with workers > 1 they are aggregated on that many processes.
+    """
+    values = compute_insights(engine=engine, cache=cache, content_hash=content_hash,
+                              chunk_size=chunk_size, workers=workers)
+    print_insights(values)
+    analytics_output = save_insights(values)
+
+    print(f"\n📁 '{OUTPUT_FILE}' has been created successfully!")
+    return analytics_output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the recipe insights.")
+    parser.add_argument("--insight", action="append", choices=list(INSIGHTS_BY_NAME), metavar="NAME",
+                        help="only compute and print this insight (repeatable; no CSV is written)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every insight instead of reusing cached results")
+    parser.add_argument("--hash-inputs", action="store_true",
+                        help="fingerprint inputs by content hash instead of mtime+size")
+    parser.add_argument("--chunk-size", type=int, default=None, metavar="ROWS",
+                        help="aggregate interactions in chunks of ROWS rows (bounded memory)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="aggregate interactions on this many processes")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    cache = None if args.no_cache else ResultCache()
+    if args.insight:
+        print_insights(compute_insights(args.insight, cache=cache, content_hash=args.hash_inputs,
+                                        chunk_size=args.chunk_size, workers=args.workers))
+    else:
+        run_analytics(cache=cache, content_hash=args.hash_inputs,
+                      chunk_size=args.chunk_size, workers=args.workers)
+    instrument.finish()
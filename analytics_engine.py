@@ -0,0 +1,819 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from columnar import PARQUET_SUFFIX, iter_table, load_table, table_state, to_numeric
+from fact_store import InteractionFacts, open_fact_store
+from ingredient_dim import DIM_TABLE, LINK_TABLE, MISSING_KEY, IngredientVocabulary, load_links_state
+from online_stats import CoMoments, Moments
+from recipe_stats import open_recipe_stats
+
+# ---------------------- Columns Used by the Analytics ----------------------
+RECIPE_COLUMNS = ["recipe_id", "name", "prep_time", "cook_time", "difficulty"]
+INGREDIENT_COLUMNS = ["recipe_id", "ingredient_name"]
+INTERACTION_COLUMNS = ["recipe_id", "views", "likes", "rating", "cook_attempts"]
+
+METRICS = ["views", "likes", "rating", "cook_attempts"]
+TOP_N = 10
+
+
+# ---------------------- Load & Coerce ----------------------
+def load_recipes():
+    recipes = load_table("recipes", columns=RECIPE_COLUMNS)
+    for col in ("prep_time", "cook_time"):
+        recipes[col] = to_numeric(recipes[col])
+    return recipes
+
+
+def load_ingredients():
+    return load_table("ingredients", columns=INGREDIENT_COLUMNS)
+
+
+def load_interactions():
+    interactions = load_table("interactions", columns=INTERACTION_COLUMNS)
+    for col in METRICS:
+        interactions[col] = to_numeric(interactions[col])
+    return interactions
+
+
+def load_tables():
+    """
+    Load the three tables once (Parquet if present, else CSV) with numeric
+    columns coerced; unparseable values become NaN.
+    """
+    return load_recipes(), load_ingredients(), load_interactions()
+
+
+# ---------------------- Per-Recipe Aggregates ----------------------
+# Float sums (ratings, and any metric column with unparseable values) are
+# computed exactly and rounded once, so they do not depend on row order or
+# on how the rows were split: the in-memory, fact-store and chunked paths
+# give the same bits, and rankings with ties come out the same.
+#
+# An exact sum is an integer in units of 2**-EXACT_SHIFT, held as int64
+# limbs of LIMB_BITS bits each: limb i weighs 2**(LIMB_BITS * i) units.
+# Partials carry the limbs of a sum column as int64 columns "<col>@<i>"
+# over a contiguous range of i, plus a float column "<col>@inf" with the
+# sum of the infinite values, which have no integer form (see
+# exact_columns). Limbs of the same groups add up with +; carrying
+# (_normalize) brings them back to LIMB_BITS bits.
+EXACT_SHIFT = 1127          # every finite float64 is an integer multiple of 2**-1127
+LIMB_BITS = 32
+_LIMB_MASK = (1 << LIMB_BITS) - 1
+_BLOCK_ROWS = 1 << 19       # bincount of shares below 2**33 stays exact up to this many rows
+_CARRY_EVERY = 1 << 30      # partials added before the limbs are carried
+
+
+def _limb_parts(values, shift):
+    """
+    Split int64 values * 2**shift over three limbs: returns (q, parts),
+    parts[j] being each value's (signed) share of limb q + j.
+    """
+    q, r = shift // LIMB_BITS, shift % LIMB_BITS
+    low = (values & _LIMB_MASK) << r
+    high = (values >> LIMB_BITS) << r
+    return q, (low & _LIMB_MASK, (low >> LIMB_BITS) + (high & _LIMB_MASK), high >> LIMB_BITS)
+
+
+def _carry(limbs):
+    """Carry every limb but the top one into [0, 2**LIMB_BITS), in place."""
+    for j in range(len(limbs) - 1):
+        limbs[j + 1] += limbs[j] >> LIMB_BITS
+        limbs[j] &= _LIMB_MASK
+
+
+def _normalize(lo, limbs):
+    """
+    Carry the limbs (in place) and drop the columns that hold no digits:
+    zero limbs at the bottom, and top limbs that are 0 or -1 (a sign) in
+    every group, folded into the limb below. The result depends only on
+    the sums, not on how they were added up.
+    """
+    _carry(limbs)
+    hi = len(limbs)
+    while hi:
+        top = limbs[hi - 1]
+        if not ((top == 0) | (top == -1)).all() or (hi == 1 and top.any()):
+            break
+        if hi > 1:
+            limbs[hi - 2] += top << LIMB_BITS
+        hi -= 1
+    bottom = 0
+    while bottom < hi and not limbs[bottom].any():
+        bottom += 1
+    return (lo + bottom if bottom < hi else 0), limbs[bottom:hi]
+
+
+def exact_sums(codes, values, n_groups):
+    """
+    Exact per-group sums of float values (NaN skipped) as (lo, limbs, inf):
+    limbs is a (width, n_groups) int64 array, limbs[j] being limb lo + j
+    of every group, and inf the per-group sum of the infinite values (None
+    if there are none). Each value's integer mantissa, shifted by its
+    exponent, is split into its shares of three limbs, which are summed
+    per group with bincount.
+    """
+    inf = None
+    infinite = np.isinf(values)
+    if infinite.any():
+        inf = np.zeros(n_groups)
+        np.add.at(inf, codes[infinite], values[infinite])
+    keep = np.isfinite(values) & (values != 0)
+    codes, values = codes[keep].astype(np.int64), values[keep]
+    if not len(values):
+        return 0, np.zeros((0, n_groups), dtype=np.int64), inf
+
+    mantissa, exponent = np.frexp(values)
+    q, parts = _limb_parts((mantissa * 2.0 ** 53).astype(np.int64), exponent.astype(np.int64) + 1074)
+    lo = int(q.min())
+    width = int(q.max()) - lo + 3
+    limbs = np.zeros((width, n_groups), dtype=np.int64)
+    for start in range(0, len(values), _BLOCK_ROWS):
+        block = slice(start, start + _BLOCK_ROWS)
+        at = (q[block] - lo) * n_groups + codes[block]
+        limbs += np.bincount(np.concatenate([at, at + n_groups, at + 2 * n_groups]),
+                             weights=np.concatenate([part[block] for part in parts]),
+                             minlength=limbs.size).astype(np.int64).reshape(limbs.shape)
+        _carry(limbs)
+    return (*_normalize(lo, limbs), inf)
+
+
+def _integer_exact_sums(sums):
+    """Integer sums in exact_sums form."""
+    sums = np.asarray(sums, dtype=np.int64)
+    q, parts = _limb_parts(sums, EXACT_SHIFT)
+    return (*_normalize(q, np.stack(parts)), None)
+
+
+def _exact_ints(lo, limbs):
+    """Exact sums as Python ints in units of 2**-EXACT_SHIFT."""
+    return [sum(limb << (LIMB_BITS * (lo + j)) for j, limb in enumerate(group)) for group in limbs.T.tolist()]
+
+
+def exact_to_float(lo, limbs, inf=None):
+    """
+    Round exact sums to the nearest float64, ties to even, as dividing the
+    Python int total would: returns (floats, exact), exact marking the sums
+    the float is equal to. The top 64 bits of each magnitude are rounded
+    to odd at 62 bits and converted to float, which rounds correctly; only
+    sums outside the normal float range are divided as Python ints.
+    """
+    n = limbs.shape[1]
+    padded = np.zeros((len(limbs) + 3, n), dtype=np.int64)
+    padded[2:-1] = limbs
+    lo -= 2
+    _carry(padded)
+    negative = padded[-1] < 0
+    padded[:, negative] *= -1
+    _carry(padded)
+
+    nonzero = padded != 0
+    zero = ~nonzero.any(axis=0)
+    groups = np.arange(n)
+    k = np.where(zero, 2, len(padded) - 1 - np.argmax(nonzero[::-1], axis=0))
+    # The 64 bits from the top of the magnitude down, and whether any bit
+    # below them is set
+    top = np.where(zero, 1, padded[k, groups])
+    bits = np.frexp(top.astype(np.float64))[1]
+    s = (LIMB_BITS - bits).astype(np.uint64)
+    low = padded[k - 2, groups].astype(np.uint64)
+    window = ((top.astype(np.uint64) << (np.uint64(LIMB_BITS) + s))
+              | (padded[k - 1, groups].astype(np.uint64) << s)
+              | (low >> (np.uint64(LIMB_BITS) - s)))
+    below = np.cumsum(nonzero, axis=0)[k - 2, groups] > nonzero[k - 2, groups]
+    sticky = (((low << s) & np.uint64(_LIMB_MASK)) != 0) | below
+    rounded = ((window >> np.uint64(2)) | ((window & np.uint64(3)) != 0) | sticky).astype(np.int64)
+    floats = rounded.astype(np.float64)
+    values = np.ldexp(floats, LIMB_BITS * (lo + k - 1) - s.astype(np.int64) + 2 - EXACT_SHIFT)
+    exact = ~sticky & ((window & np.uint64(3)) == 0) & (floats.astype(np.int64) == rounded)
+    values[zero], exact[zero] = 0.0, True
+
+    magnitude = LIMB_BITS * (lo + k) + bits - EXACT_SHIFT     # 2**(magnitude - 1) <= |sum| < 2**magnitude
+    slow = np.flatnonzero(~zero & ((magnitude < -1021) | (magnitude > 1023)))
+    for group, total in zip(slow, _exact_ints(lo + 2, padded[2:, slow])):
+        values[group] = total / (1 << EXACT_SHIFT)
+    exact[slow] = False
+    values[negative] *= -1
+    if inf is not None:
+        infinite = inf != 0
+        values[infinite], exact[infinite] = inf[infinite], False
+    return values, exact
+
+
+def exact_columns(col, sums):
+    """The partial columns of column col's exact sums (lo, limbs, inf)."""
+    lo, limbs, inf = sums
+    columns = {f"{col}@{lo + j}": limbs[j] for j in range(len(limbs))}
+    if inf is not None:
+        columns[f"{col}@inf"] = inf
+    return columns
+
+
+def _limb_numbers(columns, col):
+    prefix = f"{col}@"
+    return sorted(int(name[len(prefix):]) for name in columns
+                  if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+
+def read_exact(columns, col, n):
+    """Column col's exact sums (lo, limbs, inf) from the partial columns of n groups."""
+    numbers = _limb_numbers(columns, col)
+    lo = numbers[0] if numbers else 0
+    limbs = np.zeros((numbers[-1] - lo + 1 if numbers else 0, n), dtype=np.int64)
+    for i in numbers:
+        limbs[i - lo] = columns[f"{col}@{i}"]
+    inf = columns.get(f"{col}@inf")
+    return lo, limbs, (None if inf is None else np.asarray(inf, dtype=np.float64))
+
+
+def _normalize_columns(columns, n):
+    """Partial columns of n groups with every exact sum's limbs normalized."""
+    columns = dict(columns)
+    for col in {name.partition("@")[0] for name in columns if "@" in name}:
+        lo, limbs, inf = read_exact(columns, col, n)
+        for i in _limb_numbers(columns, col):
+            del columns[f"{col}@{i}"]
+        columns.update(exact_columns(col, (*_normalize(lo, limbs), inf)))
+    return {name: columns[name] for name in sorted(columns, key=_column_order)}
+
+
+def _column_order(name):
+    col, _, limb = name.partition("@")
+    return PARTIAL_COLUMNS.index(col), limb == "inf", int(limb) if limb.isdigit() else 0
+
+
+def _add_sums(totals, sums, at=slice(None)):
+    """
+    totals[name][at] += sums[name] for every column of sums, in place.
+    Columns totals does not have yet start at zero; an exact sum's limbs
+    are kept a contiguous range, so they can be carried.
+    """
+    size = len(totals["interactions"])
+    for name, values in sums.items():
+        if name not in totals:
+            totals[name] = np.zeros(size, dtype=values.dtype)
+        totals[name][at] += values
+    for col in {name.partition("@")[0] for name in sums if "@" in name}:
+        numbers = _limb_numbers(totals, col)
+        for i in range(numbers[0], numbers[-1] + 1) if numbers else ():
+            totals.setdefault(f"{col}@{i}", np.zeros(size, dtype=np.int64))
+
+
+def dense_sums(codes, n_groups, metrics):
+    """
+    The sums and counts of aggregate_codes as dense arrays indexed by code
+    (0 .. n_groups - 1), groups without rows included. Integer sums are
+    int64; float sums are the exact_columns of their exact_sums. The
+    arrays of the same groups add up with _add_sums.
+    """
+    codes = np.asarray(codes)
+    keep = codes >= 0
+    codes = codes[keep]
+
+    def total(col, values):
+        values = np.asarray(values)[keep]
+        if values.dtype.kind in "iu":
+            if len(values) and int(np.abs(values).max()) * len(values) >= 1 << 53:
+                # bincount sums in float64, which is exact only below 2**53
+                sums = np.zeros(n_groups, dtype=np.int64)
+                np.add.at(sums, codes, values.astype(np.int64))
+                return {col: sums}
+            return {col: np.bincount(codes, weights=values, minlength=n_groups).astype(np.int64)}
+        return exact_columns(col, exact_sums(codes, values, n_groups))
+
+    def count(values=None):
+        if values is not None:
+            values = np.asarray(values)[keep]
+            if values.dtype.kind == "f":
+                return np.bincount(codes[~np.isnan(values)], minlength=n_groups)
+        return np.bincount(codes, minlength=n_groups)
+
+    likes = np.asarray(metrics["likes"])
+    return {
+        **total("views", metrics["views"]),
+        **total("likes", likes),
+        "likes_count": count(likes),
+        **total("likes_sq", likes ** 2),
+        **total("rating_sum", metrics["rating"]),
+        "rating_count": count(metrics["rating"]),
+        **total("cook_attempts", metrics["cook_attempts"]),
+        "interactions": count(),
+    }
+
+
+def _float_metrics(metrics):
+    return {col for col, values in metrics.items() if np.asarray(values).dtype.kind == "f"}
+
+
+def _frame(columns, recipe_ids):
+    """DataFrame of dense arrays, keeping their dtypes."""
+    index = pd.Index(recipe_ids, dtype=object, name="recipe_id")
+    return pd.DataFrame({col: pd.Series(values, index=index, dtype=values.dtype, copy=False)
+                         for col, values in columns.items()}, index=index)
+
+
+def _sums_partial(sums, recipe_ids, float_metrics):
+    """A partial from dense_sums arrays, keeping the recipes that have interactions."""
+    aggs = _frame({name: sums[name] for name in sorted(sums, key=_column_order)}, recipe_ids)
+    return aggs[aggs["interactions"].to_numpy() > 0], float_metrics
+
+
+def aggregate_codes(codes, recipe_ids, metrics, exact=False):
+    """
+    Reduce interactions to one row per recipe_id, given each row's code
+    into recipe_ids (-1: no recipe_id) and the coerced metric arrays.
+
+    Sums skip missing values, and the *_count columns count the values
+    that were present, so means and the prep-time/likes correlation can
+    be rebuilt exactly from these columns. Integer columns sum to int64,
+    float columns to float64. With exact=True float sums are left as the
+    limb columns of their exact sums (see exact_sums) and the derived
+    columns are left out, for adding up partial aggregates (see
+    finish_partial).
+    """
+    partial = _sums_partial(dense_sums(codes, len(recipe_ids), metrics), recipe_ids, _float_metrics(metrics))
+    return partial[0] if exact else finish_partial(partial)
+
+
+def aggregate_interactions(interactions, workers=None):
+    """
+    Per-recipe aggregates of an interactions DataFrame (see aggregate_codes).
+    With workers > 1 the rows are split into one slice per worker.
+    """
+    if workers and workers > 1:
+        step = -(-len(interactions) // workers) or 1
+        slices = (interactions.iloc[start:start + step] for start in range(0, len(interactions), step))
+        return aggregate_chunks(slices, workers)
+    codes, recipe_ids = pd.factorize(interactions["recipe_id"].astype(object), sort=True)
+    return aggregate_codes(codes, recipe_ids, {col: interactions[col].to_numpy() for col in METRICS})
+
+
+def aggregate_facts(facts, workers=None):
+    """
+    Per-recipe aggregates straight from the memory-mapped fact store columns.
+    With workers > 1 each worker process maps the store itself and
+    aggregates one slice of rows, so nothing is copied between processes.
+    """
+    if workers and workers > 1:
+        # Every slice codes recipes the same way, so their dense sums add
+        # up column by column, with no index alignment
+        recipe_ids = facts.ids("recipe_id")
+        step = -(-len(facts) // workers) or 1
+        jobs = ((facts.fact_dir, len(recipe_ids), start, start + step) for start in range(0, len(facts), step))
+        totals = None
+        for sums in map_partials(_facts_sums, jobs, workers):
+            if totals is None:
+                totals = sums
+            else:
+                _add_sums(totals, sums)
+        if totals is None:
+            return finish_partial(None)
+        float_metrics = _float_metrics({col: facts.column(col) for col in METRICS})
+        return finish_partial(_sums_partial(totals, recipe_ids, float_metrics))
+    metrics = {col: facts.column(col) for col in METRICS}
+    return aggregate_codes(facts.column("recipe_code"), facts.ids("recipe_id"), metrics)
+
+
+def aggregate_chunks(chunks, workers=None):
+    """
+    aggregate_interactions over an iterable of interaction DataFrames.
+    Each chunk is reduced to exact per-recipe partial sums and counts,
+    which are added to the running totals before the next chunk is read,
+    so memory is bounded by the chunk size plus one row per recipe. The
+    result is identical to aggregating the whole table at once. With
+    workers > 1 the chunks are reduced in a process pool.
+    """
+    return combine_partials(chunk_partials(chunks, workers))
+
+
+# ---------------------- Partial Aggregates ----------------------
+# A partial is (aggregate_codes(..., exact=True), names of the metrics that
+# were float). Partials of any split of the rows add up to the aggregate
+# of the whole table, bit for bit.
+def _exact_partial(codes, recipe_ids, metrics):
+    return aggregate_codes(codes, recipe_ids, metrics, exact=True), _float_metrics(metrics)
+
+
+def _frame_partial(chunk):
+    metrics = {col: to_numeric(chunk[col]).to_numpy() for col in METRICS}
+    # Unsorted: add_partials keys the totals by recipe_id and finish_partial sorts once
+    codes, recipe_ids = pd.factorize(chunk["recipe_id"].astype(object))
+    return _exact_partial(codes, recipe_ids, metrics)
+
+
+def _facts_sums(fact_dir, n_recipes, start, stop):
+    """dense_sums of fact store rows start:stop; the id dictionary is not needed to add them up."""
+    facts = InteractionFacts(fact_dir)
+    metrics = {col: np.asarray(facts.column(col)[start:stop]) for col in METRICS}
+    return dense_sums(np.asarray(facts.column("recipe_code")[start:stop]), n_recipes, metrics)
+
+
+def map_partials(func, jobs, workers=None, initializer=None, initargs=()):
+    """
+    Yield func(*args) for every args in jobs: inline, or on a pool of
+    `workers` processes with at most two jobs per worker in flight.
+    initializer(*initargs) runs once per process first, e.g. to hand every
+    job the same lookup table without pickling it into each job.
+    """
+    if not workers or workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for args in jobs:
+            yield func(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for args in jobs:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def add_partials(partials):
+    """
+    Add up partial aggregates into one partial; None if there are none.
+
+    Running totals are dense arrays indexed by the order recipes were
+    first seen, grown by doubling. Each partial is added at its recipes'
+    positions, so the cost follows the size of the partial, not the
+    number of recipes seen so far; exact sums add limb by limb, and are
+    carried once at the end.
+    """
+    positions, totals, float_metrics = {}, None, set()
+    for added, (partial, partial_floats) in enumerate(partials, 1):
+        sums = {col: partial[col].to_numpy() for col in partial.columns}
+        # A metric is float over the whole table if it is float in any part;
+        # its integer sums in the other parts join the exact form
+        for metric in float_metrics - partial_floats:
+            sums = _exact_sums_of(sums, metric)
+        if totals is not None:
+            for metric in partial_floats - float_metrics:
+                totals = _exact_sums_of(totals, metric)
+        float_metrics |= partial_floats
+
+        at = np.fromiter((positions.setdefault(recipe_id, len(positions)) for recipe_id in partial.index),
+                         dtype=np.int64, count=len(partial))
+        if totals is None:
+            totals = {col: np.zeros(max(len(partial), 1024), dtype=values.dtype) for col, values in sums.items()}
+        elif len(positions) > len(totals["interactions"]):
+            capacity = 2 * len(positions)
+            for col, values in totals.items():
+                grown = np.zeros(capacity, dtype=values.dtype)
+                grown[:len(values)] = values
+                totals[col] = grown
+        # Positions are unique within a partial, so += adds every row
+        _add_sums(totals, sums, at)
+        if added % _CARRY_EVERY == 0:
+            totals = _normalize_columns(totals, len(totals["interactions"]))
+
+    if totals is None:
+        return None
+    n = len(positions)
+    return _frame(_normalize_columns({col: values[:n] for col, values in totals.items()}, n),
+                  list(positions)), float_metrics
+
+
+def _integers(sums):
+    """
+    (values, integral, finite) of integer sums (int64) or exact sums
+    (lo, limbs, inf): integral marks the sums that are integers below
+    2**53, whose values are then given as int64.
+    """
+    if not isinstance(sums, tuple):
+        sums = np.asarray(sums, dtype=np.int64)
+        return sums, np.ones(len(sums), dtype=bool), np.ones(len(sums), dtype=bool)
+    values, exact = exact_to_float(*sums)
+    integral = exact & (np.abs(values) < 2.0 ** 53) & (values == np.floor(values))
+    return np.where(integral, values, 0).astype(np.int64), integral, np.isfinite(values)
+
+
+def squared_deviations(counts, sums, sums_sq):
+    """
+    Per-group sum of squared deviations from the mean (the m2 of Moments),
+    sum_sq - sum**2 / n, evaluated on the integer (int64) or exact
+    (exact_sums) totals and rounded once, so it has none of the
+    cancellation of the same formula in floats. NaN where a sum is not
+    finite. Integral sums small enough for n * sum_sq - sum**2 to fit in
+    53 bits are done in numpy; the others in Python ints.
+    """
+    n = np.asarray(counts, dtype=np.int64)
+    total, total_integral, finite = _integers(sums)
+    total_sq, total_sq_integral, finite_sq = _integers(sums_sq)
+    finite &= finite_sq & (n > 0)
+    fast = (finite & total_integral & total_sq_integral & (np.abs(total) < 1 << 31)
+            & (np.abs(total_sq) < (1 << 62) // np.maximum(n, 1)))
+    numerator = np.where(fast, n * total_sq - total * total, 0)
+    fast &= np.abs(numerator) < 1 << 53
+
+    m2 = np.where(n > 0, np.nan, 0.0)
+    m2[fast] = numerator[fast] / n[fast]
+    slow = np.flatnonzero(finite & ~fast)
+    if len(slow):
+        exact = isinstance(sums, tuple)
+        scale = 1 << EXACT_SHIFT if exact else 1
+        values = [_exact_ints(s[0], s[1][:, slow]) if exact else s[slow].tolist() for s in (sums, sums_sq)]
+        for row, count, s, s2 in zip(slow, n[slow].tolist(), *values):
+            m2[row] = (count * s2 * scale - s * s) / (count * scale * scale)
+    return m2
+
+
+def finish_partial(partial):
+    """
+    The final per-recipe aggregates of a partial (None: no interactions),
+    with the exact sums rounded to float64 and the derived columns:
+    likes_m2 (likes' squared deviations, see squared_deviations) and
+    engagement.
+    """
+    if partial is None:
+        empty = np.zeros(0, dtype=np.int64)
+        return aggregate_codes(empty, [], {col: empty for col in METRICS})
+
+    totals, float_metrics = partial
+    totals = totals.sort_index()
+    columns = {col: totals[col].to_numpy() for col in totals.columns}
+    exact = {col for metric in float_metrics for col in SUM_COLUMNS[metric]}
+    sums = {col: read_exact(columns, col, len(totals)) if col in exact else columns[col] for col in PARTIAL_COLUMNS}
+    likes_m2 = squared_deviations(sums["likes_count"], sums["likes"], sums["likes_sq"])
+
+    aggs = _frame({col: exact_to_float(*sums[col])[0] if col in exact else sums[col] for col in PARTIAL_COLUMNS},
+                  totals.index)
+    aggs.insert(aggs.columns.get_loc("likes_sq") + 1, "likes_m2", likes_m2)
+    aggs["engagement"] = aggs["views"] + aggs["likes"] + aggs["cook_attempts"]
+    return aggs
+
+
+def combine_partials(partials):
+    """Add up partial aggregates into the final per-recipe aggregates."""
+    return finish_partial(add_partials(partials))
+
+
+def chunk_partials(chunks, workers=None):
+    """The partial aggregate of every interaction DataFrame in chunks."""
+    return map_partials(_frame_partial, ((chunk,) for chunk in chunks), workers)
+
+
+SUM_COLUMNS = {"views": ["views"], "likes": ["likes", "likes_sq"], "rating": ["rating_sum"],
+               "cook_attempts": ["cook_attempts"]}
+# The sums and counts partials carry, in the order of the final columns
+PARTIAL_COLUMNS = ["views", "likes", "likes_count", "likes_sq", "rating_sum", "rating_count", "cook_attempts",
+                   "interactions"]
+# Columns finish_partial computes from the sums; partials do not carry them
+DERIVED_COLUMNS = ["likes_m2", "engagement"]
+
+
+def _exact_sums_of(sums, metric):
+    """Partial columns with the integer sums of one metric converted to exact sums."""
+    sums = dict(sums)
+    for col in SUM_COLUMNS[metric]:
+        sums.update(exact_columns(col, _integer_exact_sums(sums.pop(col))))
+    return sums
+
+
+def _table_exists(table):
+    return os.path.exists(f"{table}.csv") or os.path.isdir(f"{table}{PARQUET_SUFFIX}")
+
+
+def load_ingredient_keys(ingredients=None):
+    """
+    Integer ingredient keys: returns (recipe_ids, keys, dim) where keys[i]
+    is the ingredient of link i (MISSING_KEY for unnamed rows) and dim is
+    indexed by key with the normalized and display names.
+
+    Reads recipe_ingredients / ingredient_dim written by the ETL; builds
+    them from the ingredients table instead when they are missing, stale
+    (the ingredients table changed since they were written, see
+    ingredient_dim.STATE_FILE) or the ingredients were passed in directly.
+    """
+    if ingredients is None:
+        state = load_links_state()
+        if (state is not None and state == table_state("ingredients")
+                and _table_exists(DIM_TABLE) and _table_exists(LINK_TABLE)):
+            links = load_table(LINK_TABLE)
+            dim = load_table(DIM_TABLE).set_index("ingredient_key").sort_index()
+            return links["recipe_id"].astype(object).to_numpy(), links["ingredient_key"].to_numpy(np.int64), dim
+        ingredients = load_table("ingredients", columns=INGREDIENT_COLUMNS)
+
+    vocab = IngredientVocabulary()
+    codes, uniques = pd.factorize(ingredients["ingredient_name"].astype(object))
+    mapping = np.array([vocab.code(name) for name in uniques] + [MISSING_KEY], dtype=np.int64)
+    keys = mapping[codes]   # code -1 (NaN name) picks the trailing MISSING_KEY
+    dim = pd.DataFrame(vocab.rows(), columns=["ingredient_key", "ingredient_name", "display_name"])
+    return ingredients["recipe_id"].astype(object).to_numpy(), keys, dim.set_index("ingredient_key")
+
+
+def top(series, n=TOP_N):
+    """
+    The n largest values, largest first, NaN last.
+
+    A partial selection (np.partition) finds the n-th largest value in
+    O(len(series)); when exactly n distinct values reach it, only those
+    are sorted, and their order is the only one there is. Otherwise
+    (ties among the selected values, or straddling the n-th place) the
+    full sort decides which entries are kept and how ties are ordered,
+    so the result is always the same as sorting every group.
+    """
+    if len(series) > n > 0:
+        keys = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        keys = np.where(np.isnan(keys), -np.inf, keys)
+        threshold = np.partition(keys, len(keys) - n)[len(keys) - n]
+        selected = keys >= threshold
+        if np.count_nonzero(selected) == n and len(np.unique(keys[selected])) == n:
+            return series[selected].sort_values(ascending=False)
+    return series.sort_values(ascending=False).head(n)
+
+
+# ---------------------- Engine ----------------------
+class AnalyticsEngine:
+    """
+    Shared analytics over recipes, ingredients and interactions.
+
+    The tables are loaded and coerced once, interactions are reduced to
+    per-recipe aggregates once, and every insight (for the text report and
+    the charts alike) is derived from those aggregates. When the ETL has
+    kept the recipe_stats table up to date, the aggregates are read from
+    it. Otherwise, when it has written an up-to-date interaction fact
+    store, interactions are mapped from it instead of parsed, and
+    aggregated with bincounts. With a chunk_size, interactions are
+    aggregated chunk by chunk and never held in memory as a whole. With
+    workers > 1, the per-recipe aggregation is partitioned over that many
+    processes.
+    """
+
+    def __init__(self, recipes=None, ingredients=None, interactions=None, chunk_size=None, workers=None):
+        # Tables that are not passed in are loaded on first use
+        self._ingredients_given = ingredients is not None
+        self._interactions_given = interactions is not None
+        self.chunk_size = chunk_size
+        self.workers = workers
+        if recipes is not None:
+            self.recipes = recipes
+        if ingredients is not None:
+            self.ingredients = ingredients
+        if interactions is not None:
+            self.interactions = interactions
+
+    @classmethod
+    def load(cls):
+        return cls(*load_tables())
+
+    @cached_property
+    def recipes(self):
+        return load_recipes()
+
+    @cached_property
+    def ingredients(self):
+        return load_ingredients()
+
+    @cached_property
+    def facts(self):
+        """The interaction fact store, or None (missing, stale, or interactions passed in)."""
+        return None if self._interactions_given else open_fact_store()
+
+    @cached_property
+    def interactions(self):
+        if self.facts is not None:
+            return self.facts.to_frame(INTERACTION_COLUMNS)
+        return load_interactions()
+
+    # ---- shared intermediate results ----
+    @cached_property
+    def recipe_aggregates(self):
+        if not self._interactions_given:
+            stats = open_recipe_stats()
+            if stats is not None:
+                return stats
+        if self.chunk_size and not self._interactions_given:
+            chunks = iter_table("interactions", INTERACTION_COLUMNS, self.chunk_size)
+            return aggregate_chunks(chunks, self.workers)
+        if self.facts is not None:
+            return aggregate_facts(self.facts, self.workers)
+        return aggregate_interactions(self.interactions, self.workers)
+
+    @cached_property
+    def recipe_stats(self):
+        """Per-recipe aggregates joined to the recipe attributes (inner join)."""
+        recipes = self.recipes[["recipe_id", "name", "prep_time"]].astype({"recipe_id": object})
+        return recipes.merge(self.recipe_aggregates, left_on="recipe_id", right_index=True, how="inner")
+
+    @cached_property
+    def name_stats(self):
+        """recipe_stats rolled up by recipe name, as the report groups them."""
+        cols = ["views", "likes", "rating_sum", "rating_count", "cook_attempts", "engagement"]
+        by_name = self.recipe_stats.groupby("name")[cols].sum()
+        by_name["rating"] = by_name["rating_sum"] / by_name["rating_count"]
+        return by_name
+
+    @cached_property
+    def ingredient_keys(self):
+        """(recipe_ids, integer ingredient keys, ingredient dimension), see load_ingredient_keys."""
+        return load_ingredient_keys(self.ingredients if self._ingredients_given else None)
+
+    def _per_ingredient(self, weights=None, mask=None):
+        """Sum of weights (or row count) per ingredient key, as one bincount."""
+        _, keys, dim = self.ingredient_keys
+        keep = keys != MISSING_KEY
+        if mask is not None:
+            keep &= mask
+        w = None if weights is None else weights[keep]
+        return np.bincount(keys[keep], weights=w, minlength=len(dim))
+
+    def _recipe_values(self, column):
+        """recipe_aggregates[column] for the recipe of every ingredient link (NaN if none)."""
+        recipe_ids, _, _ = self.ingredient_keys
+        return self.recipe_aggregates[column].reindex(recipe_ids).to_numpy(dtype=float)
+
+    @cached_property
+    def ingredient_counts(self):
+        return self.ingredients.groupby("recipe_id", observed=True)["ingredient_name"].count()
+
+    # ---- insights ----
+    # Scalar insights are plain floats, so reading them back from the result
+    # cache does not import numpy
+    def most_common_ingredients(self):
+        dim = self.ingredient_keys[2]
+        counts = pd.Series(self._per_ingredient(), index=dim["ingredient_name"].rename("ingredient_name"),
+                           name="count")
+        return top(counts[counts > 0])
+
+    def avg_prep_time(self):
+        return Moments().add_array(self.recipes["prep_time"]).average
+
+    def avg_cook_time(self):
+        return Moments().add_array(self.recipes["cook_time"]).average
+
+    def difficulty_distribution(self):
+        return self.recipes["difficulty"].value_counts()
+
+    def prep_likes_correlation(self):
+        """
+        Correlation over every (prep_time, likes) interaction pair, merged
+        from one co-moment partial per recipe (its count, mean and m2 of
+        likes): its likes all pair with the same prep_time, so the partial
+        has no x spread and no co-moment.
+        """
+        stats = self.recipe_stats.dropna(subset=["prep_time"])
+        n = stats["likes_count"].to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_likes = stats["likes"].to_numpy(dtype=np.float64) / n
+        moments = CoMoments.from_groups(n, stats["prep_time"], mean_likes, 0, stats["likes_m2"], 0)
+        return moments.correlation
+
+    def most_viewed(self):
+        return top(self.name_stats["views"])
+
+    def high_engagement_ingredients(self):
+        """
+        Mean likes over every (ingredient, interaction) pair, computed
+        reduce-then-join: each ingredient link gets its recipe's likes sum
+        and count, and both are summed per ingredient key with bincount.
+        sum(likes) / count(likes) per ingredient equals the mean over the
+        exploded join exactly. Recipes without interactions are left out.
+        """
+        dim = self.ingredient_keys[2]
+        likes = self._recipe_values("likes")
+        has_interactions = ~np.isnan(likes)
+        likes_sum = self._per_ingredient(np.nan_to_num(likes), has_interactions)
+        likes_count = self._per_ingredient(np.nan_to_num(self._recipe_values("likes_count")), has_interactions)
+        linked = self._per_ingredient(mask=has_interactions) > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean_likes = likes_sum / likes_count
+        index = dim["display_name"].rename("ingredient_name")
+        # Name order first, as a group-by on the names would give, so ties rank the same
+        return top(pd.Series(mean_likes, index=index, name="likes")[linked].sort_index())
+
+    def top_rated(self):
+        return top(self.name_stats["rating"])
+
+    def most_liked(self):
+        return top(self.name_stats["likes"])
+
+    def avg_ingredients_per_recipe(self):
+        return float(self.ingredient_counts.mean())
+
+    def most_ingredients(self):
+        return top(self.ingredient_counts)
+
+    def top_engagement(self):
+        return top(self.name_stats["engagement"].rename("total_engagement"))
+
+    def ingredient_engagement(self, n=15):
+        """Total engagement of the recipes each ingredient appears in."""
+        dim = self.ingredient_keys[2]
+        engagement = self._recipe_values("engagement")
+        has_interactions = ~np.isnan(engagement)
+        totals = self._per_ingredient(np.nan_to_num(engagement), has_interactions)
+        linked = self._per_ingredient(mask=has_interactions) > 0
+        index = dim["display_name"].rename("ingredient_name")
+        return top(pd.Series(totals, index=index, name="engagement")[linked].sort_index(), n)
+
+    def prep_likes_points(self):
+        """(prep_time, likes) for every interaction, for the scatter chart."""
+        recipes = self.recipes[["recipe_id", "prep_time"]].astype({"recipe_id": object})
+        interactions = self.interactions[["recipe_id", "likes"]].astype({"recipe_id": object})
+        return recipes.merge(interactions, on="recipe_id")
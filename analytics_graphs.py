@@ -1,205 +1,249 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+"""
+The twelve insight charts as a library, with a thin CLI on top.
+
+    from analytics_graphs import render_charts
+    render_charts(["top_rated_recipes"])     # ['graphs/top_rated_recipes.png']
+
+Importing this module does not import pandas, numpy or matplotlib: the
+analytics engine is only loaded for charts that are not already cached,
+and matplotlib only where a chart is rendered.
+
+Usage:
+- python analytics_graphs.py                        all twelve charts
+- python analytics_graphs.py --chart prep_vs_likes  one chart
+"""
+
+import argparse
 import os
+from collections import namedtuple
+
+import instrument
+from result_cache import ENGINE_MODULES, ResultCache, inputs_fingerprint, make_key, module_fingerprint
+
+GRAPHS_DIR = "graphs"
+
+# One independent figure: what to draw and the (small) data it needs
+ChartJob = namedtuple("ChartJob", ["file_name", "kind", "data", "title", "xlabel", "ylabel"])
+
+
+# ---------------------- Rendering ----------------------
+def render_chart(job):
+    """
+    Draw one chart on its own Figure with the Agg canvas and save it.
+
+    No pyplot state is touched, so jobs can run in any process or order.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
+    if job.kind == "bar":
+        job.data.plot(kind="bar", ax=ax)
+    elif job.kind == "hist":
+        job.data.plot(kind="hist", bins=10, ax=ax)
+    elif job.kind == "scatter":
+        x, y = job.data
+        ax.scatter(x, y)
+    else:
+        raise ValueError(f"Unknown chart kind: {job.kind}")
+
+    ax.set_title(job.title)
+    ax.set_xlabel(job.xlabel)
+    ax.set_ylabel(job.ylabel)
+    fig.tight_layout()
+    fig.savefig(job.file_name)
+    return job.file_name
+
+
+# ---------------------- Chart Specs ----------------------
+def _prep_likes_points(engine):
+    # Repeated (prep_time, likes) pairs draw the same marker, so plot each once
+    points = engine.prep_likes_points()[["prep_time", "likes"]].drop_duplicates()
+    return points["prep_time"].to_numpy(), points["likes"].to_numpy()
+
+
+# One chart per insight: (file_name, kind, data(engine), title, xlabel, ylabel).
+# The data is only computed for charts that are not already cached.
+CHART_SPECS = [
+    # ---------------------- 1. Most Common Ingredients ----------------------
+    ("most_common_ingredients.png", "bar", lambda e: e.most_common_ingredients(),
+     "Top 10 Most Common Ingredients", "Ingredient", "Count"),
 
-# ---------------------- Create Output Folder ----------------------
-if not os.path.exists("graphs"):
-    os.makedirs("graphs")
-
-# ---------------------- Load CSV Files ----------------------
-recipes = pd.read_csv("recipes.csv")
-ingredients = pd.read_csv("ingredients.csv")
-interactions = pd.read_csv("interactions.csv")
-
-# Convert numeric columns safely
-recipes["prep_time"] = pd.to_numeric(recipes.get("prep_time"), errors="coerce")
-recipes["cook_time"] = pd.to_numeric(recipes.get("cook_time"), errors="coerce")
-interactions["views"] = pd.to_numeric(interactions.get("views"), errors="coerce")
-interactions["likes"] = pd.to_numeric(interactions.get("likes"), errors="coerce")
-interactions["rating"] = pd.to_numeric(interactions.get("rating"), errors="coerce")
-
-# Merge for relationship-based insights
-merged = pd.merge(recipes, interactions, on="recipe_id", how="left")
-
-# ---------------------- 1. Most Common Ingredients ----------------------
-top_ing = (
-    ingredients["ingredient_name"].str.lower()
-    .value_counts()
-    .head(10)
-)
-
-plt.figure()
-top_ing.plot(kind="bar")
-plt.title("Top 10 Most Common Ingredients")
-plt.xlabel("Ingredient")
-plt.ylabel("Count")
-plt.tight_layout()
-plt.savefig("graphs/most_common_ingredients.png")
-plt.close()
-
-# ---------------------- 2. Average Preparation Time ----------------------
-plt.figure()
-recipes["prep_time"].dropna().plot(kind="hist", bins=10)
-plt.title("Distribution of Preparation Time")
-plt.xlabel("Prep Time (min)")
-plt.ylabel("Frequency")
-plt.tight_layout()
-plt.savefig("graphs/prep_time_distribution.png")
-plt.close()
-
-# ---------------------- 3. Average Cooking Time ----------------------
-plt.figure()
-recipes["cook_time"].dropna().plot(kind="hist", bins=10)
-plt.title("Distribution of Cooking Time")
-plt.xlabel("Cook Time (min)")
-plt.ylabel("Frequency")
-plt.tight_layout()
-plt.savefig("graphs/cook_time_distribution.png")
-plt.close()
-
-# ---------------------- 4. Difficulty Distribution ----------------------
-difficulty_dist = recipes["difficulty"].value_counts()
-
-plt.figure()
-difficulty_dist.plot(kind="bar")
-plt.title("Difficulty Distribution")
-plt.xlabel("Difficulty Level")
-plt.ylabel("Number of Recipes")
-plt.tight_layout()
-plt.savefig("graphs/difficulty_distribution.png")
-plt.close()
-
-# ---------------------- 5. Correlation Between Prep Time & Likes ----------------------
-plt.figure()
-plt.scatter(merged["prep_time"], merged["likes"])
-plt.title("Prep Time vs Likes")
-plt.xlabel("Prep Time")
-plt.ylabel("Likes")
-plt.tight_layout()
-plt.savefig("graphs/prep_vs_likes.png")
-plt.close()
-
-# ---------------------- 6. Most Viewed Recipes ----------------------
-most_viewed = (
-    merged.groupby("name")["views"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-plt.figure()
-most_viewed.plot(kind="bar")
-plt.title("Most Viewed Recipes (Top 10)")
-plt.xlabel("Recipe")
-plt.ylabel("Views")
-plt.tight_layout()
-plt.savefig("graphs/most_viewed_recipes.png")
-plt.close()
-
-# ---------------------- 7. Ingredients Associated with High Engagement ----------------------
-merged_ing = pd.merge(ingredients, interactions, on="recipe_id", how="left")
-
-top_eng_ing = (
-    merged_ing.groupby("ingredient_name")["likes"]
-    .mean()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-plt.figure()
-top_eng_ing.plot(kind="bar")
-plt.title("Top Ingredients by Average Likes")
-plt.xlabel("Ingredient")
-plt.ylabel("Avg Likes")
-plt.tight_layout()
-plt.savefig("graphs/high_engagement_ingredients.png")
-plt.close()
-
-# ---------------------- 8. Top Rated Recipes ----------------------
-top_rated = (
-    merged.groupby("name")["rating"]
-    .mean()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-plt.figure()
-top_rated.plot(kind="bar")
-plt.title("Top Rated Recipes")
-plt.xlabel("Recipe")
-plt.ylabel("Average Rating")
-plt.tight_layout()
-plt.savefig("graphs/top_rated_recipes.png")
-plt.close()
-
-# ---------------------- 9. Most Liked Recipes ----------------------
-most_liked = (
-    merged.groupby("name")["likes"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-plt.figure()
-most_liked.plot(kind="bar")
-plt.title("Most Liked Recipes")
-plt.xlabel("Recipe")
-plt.ylabel("Likes")
-plt.tight_layout()
-plt.savefig("graphs/most_liked_recipes.png")
-plt.close()
-
-# ---------------------- 10. Average Ingredients Per Recipe ----------------------
-ingredients_count = (
-    ingredients.groupby("recipe_id")["ingredient_name"]
-    .count()
-)
-
-plt.figure()
-ingredients_count.plot(kind="hist", bins=10)
-plt.title("Ingredient Count Distribution")
-plt.xlabel("Ingredients per Recipe")
-plt.ylabel("Frequency")
-plt.tight_layout()
-plt.savefig("graphs/ingredient_count_distribution.png")
-plt.close()
-
-# ---------------------- 11. Recipes With Most Ingredients ----------------------
-recipes_most_ing = ingredients_count.sort_values(ascending=False).head(10)
-
-plt.figure()
-recipes_most_ing.plot(kind="bar")
-plt.title("Recipes with Most Ingredients (Top 10)")
-plt.xlabel("Recipe ID")
-plt.ylabel("Ingredient Count")
-plt.tight_layout()
-plt.savefig("graphs/recipes_most_ingredients.png")
-plt.close()
-
-# ---------------------- 12. Highest Total Engagement ----------------------
-merged["total_engagement"] = (
-    merged["views"].fillna(0) +
-    merged["likes"].fillna(0) +
-    merged["cook_attempts"].fillna(0)
-)
-
-top_engagement = (
-    merged.groupby("name")["total_engagement"]
-    .sum()
-    .sort_values(ascending=False)
-    .head(10)
-)
-
-plt.figure()
-top_engagement.plot(kind="bar")
-plt.title("Recipes With Highest Engagement")
-plt.xlabel("Recipe")
-plt.ylabel("Total Engagement")
-plt.tight_layout()
-plt.savefig("graphs/highest_engagement_recipes.png")
-plt.close()
-
-print("🎉 All graphs successfully generated in the 'graphs/' folder!")
+    # ---------------------- 2. Average Preparation Time ----------------------
+    ("prep_time_distribution.png", "hist", lambda e: e.recipes["prep_time"].dropna(),
+     "Distribution of Preparation Time", "Prep Time (min)", "Frequency"),
 
+    # ---------------------- 3. Average Cooking Time ----------------------
+    ("cook_time_distribution.png", "hist", lambda e: e.recipes["cook_time"].dropna(),
+     "Distribution of Cooking Time", "Cook Time (min)", "Frequency"),
 
+    # ---------------------- 4. Difficulty Distribution ----------------------
+    ("difficulty_distribution.png", "bar", lambda e: e.difficulty_distribution(),
+     "Difficulty Distribution", "Difficulty Level", "Number of Recipes"),
 
+    # ---------------------- 5. Correlation Between Prep Time & Likes ----------------------
+    ("prep_vs_likes.png", "scatter", _prep_likes_points,
+     "Prep Time vs Likes", "Prep Time", "Likes"),
+
+    # ---------------------- 6. Most Viewed Recipes ----------------------
+    ("most_viewed_recipes.png", "bar", lambda e: e.most_viewed(),
+     "Most Viewed Recipes (Top 10)", "Recipe", "Views"),
+
+    # ---------------------- 7. Ingredients Associated with High Engagement ----------------------
+    ("high_engagement_ingredients.png", "bar", lambda e: e.high_engagement_ingredients(),
+     "Top Ingredients by Average Likes", "Ingredient", "Avg Likes"),
+
+    # ---------------------- 8. Top Rated Recipes ----------------------
+    ("top_rated_recipes.png", "bar", lambda e: e.top_rated(),
+     "Top Rated Recipes", "Recipe", "Average Rating"),
+
+    # ---------------------- 9. Most Liked Recipes ----------------------
+    ("most_liked_recipes.png", "bar", lambda e: e.most_liked(),
+     "Most Liked Recipes", "Recipe", "Likes"),
+
+    # ---------------------- 10. Average Ingredients Per Recipe ----------------------
+    ("ingredient_count_distribution.png", "hist", lambda e: e.ingredient_counts,
+     "Ingredient Count Distribution", "Ingredients per Recipe", "Frequency"),
+
+    # ---------------------- 11. Recipes With Most Ingredients ----------------------
+    ("recipes_most_ingredients.png", "bar", lambda e: e.most_ingredients(),
+     "Recipes with Most Ingredients (Top 10)", "Recipe ID", "Ingredient Count"),
+
+    # ---------------------- 12. Highest Total Engagement ----------------------
+    ("highest_engagement_recipes.png", "bar", lambda e: e.top_engagement(),
+     "Recipes With Highest Engagement", "Recipe", "Total Engagement"),
+]
+
+
+def chart_job(engine, spec, out_dir=GRAPHS_DIR):
+    file_name, kind, data, title, xlabel, ylabel = spec
+    with instrument.stage(f"chart_data:{file_name}"):
+        return ChartJob(os.path.join(out_dir, file_name), kind, data(engine), title, xlabel, ylabel)
+
+
+def render_recorded(job):
+    """
+    render_chart measured with a worker recorder; returns the recorder's
+    start time and stage records for instrument.add_stages in the parent.
+    """
+    recorder = instrument.worker_recorder()
+    with recorder.stage(instrument.Stage(f"chart:{os.path.basename(job.file_name)}")) as st:
+        render_chart(job)
+        st.bytes_written = instrument.file_size(job.file_name)
+    return recorder.started, recorder.stages
+
+
+def chart_jobs(engine, out_dir=GRAPHS_DIR):
+    """
+    Build the twelve chart jobs, each carrying only the aggregated data it plots.
+    """
+    return [chart_job(engine, spec, out_dir) for spec in CHART_SPECS]
+
+
+def chart_name(spec):
+    """The name a chart is requested by: its file name without '.png'."""
+    return os.path.splitext(spec[0])[0]
+
+
+CHART_SPECS_BY_NAME = {chart_name(spec): spec for spec in CHART_SPECS}
+
+
+def chart_key(spec, definition, inputs):
+    file_name, kind, _, title, xlabel, ylabel = spec
+    return make_key("chart", file_name, kind, title, xlabel, ylabel, definition, inputs)
+
+
+# ---------------------- Library API ----------------------
+def render_charts(names=None, engine=None, workers=None, cache=None, content_hash=False, **engine_options):
+    """
+    Render the named charts (default: all twelve) into 'graphs/' and return
+    their paths, on a process pool of `workers` processes (default: one per
+    CPU; 1 renders in this process).
+
+    With a ResultCache, charts whose inputs and code are unchanged are
+    copied from the cache without computing their data or rendering.
+    Without an engine, an AnalyticsEngine(**engine_options) is created for
+    the first chart that has to be rendered.
+    """
+    names = list(names) if names else [chart_name(spec) for spec in CHART_SPECS]
+    unknown = [name for name in names if name not in CHART_SPECS_BY_NAME]
+    if unknown:
+        raise ValueError(f"Unknown chart(s): {', '.join(unknown)}")
+    specs = [CHART_SPECS_BY_NAME[name] for name in names]
+
+    # ---------------------- Create Output Folder ----------------------
+    os.makedirs(GRAPHS_DIR, exist_ok=True)
+
+    keys = {}
+    if cache is not None:
+        inputs = inputs_fingerprint(content_hash=content_hash)
+        definition = module_fingerprint(*ENGINE_MODULES, "analytics_graphs")
+        for spec in specs:
+            keys[spec[0]] = chart_key(spec, definition, inputs)
+
+    jobs = []
+    for spec in specs:
+        if cache is not None and cache.get_file(keys[spec[0]], os.path.join(GRAPHS_DIR, spec[0])):
+            continue
+        # ---------------------- Load Tables (lazily, Parquet if present, else CSV) ----------------------
+        if engine is None:
+            from analytics_engine import AnalyticsEngine
+            engine = AnalyticsEngine(**engine_options)
+        jobs.append(chart_job(engine, spec))
+    if cache is not None:
+        print(f"🔄 {len(specs) - len(jobs)} charts from cache, {len(jobs)} to render")
+
+    render = render_recorded if instrument.enabled() else render_chart
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results = [render(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(render, jobs))
+
+    if instrument.enabled():
+        for started, stages in results:
+            instrument.add_stages(stages, started)
+
+    # Cache writes stay in this process so the index has a single writer
+    if cache is not None:
+        for job in jobs:
+            name = os.path.basename(job.file_name)
+            cache.put_file(keys[name], job.file_name, label=f"chart:{name}")
+
+    return [os.path.join(GRAPHS_DIR, spec[0]) for spec in specs]
+
+
+# ---------------------- CLI ----------------------
+def run_graphs(engine=None, workers=None, cache=None, content_hash=False):
+    """Render all twelve insight charts into 'graphs/'."""
+    render_charts(engine=engine, workers=workers, cache=cache, content_hash=content_hash)
+    print("🎉 All graphs successfully generated in the 'graphs/' folder!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the analytics charts.")
+    parser.add_argument("--chart", action="append", choices=list(CHART_SPECS_BY_NAME), metavar="NAME",
+                        help="only render this chart (repeatable)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="rendering processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="render every chart instead of reusing cached images")
+    parser.add_argument("--hash-inputs", action="store_true",
+                        help="fingerprint inputs by content hash instead of mtime+size")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    cache = None if args.no_cache else ResultCache()
+    if args.chart:
+        for path in render_charts(args.chart, workers=args.workers, cache=cache, content_hash=args.hash_inputs):
+            print(f"📁 {path}")
+    else:
+        run_graphs(workers=args.workers, cache=cache, content_hash=args.hash_inputs)
+    instrument.finish()
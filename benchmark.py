@@ -0,0 +1,247 @@
+"""
+Benchmark the ETL and analytics chain on synthetic data of any size.
+
+The dataset is generated with the seeding logic from main.py (synthetic
+recipes, round-robin interactions) and written as local JSON exports in
+the same shape exportfile.py produces, so no Firestore is needed.
+
+Each stage runs in its own Python process inside the data directory, and
+its wall time, CPU time and peak RSS are recorded. Results are written as
+JSON (one file per commit and size) so runs can be compared with --compare.
+
+Usage:
+- python benchmark.py --interactions 100000
+- python benchmark.py --interactions 5000000 --stream --parquet
+- python benchmark.py --interactions 100000 --compare benchmarks/<old>.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import main
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = "bench_data"
+RESULTS_DIR = "benchmarks"
+DATASET_FILE = "dataset.json"
+DEFAULT_PER_RECIPE = 20
+DEFAULT_SEED = 42
+
+# Stage name -> code run in a fresh interpreter inside the data directory
+STAGES = {
+    "etl": "import transfer; transfer.run_etl(stream={stream}, parquet={parquet})",
+    "validate": "import validate; validate.run_validation()",
+    "analytics": "import analytics; analytics.run_analytics()",
+    "graphs": "import analytics_graphs; analytics_graphs.run_graphs(workers={workers})",
+}
+
+
+# ---------------------- Synthetic Data ----------------------
+def synthetic_name(i):
+    """The i-th synthetic recipe name; the first round matches main.py exactly."""
+    base = main.SYNTHETIC_NAMES[i % len(main.SYNTHETIC_NAMES)]
+    rnd = i // len(main.SYNTHETIC_NAMES)
+    return base if rnd == 0 else f"{base} {rnd + 1}"
+
+
+def iter_bench_recipes(num_recipes):
+    """Yield (doc_id, doc): the primary recipe, then synthetic recipes 2..num_recipes."""
+    primary = main.get_primary_recipe()
+    yield primary["recipe_id"], primary
+    for i in range(num_recipes - 1):
+        rec = main.make_synthetic_recipe(i + 2, synthetic_name(i))
+        yield rec["recipe_id"], rec
+
+
+def write_json_export(file_name, docs):
+    """Write (doc_id, doc) pairs as a JSON array, one document per line, like exportfile.py."""
+    count = 0
+    with open(file_name, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for doc_id, doc in docs:
+            doc["id"] = doc_id
+            if count:
+                f.write(",\n")
+            f.write(json.dumps(doc, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    return count
+
+
+def generate_dataset(data_dir, interactions, per_recipe=DEFAULT_PER_RECIPE, seed=DEFAULT_SEED):
+    """
+    Write users.json, recipes.json and interactions.json into data_dir.
+
+    An existing dataset with the same parameters is reused, since
+    generating tens of millions of interactions takes a while.
+    """
+    params = {"interactions": interactions, "per_recipe": per_recipe, "seed": seed}
+    marker = os.path.join(data_dir, DATASET_FILE)
+    if os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing["params"] == params:
+            print(f"✅ Reusing dataset in '{data_dir}'")
+            return existing
+
+    os.makedirs(data_dir, exist_ok=True)
+    random.seed(seed)
+    num_recipes = max(1, -(-interactions // per_recipe))
+
+    t0 = time.perf_counter()
+    users = write_json_export(os.path.join(data_dir, "users.json"), main.iter_users())
+    recipes = write_json_export(os.path.join(data_dir, "recipes.json"), iter_bench_recipes(num_recipes))
+
+    recipe_ids = [main.recipe_doc_id(1, "Paneer Curry with Chapati")]
+    recipe_ids += [main.recipe_doc_id(i + 2, synthetic_name(i)) for i in range(num_recipes - 1)]
+    user_ids = [main.user_doc_id(i) for i in range(1, main.NUM_USERS + 1)]
+    docs = itertools.islice(main.iter_interactions(recipe_ids, user_ids, per_recipe), interactions)
+    written = write_json_export(os.path.join(data_dir, "interactions.json"), docs)
+
+    dataset = {
+        "params": params,
+        "users": users,
+        "recipes": recipes,
+        "interactions": written,
+        "bytes": {
+            name: os.path.getsize(os.path.join(data_dir, f"{name}.json"))
+            for name in ("users", "recipes", "interactions")
+        },
+        "generate_seconds": round(time.perf_counter() - t0, 3),
+    }
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(dataset, f, indent=2)
+    print(f"✅ Generated {recipes} recipes and {written} interactions in {dataset['generate_seconds']}s")
+    return dataset
+
+
+# ---------------------- Stage Runner ----------------------
+def _max_rss_bytes(rusage):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+
+
+def run_stage(name, code, data_dir):
+    """
+    Run one stage in a fresh interpreter and measure it.
+
+    Output goes to <data_dir>/<stage>.log. Peak RSS and CPU time come from
+    wait4() and are reported as None where it is unavailable (Windows).
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_DIR, env.get("PYTHONPATH")]))
+    env.setdefault("MPLBACKEND", "Agg")
+
+    log_path = os.path.join(data_dir, f"{name}.log")
+    with open(log_path, "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", code], cwd=data_dir, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+            rusage = None
+        wall = time.perf_counter() - t0
+
+    result = {
+        "stage": name,
+        "ok": proc.returncode == 0,
+        "wall_seconds": round(wall, 3),
+        "cpu_seconds": round(rusage.ru_utime + rusage.ru_stime, 3) if rusage else None,
+        "peak_rss_bytes": _max_rss_bytes(rusage) if rusage else None,
+    }
+    status = "✅" if result["ok"] else f"⚠️ failed (see '{log_path}')"
+    rss = f"{result['peak_rss_bytes'] / 2**20:.0f} MB" if rusage else "n/a"
+    print(f"{status} {name}: {result['wall_seconds']:.2f}s wall, peak RSS {rss}")
+    return result
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(interactions, per_recipe=DEFAULT_PER_RECIPE, seed=DEFAULT_SEED, stages=None,
+                  data_dir=DATA_DIR, stream=False, parquet=False, graph_workers=None):
+    """Generate (or reuse) the dataset, run the stages in order and return the results dict."""
+    dataset = generate_dataset(data_dir, interactions, per_recipe, seed)
+    options = {"stream": stream, "parquet": parquet, "graph_workers": graph_workers}
+
+    results = []
+    for name in stages or list(STAGES):
+        code = STAGES[name].format(stream=stream, parquet=parquet, workers=graph_workers)
+        result = run_stage(name, code, data_dir)
+        results.append(result)
+        if not result["ok"]:
+            break
+
+    return {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "dataset": dataset,
+        "options": options,
+        "stages": results,
+    }
+
+
+# ---------------------- Comparison ----------------------
+def compare_results(old, new):
+    """Print per-stage wall time and peak RSS of new relative to old."""
+    old_stages = {s["stage"]: s for s in old["stages"]}
+    print(f"\n📊 {new['commit']} vs {old['commit']}:")
+    for stage in new["stages"]:
+        before = old_stages.get(stage["stage"])
+        if before is None or not before["ok"] or not stage["ok"]:
+            continue
+        line = f"  {stage['stage']:<10} wall {stage['wall_seconds']:.2f}s vs {before['wall_seconds']:.2f}s"
+        if before["wall_seconds"]:
+            line += f" ({stage['wall_seconds'] / before['wall_seconds']:.2f}x)"
+        if stage["peak_rss_bytes"] and before["peak_rss_bytes"]:
+            line += f", RSS {stage['peak_rss_bytes'] / before['peak_rss_bytes']:.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ETL and analytics stages on synthetic data.")
+    parser.add_argument("--interactions", type=int, default=10_000,
+                        help="number of interactions to generate (e.g. 10000 to 50000000)")
+    parser.add_argument("--interactions-per-recipe", type=int, default=DEFAULT_PER_RECIPE,
+                        help="interactions per recipe; sets the number of recipes")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where the dataset and stage outputs go")
+    parser.add_argument("--stream", action="store_true", help="run the ETL in streaming mode")
+    parser.add_argument("--parquet", action="store_true", help="also write Parquet tables in the ETL")
+    parser.add_argument("--graph-workers", type=int, default=None, help="processes for the graphs stage")
+    parser.add_argument("--output", help="results file (default: benchmarks/<commit>-<interactions>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.interactions, args.interactions_per_recipe, args.seed, args.stages,
+                            args.data_dir, args.stream, args.parquet, args.graph_workers)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}-{args.interactions}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"📁 Results saved to '{output}'")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare_results(json.load(f), results)
@@ -0,0 +1,355 @@
+import csv
+import hashlib
+import os
+import shutil
+
+import instrument
+
+# pyarrow is optional: without it the ETL only writes CSV and the
+# analytics scripts read the CSV files.
+try:
+    import pyarrow as pa # type: ignore
+    import pyarrow.parquet as pq # type: ignore
+except ImportError:
+    pa = pq = None
+
+PARQUET_SUFFIX = ".parquet"
+ROW_GROUP_SIZE = 128 * 1024
+
+# ---------------------- Table Schemas ----------------------
+# Column kinds: "str" plain string, "dict" dictionary-encoded string,
+# "int" int32, "float" float32.
+TABLE_COLUMNS = {
+    "recipes": [
+        ("recipe_id", "str"),
+        ("name", "str"),
+        ("category", "dict"),
+        ("prep_time", "int"),
+        ("cook_time", "int"),
+        ("servings", "int"),
+        ("difficulty", "dict"),
+    ],
+    "ingredients": [
+        ("ingredient_id", "str"),
+        ("recipe_id", "dict"),
+        ("ingredient_name", "dict"),
+        ("quantity", "dict"),
+    ],
+    "steps": [
+        ("step_id", "str"),
+        ("recipe_id", "dict"),
+        ("step_number", "int"),
+        ("instruction", "str"),
+    ],
+    "interactions": [
+        ("interaction_id", "str"),
+        ("user_id", "dict"),
+        ("recipe_id", "dict"),
+        ("views", "int"),
+        ("likes", "int"),
+        ("rating", "float"),
+        ("cook_attempts", "int"),
+    ],
+    "ingredient_dim": [
+        ("ingredient_key", "int"),
+        ("ingredient_name", "str"),
+        ("display_name", "str"),
+    ],
+    "recipe_ingredients": [
+        ("recipe_id", "dict"),
+        ("ingredient_key", "int"),
+    ],
+}
+
+
+def parquet_available():
+    return pa is not None
+
+
+def _parquet_parts(dir_name):
+    return [os.path.join(dir_name, part) for part in sorted(os.listdir(dir_name)) if part.endswith(PARQUET_SUFFIX)]
+
+
+def parquet_source(table):
+    """
+    True when <table>.parquet/ is the table's source: pyarrow is installed
+    and the dataset is not older than <table>.csv. A run that only
+    rewrote or appended to the CSV leaves an older dataset behind, and
+    then the CSV is read instead.
+    """
+    dir_name = f"{table}{PARQUET_SUFFIX}"
+    if pq is None or not os.path.isdir(dir_name):
+        return False
+    file_name = f"{table}.csv"
+    if not os.path.exists(file_name):
+        return True
+    parts = _parquet_parts(dir_name)
+    return bool(parts) and max(os.path.getmtime(part) for part in parts) >= os.path.getmtime(file_name)
+
+
+def remove_parquet(table):
+    """Delete <table>.parquet/, e.g. when a run rewrites the table as CSV only."""
+    dir_name = f"{table}{PARQUET_SUFFIX}"
+    if os.path.isdir(dir_name):
+        shutil.rmtree(dir_name)
+        print(f"🗑️ Removed outdated '{dir_name}/'")
+
+
+def table_schema(table):
+    """
+    Explicit Arrow schema for one of the normalized tables.
+    """
+    types = {
+        "str": pa.string(),
+        "dict": pa.dictionary(pa.int32(), pa.string()),
+        "int": pa.int32(),
+        "float": pa.float32(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in TABLE_COLUMNS[table]])
+
+
+def _convert(value, kind):
+    """
+    Coerce a transform value to its column type. Values that do not parse,
+    and non-integral numbers in int columns (12.7 is not truncated to 12),
+    become nulls; the CSV output keeps the raw text for validate.py.
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "int":
+            if isinstance(value, str):
+                try:
+                    return int(value)
+                except ValueError:
+                    value = float(value)     # "12.0", "1e3"
+            if isinstance(value, float) and not value.is_integer():
+                return None
+            return int(value)
+        if kind == "float":
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+# ---------------------- Writer ----------------------
+class ParquetTableWriter:
+    """
+    Row-at-a-time Parquet writer for one table, buffering rows into
+    column lists and flushing them as row groups.
+
+    Each table is a directory (<table>.parquet/) of part files: a full run
+    replaces the directory, append=True adds a new part for a delta merge.
+    """
+
+    def __init__(self, table, append=False, row_group_size=ROW_GROUP_SIZE):
+        if pa is None:
+            raise RuntimeError("pyarrow is required for Parquet output (pip install pyarrow)")
+
+        self.table = table
+        self.append = append
+        self.count = 0
+        self.row_group_size = row_group_size
+        self.schema = table_schema(table)
+        self._columns = TABLE_COLUMNS[table]
+        self._buffer = {name: [] for name, _ in self._columns}
+        self._buffered = 0
+
+        self.dir_name = f"{table}{PARQUET_SUFFIX}"
+        if not append and os.path.isdir(self.dir_name):
+            shutil.rmtree(self.dir_name)
+        os.makedirs(self.dir_name, exist_ok=True)
+
+        part = len([p for p in os.listdir(self.dir_name) if p.endswith(PARQUET_SUFFIX)])
+        self.file_name = os.path.join(self.dir_name, f"part-{part:05d}{PARQUET_SUFFIX}")
+        self._writer = pq.ParquetWriter(self.file_name, self.schema, compression="zstd")
+
+    def writerow(self, row):
+        for name, kind in self._columns:
+            self._buffer[name].append(_convert(row.get(name), kind))
+        self._buffered += 1
+        self.count += 1
+        if self._buffered >= self.row_group_size:
+            self._flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def _flush(self):
+        if not self._buffered:
+            return
+        arrays = [
+            pa.array(self._buffer[field.name], type=field.type)
+            for field in self.schema
+        ]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self._buffer = {name: [] for name, _ in self._columns}
+        self._buffered = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        print(f"✅ '{self.file_name}' written with {self.count} records.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------- Reader ----------------------
+def _sort_categories(df):
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+def load_table(table, columns=None):
+    """
+    Load a normalized table as a DataFrame, reading only `columns`.
+
+    Prefers <table>.parquet/ (typed, no re-parsing) and falls back to
+    <table>.csv when it is missing, older than the CSV, or pyarrow is not
+    installed (see parquet_source).
+    Dictionary-encoded columns come back as pandas categoricals with
+    sorted categories, so group-bys order their keys like string columns.
+    """
+    dir_name = f"{table}{PARQUET_SUFFIX}"
+    if parquet_source(table):
+        with instrument.stage(f"load:{dir_name}", bytes_read=instrument.file_size(dir_name)) as st:
+            df = _sort_categories(pq.read_table(dir_name, columns=columns).to_pandas())
+            st.rows_out = len(df)
+        return df
+
+    import pandas as pd
+    file_name = f"{table}.csv"
+    with instrument.stage(f"load:{file_name}", bytes_read=instrument.file_size(file_name)) as st:
+        df = pd.read_csv(file_name, usecols=columns)
+        st.rows_out = len(df)
+    return df
+
+
+def _iter_parquet(paths, columns, chunk_size, st):
+    for path in paths:
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            df = _sort_categories(batch.to_pandas())
+            st.rows_out += len(df)
+            yield df
+
+
+def _iter_csv(source, columns, chunk_size, st, names=None):
+    import pandas as pd
+    header = None if names is not None else "infer"
+    with pd.read_csv(source, usecols=columns, chunksize=chunk_size, names=names, header=header) as reader:
+        for df in reader:
+            st.rows_out += len(df)
+            yield df
+
+
+def iter_table(table, columns=None, chunk_size=ROW_GROUP_SIZE):
+    """
+    Yield a normalized table as DataFrames of at most chunk_size rows, so
+    only one chunk is in memory at a time. Same sources and column types
+    as load_table.
+    """
+    dir_name = f"{table}{PARQUET_SUFFIX}"
+    if parquet_source(table):
+        with instrument.stage(f"load_chunks:{dir_name}", bytes_read=instrument.file_size(dir_name)) as st:
+            st.rows_out = 0
+            yield from _iter_parquet(_parquet_parts(dir_name), columns, chunk_size, st)
+        return
+
+    file_name = f"{table}.csv"
+    with instrument.stage(f"load_chunks:{file_name}", bytes_read=instrument.file_size(file_name)) as st:
+        st.rows_out = 0
+        yield from _iter_csv(file_name, columns, chunk_size, st)
+
+
+# ---------------------- Appends ----------------------
+def table_state(table):
+    """
+    The current files of a table (the source load_table reads), as JSON:
+    the CSV's size and mtime, or those of every Parquet part. None if the
+    table does not exist. Equal states mean the table is unchanged.
+    """
+    dir_name = f"{table}{PARQUET_SUFFIX}"
+    if parquet_source(table):
+        parts = {}
+        for path in _parquet_parts(dir_name):
+            stat = os.stat(path)
+            parts[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+        return {"format": "parquet", "parts": parts}
+
+    file_name = f"{table}.csv"
+    if not os.path.exists(file_name):
+        return None
+    stat = os.stat(file_name)
+    return {"format": "csv", "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "tail": _csv_tail_digest(file_name, stat.st_size)}
+
+
+def _csv_tail_digest(file_name, size, length=4096):
+    """SHA-256 of the `length` bytes before `size`: unchanged by appends, changed by most rewrites."""
+    with open(file_name, "rb") as f:
+        f.seek(max(size - length, 0))
+        return hashlib.sha256(f.read(min(size, length))).hexdigest()
+
+
+def iter_appended(table, state, columns=None, chunk_size=ROW_GROUP_SIZE):
+    """
+    Like iter_table, but only the rows added since table_state(table) was
+    `state`: the Parquet parts written since, or the CSV bytes past its old
+    size. Raises ValueError when the table was rewritten, not appended to.
+    """
+    current = table_state(table)
+    if state is None or current is None or current["format"] != state["format"]:
+        raise ValueError(f"'{table}' changed format since the given state")
+
+    if current["format"] == "parquet":
+        if any(current["parts"].get(part) != info for part, info in state["parts"].items()):
+            raise ValueError(f"'{table}' parts were rewritten since the given state")
+        dir_name = f"{table}{PARQUET_SUFFIX}"
+        paths = [os.path.join(dir_name, part) for part in current["parts"] if part not in state["parts"]]
+        return _iter_appended_parquet(dir_name, paths, columns, chunk_size)
+
+    if current["size"] < state["size"] or _csv_tail_digest(f"{table}.csv", state["size"]) != state["tail"]:
+        raise ValueError(f"'{table}.csv' was rewritten since the given state")
+    return _iter_appended_csv(f"{table}.csv", state["size"], columns, chunk_size)
+
+
+def _iter_appended_parquet(dir_name, paths, columns, chunk_size):
+    bytes_read = sum(instrument.file_size(path) for path in paths)
+    with instrument.stage(f"load_appended:{dir_name}", bytes_read=bytes_read) as st:
+        st.rows_out = 0
+        yield from _iter_parquet(paths, columns, chunk_size, st)
+
+
+def _iter_appended_csv(file_name, offset, columns, chunk_size):
+    size = instrument.file_size(file_name)
+    with instrument.stage(f"load_appended:{file_name}", bytes_read=size - offset) as st:
+        st.rows_out = 0
+        with open(file_name, "rb") as f:
+            names = next(csv.reader([f.readline().decode("utf-8")]))
+            offset = max(offset, f.tell())     # a state taken before the header was written
+            if offset >= size:
+                return
+            f.seek(offset)
+            yield from _iter_csv(f, columns, chunk_size, st, names=names)
+
+
+def to_numeric(values):
+    """
+    Numeric view of a column, NaN where a value does not parse. Parquet's
+    float32 columns are widened through their shortest repr, so they give
+    the same float64 values as parsing the CSV text.
+    """
+    import pandas as pd
+    values = pd.to_numeric(values, errors="coerce")
+    if values.dtype == "float32":
+        values = values.astype(str).astype("float64")
+    return values
+
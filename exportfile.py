@@ -1,12 +1,114 @@
-import firebase_admin # type: ignore
-from firebase_admin import credentials, firestore # type: ignore
+import argparse
+import asyncio
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instrument
+
+# ---------------------- Config ----------------------
+SERVICE_ACCOUNT_FILE = "ServiceAccountKey.json"
+EMULATOR_PROJECT_ID = "demo-recipes"
+COLLECTIONS = ["users", "recipes", "interactions"]
+
+PAGE_SIZE = 1000
+DEFAULT_WORKERS = 4
+DOCUMENT_ID = "__name__"
+CHECKPOINT_SUFFIX = ".export_checkpoint.json"
+
+# Incremental export: the creation-time field used as each collection's high-water mark
+STATE_FILE = "export_state.json"
+WATERMARK_FIELDS = {"users": "joined_at", "recipes": "created_at", "interactions": "timestamp"}
+DELTA_SUFFIX = ".delta.json"
+
+# Async export: page queries in flight across all collections, and pages
+# buffered per collection before its reader waits for the file writer
+MAX_CONCURRENT_QUERIES = 6
+BUFFERED_PAGES = 4
 
 # ---------------------- Initialize Firebase ----------------------
-cred = credentials.Certificate("ServiceAccountKey.json")
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+_db = None
+_async_db = None
+
+def _init_firebase():
+    import firebase_admin # type: ignore
+    from firebase_admin import credentials # type: ignore
+
+    try:
+        firebase_admin.get_app()
+        return      # already initialized by the other client
+    except ValueError:
+        pass
+    if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+        project_id = os.environ.get("GCLOUD_PROJECT", EMULATOR_PROJECT_ID)
+        firebase_admin.initialize_app(options={"projectId": project_id})
+    else:
+        cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
+        firebase_admin.initialize_app(cred)
+
+def get_db():
+    """
+    Return the Firestore client, initializing Firebase on first use.
+    """
+    global _db
+    if _db is None:
+        from firebase_admin import firestore # type: ignore
+        _init_firebase()
+        _db = firestore.client()
+    return _db
+
+def get_async_db():
+    """
+    Return the asyncio Firestore client (AsyncClient), initializing Firebase on first use.
+    """
+    global _async_db
+    if _async_db is None:
+        from firebase_admin import firestore_async # type: ignore
+        _init_firebase()
+        _async_db = firestore_async.client()
+    return _async_db
+
+# ---------------------- High-Water Marks ----------------------
+_state_lock = threading.Lock()
+
+
+class HighWaterMark:
+    """
+    Largest value of a collection's watermark field seen so far and the
+    ids of the documents at exactly that value. Every export mode tracks
+    one, so the next --delta export starts where this one ended.
+    """
+
+    def __init__(self, collection_name, mark=None):
+        self.collection_name = collection_name
+        self.field = WATERMARK_FIELDS[collection_name]
+        self.value = mark["value"] if mark else None
+        self.ids = set(mark["ids_at_value"]) if mark else set()
+        self._lock = threading.Lock()
+
+    def observe(self, doc_id, doc_dict):
+        value = doc_dict.get(self.field)
+        if value is None:
+            return
+        with self._lock:
+            if self.value is None or value > self.value:
+                self.value, self.ids = value, {doc_id}
+            elif value == self.value:
+                self.ids.add(doc_id)
+
+    def as_state(self):
+        return {"field": self.field, "value": self.value, "ids_at_value": sorted(self.ids)}
+
+    def save(self):
+        """Store the mark in export_state.json (nothing to store for an empty collection)."""
+        if self.value is None:
+            return
+        with _state_lock:
+            state = load_export_state()
+            state[self.collection_name] = self.as_state()
+            save_export_state(state)
+
 
 # ---------------------- Helper Function ----------------------
 def export_collection_to_json(collection_name):
@@ -15,32 +117,478 @@ def export_collection_to_json(collection_name):
     """
     print(f"🔄 Exporting collection '{collection_name}'...")
 
-    collection_ref = db.collection(collection_name)
+    collection_ref = get_db().collection(collection_name)
     docs = list(collection_ref.stream())
 
     if not docs:
         print(f"⚠️ No documents found in {collection_name}")
-        return
+        return 0
 
+    mark = HighWaterMark(collection_name)
     data = []
     for doc in docs:
         doc_dict = doc.to_dict()
+        mark.observe(doc.id, doc_dict)
         doc_dict['id'] = doc.id
         data.append(doc_dict)
 
     file_path = os.path.join(os.getcwd(), f"{collection_name}.json")
     with open(file_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
+    mark.save()
 
     print(f"✅ '{collection_name}.json' exported with {len(data)} documents.")
+    return len(data)
+
+
+def doc_to_json_line(doc):
+    doc_dict = doc.to_dict()
+    doc_dict['id'] = doc.id
+    return json.dumps(doc_dict, ensure_ascii=False, default=str) + "\n"
+
+
+# ---------------------- Paginated Export ----------------------
+class ExportCheckpoint:
+    """
+    Per-collection progress file: the key range of every partition, the
+    last document id written for it and the byte offset of its part file.
+    """
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, collection_name, page_size):
+        path = os.path.join(os.getcwd(), f"{collection_name}{CHECKPOINT_SUFFIX}")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("collection") != collection_name or state.get("page_size") != page_size:
+            return None
+        return cls(path, state)
+
+    @classmethod
+    def create(cls, collection_name, page_size, bounds):
+        path = os.path.join(os.getcwd(), f"{collection_name}{CHECKPOINT_SUFFIX}")
+        state = {
+            "collection": collection_name,
+            "page_size": page_size,
+            "partitions": [
+                {"start": start, "end": end, "last_id": None, "offset": 0, "count": 0, "done": False}
+                for start, end in bounds
+            ]
+        }
+        checkpoint = cls(path, state)
+        checkpoint.save()
+        return checkpoint
+
+    @property
+    def partitions(self):
+        return self.state["partitions"]
+
+    def update(self, index, **fields):
+        with self._lock:
+            self.partitions[index].update(fields)
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def split_key_range(collection_name, workers):
+    """
+    Split a collection's document-id range into up to `workers` contiguous
+    (start_id, end_id) ranges; None marks an open end.
+    """
+    if workers <= 1:
+        return [(None, None)]
+
+    try:
+        partitions = list(get_db().collection_group(collection_name).get_partitions(workers))
+    except Exception as e:
+        # e.g. the emulator does not implement PartitionQuery
+        print(f"⚠️ Could not partition '{collection_name}' ({e}); using a single reader")
+        return [(None, None)]
+
+    # QueryPartition.start_at / end_at are document references, None at the open ends
+    bounds = []
+    for p in partitions:
+        start = p.start_at.id if p.start_at is not None else None
+        end = p.end_at.id if p.end_at is not None else None
+        bounds.append((start, end))
+    return bounds or [(None, None)]
+
+
+def _export_partition(collection_name, index, checkpoint, part_path):
+    """
+    Page through one key range with order_by(__name__).start_after(...),
+    appending each document to the part file as it arrives.
+    """
+    collection_ref = get_db().collection(collection_name)
+    part = checkpoint.partitions[index]
+    page_size = checkpoint.state["page_size"]
+
+    query = collection_ref.order_by(DOCUMENT_ID)
+    if part["end"] is not None:
+        query = query.end_before([collection_ref.document(part["end"])])
+
+    with open(part_path, 'ab') as f:
+        # Drop anything written after the last checkpointed page
+        f.truncate(part["offset"])
+        f.seek(part["offset"])
+
+        last_id = part["last_id"]
+        count = part["count"]
+        while not part["done"]:
+            page = query.limit(page_size)
+            if last_id is not None:
+                page = page.start_after([collection_ref.document(last_id)])
+            elif part["start"] is not None:
+                page = page.start_at([collection_ref.document(part["start"])])
+
+            fetched = 0
+            for doc in page.stream():
+                f.write(doc_to_json_line(doc).encode('utf-8'))
+                last_id = doc.id
+                fetched += 1
+
+            f.flush()
+            os.fsync(f.fileno())
+            count += fetched
+            checkpoint.update(index, last_id=last_id, offset=f.tell(), count=count,
+                              done=fetched < page_size)
+
+    return count
+
+
+def _stitch_parts(file_path, part_paths, mark=None):
+    """
+    Concatenate the line-delimited part files into one JSON array, streaming.
+    With a HighWaterMark, every document is also observed by it (this
+    covers pages written before a resume too).
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write("[\n")
+        first = True
+        for part_path in part_paths:
+            with open(part_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if mark is not None:
+                        doc_dict = json.loads(line)
+                        mark.observe(doc_dict.get("id"), doc_dict)
+                    out.write(("" if first else ",\n") + line.rstrip("\n"))
+                    first = False
+        out.write("\n]\n")
+    os.replace(tmp_path, file_path)
+
+
+def export_collection_paginated(collection_name, workers=DEFAULT_WORKERS, page_size=PAGE_SIZE,
+                                resume=True):
+    """
+    Export a collection with cursor-based pages read by several workers in
+    parallel. An interrupted export resumes from its last completed page.
+    """
+    print(f"🔄 Exporting collection '{collection_name}' (paginated)...")
+
+    checkpoint = ExportCheckpoint.load(collection_name, page_size) if resume else None
+    if checkpoint is not None:
+        print(f"↩️ Resuming '{collection_name}' from checkpoint")
+    else:
+        bounds = split_key_range(collection_name, workers)
+        checkpoint = ExportCheckpoint.create(collection_name, page_size, bounds)
+
+    file_path = os.path.join(os.getcwd(), f"{collection_name}.json")
+    part_paths = [f"{file_path}.part{i}" for i in range(len(checkpoint.partitions))]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(_export_partition, collection_name, i, checkpoint, part_paths[i])
+            for i in range(len(checkpoint.partitions))
+        ]
+        total = sum(future.result() for future in futures)
+
+    if total == 0:
+        print(f"⚠️ No documents found in {collection_name}")
+    else:
+        mark = HighWaterMark(collection_name)
+        _stitch_parts(file_path, part_paths, mark)
+        mark.save()
+        print(f"✅ '{collection_name}.json' exported with {total} documents.")
+
+    for part_path in part_paths:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    checkpoint.remove()
+    return total
+
+
+# ---------------------- Async Export ----------------------
+async def _read_pages(db, collection_name, page_size, queries, pages, mark):
+    """
+    Page through a collection by document id, putting each page (a list
+    of JSON lines) on the queue; a full queue pauses the reader.
+    """
+    query = db.collection(collection_name).order_by(DOCUMENT_ID)
+    last_doc = None
+    while True:
+        page = query.limit(page_size)
+        if last_doc is not None:
+            page = page.start_after(last_doc)
+
+        lines = []
+        async with queries:
+            async for doc in page.stream():
+                lines.append(doc_to_json_line(doc).rstrip("\n"))
+                mark.observe(doc.id, doc.to_dict())
+                last_doc = doc
+
+        if lines:
+            await pages.put(lines)
+        if len(lines) < page_size:
+            await pages.put(None)
+            return
+
+
+async def _write_pages(file_path, pages):
+    """Write queued pages as one JSON array; file I/O runs off the event loop."""
+    tmp_path = file_path + ".tmp"
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        await asyncio.to_thread(out.write, "[\n")
+        while True:
+            lines = await pages.get()
+            if lines is None:
+                break
+            chunk = ("" if count == 0 else ",\n") + ",\n".join(lines)
+            await asyncio.to_thread(out.write, chunk)
+            count += len(lines)
+        await asyncio.to_thread(out.write, "\n]\n")
+    os.replace(tmp_path, file_path)
+    return count
+
+
+async def export_collection_async(db, collection_name, queries, page_size=PAGE_SIZE,
+                                  buffered_pages=BUFFERED_PAGES):
+    """
+    Export one collection with a reader and a writer task joined by a
+    bounded queue, so memory stays at about buffered_pages pages.
+    """
+    print(f"🔄 Exporting collection '{collection_name}' (async)...")
+    file_path = os.path.join(os.getcwd(), f"{collection_name}.json")
+    pages = asyncio.Queue(maxsize=buffered_pages)
+    mark = HighWaterMark(collection_name)
+
+    writer = asyncio.create_task(_write_pages(file_path, pages))
+    try:
+        await _read_pages(db, collection_name, page_size, queries, pages, mark)
+    except BaseException:
+        writer.cancel()
+        raise
+    count = await writer
+
+    if count == 0:
+        os.remove(file_path)
+        print(f"⚠️ No documents found in {collection_name}")
+    else:
+        mark.save()
+        print(f"✅ '{collection_name}.json' exported with {count} documents.")
+    return count
+
+
+async def export_collections_async(collections=COLLECTIONS, page_size=PAGE_SIZE,
+                                   max_concurrent_queries=MAX_CONCURRENT_QUERIES,
+                                   buffered_pages=BUFFERED_PAGES, db=None):
+    """
+    Stream all collections at the same time on an AsyncClient (or any
+    client with the same async query API, e.g. a local fake), with at most
+    max_concurrent_queries page queries in flight. Returns {collection: count}.
+    """
+    db = db or get_async_db()
+    queries = asyncio.Semaphore(max(1, max_concurrent_queries))
+    counts = await asyncio.gather(*(
+        export_collection_async(db, col, queries, page_size, buffered_pages)
+        for col in collections
+    ))
+    return dict(zip(collections, counts))
+
+
+# ---------------------- Incremental (Delta) Export ----------------------
+def load_export_state():
+    """
+    Read the high-water marks left by the previous export:
+    {collection: {"field": ..., "value": ..., "ids_at_value": [...]}}.
+    """
+    path = os.path.join(os.getcwd(), STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_export_state(state):
+    path = os.path.join(os.getcwd(), STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def _iter_new_docs(collection_name, mark, page_size):
+    """
+    Page through documents whose watermark field is at or after the mark.
+    Without a mark (first run) the whole collection is read.
+    """
+    collection_ref = get_db().collection(collection_name)
+    if mark is None:
+        query = collection_ref.order_by(DOCUMENT_ID)
+    else:
+        from google.cloud.firestore_v1.base_query import FieldFilter # type: ignore
+        query = (
+            collection_ref
+            .where(filter=FieldFilter(mark["field"], ">=", mark["value"]))
+            .order_by(mark["field"])
+            .order_by(DOCUMENT_ID)
+        )
+
+    last_doc = None
+    while True:
+        page = query.limit(page_size)
+        if last_doc is not None:
+            page = page.start_after(last_doc)
+
+        fetched = 0
+        for doc in page.stream():
+            yield doc
+            last_doc = doc
+            fetched += 1
+
+        if fetched < page_size:
+            return
+
+
+def delta_path(collection_name):
+    """
+    Where the next delta of a collection goes: <collection>.delta.json, or
+    <collection>.delta.<n>.json while earlier deltas are still unmerged.
+    """
+    base = os.path.join(os.getcwd(), collection_name)
+    path, n = base + DELTA_SUFFIX, 0
+    while os.path.exists(path):
+        n += 1
+        path = f"{base}.delta.{n}.json"
+    return path
+
+
+def export_collection_delta(collection_name, state, page_size=PAGE_SIZE):
+    """
+    Export only the documents created since the last run to
+    <collection>.delta.json and advance the collection's high-water mark.
+    A delta that was not merged yet is kept: the new one goes next to it
+    (see delta_path) and transfer.merge_deltas merges them in order. When
+    nothing is new, no file is written.
+
+    The mark is compared with >= and the ids already seen at exactly that
+    value are skipped, so documents sharing the boundary timestamp are
+    neither lost nor exported twice.
+
+    Without a mark the whole collection would be exported, so that is
+    refused when <collection>.json already exists: merging such a delta
+    would duplicate every row. Full exports record the mark.
+    """
+    mark = state.get(collection_name)
+    if mark is None and os.path.exists(os.path.join(os.getcwd(), f"{collection_name}.json")):
+        raise RuntimeError(f"No high-water mark for '{collection_name}' in {STATE_FILE}, but "
+                           f"'{collection_name}.json' exists; run a full export first")
+    seen_at_mark = set(mark["ids_at_value"]) if mark else set()
+
+    print(f"🔄 Exporting new documents from '{collection_name}' "
+          f"(since {mark['value'] if mark else 'the beginning'})...")
+
+    high_water = HighWaterMark(collection_name, mark)
+
+    file_path = delta_path(collection_name)
+    tmp_path = file_path + ".tmp"
+    count = 0
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write("[\n")
+        for doc in _iter_new_docs(collection_name, mark, page_size):
+            if doc.id in seen_at_mark:
+                continue
+
+            out.write(("" if count == 0 else ",\n") + doc_to_json_line(doc).rstrip("\n"))
+            count += 1
+            high_water.observe(doc.id, doc.to_dict())
+        out.write("\n]\n")
+    if count == 0:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, file_path)
+
+    if high_water.value is not None:
+        state[collection_name] = high_water.as_state()
+        high_water.save()
+
+    if count == 0:
+        print(f"✅ No new documents in '{collection_name}'.")
+    else:
+        print(f"✅ '{os.path.basename(file_path)}' exported with {count} new documents.")
+    return count
 
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
-    collections = ["users", "recipes", "interactions"]
+    parser = argparse.ArgumentParser(description="Export Firestore collections to JSON files.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="parallel readers per collection")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help="documents fetched per cursor page")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore existing checkpoints and start over")
+    parser.add_argument("--simple", action="store_true",
+                        help="use the original single-read export")
+    parser.add_argument("--delta", action="store_true",
+                        help=f"only export documents created since the last run (tracked in {STATE_FILE})")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="stream all collections concurrently with the asyncio client")
+    parser.add_argument("--max-queries", type=int, default=MAX_CONCURRENT_QUERIES,
+                        help="page queries in flight at once with --async")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
 
-    for col in collections:
-        export_collection_to_json(col)
+    instrument.enable_from_args(args)
+    if args.use_async:
+        # All collections at once; one stage since the collections overlap in time
+        with instrument.stage("export:all") as st:
+            counts = asyncio.run(export_collections_async(page_size=args.page_size,
+                                                          max_concurrent_queries=args.max_queries))
+            st.rows_out = sum(counts.values())
+            st.bytes_written = sum(instrument.file_size(f"{col}.json") for col in COLLECTIONS)
+    else:
+        state = load_export_state() if args.delta else None
+        for col in COLLECTIONS:
+            with instrument.stage(f"export:{col}") as st:
+                if args.delta:
+                    output = delta_path(col)
+                    st.rows_out = export_collection_delta(col, state, args.page_size)
+                elif args.simple:
+                    st.rows_out = export_collection_to_json(col)
+                    output = f"{col}.json"
+                else:
+                    st.rows_out = export_collection_paginated(col, args.workers, args.page_size,
+                                                              resume=not args.fresh)
+                    output = f"{col}.json"
+                st.bytes_written = instrument.file_size(output)
 
     print("🎉 All collections exported successfully!")
-
+    instrument.finish()
@@ -0,0 +1,298 @@
+"""
+Interaction fact store: the interaction metrics as fixed-width binary
+columns that the analytics np.memmap instead of parsing interactions.csv.
+
+    interaction_facts/
+        meta.json           row count, the dtype of every column and the
+                            interactions table state it was written from
+        recipe_code.bin     int32 code into recipe_ids.json (-1: no recipe_id)
+        user_code.bin       int32 code into user_ids.json (-1: no user_id)
+        views.bin, likes.bin, rating.bin, cook_attempts.bin
+                            numeric values, NaN where the table value does not parse
+
+The store is written a chunk of the table at a time. Codes are given in
+first-seen order, so a delta ETL run appends the rows added to the
+interactions table since the last run without renumbering the others.
+Processes that map the same files share their pages through the OS cache.
+
+Usage:
+- python fact_store.py              rebuild from the interactions table
+- python fact_store.py --update     append the interactions added since the last run
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+import instrument
+from columnar import iter_appended, iter_table, table_state, to_numeric
+
+FACT_DIR = "interaction_facts"
+FACT_VERSION = 2
+SOURCE_TABLE = "interactions"
+METRICS = ["views", "likes", "rating", "cook_attempts"]
+CODES = {"recipe_code": "recipe_id", "user_code": "user_id"}
+DEFAULT_CHUNK_SIZE = 128 * 1024
+WIDEN_BLOCK_ROWS = 1 << 20
+
+
+# ---------------------- Write ----------------------
+class _NeedsRebuild(Exception):
+    """An append would change a column's dtype, which only a rebuild does."""
+
+
+def _widen(path, dtype, new_dtype):
+    """Rewrite a column file with a wider dtype, a block at a time."""
+    tmp_path = path + ".tmp"
+    with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+        while True:
+            block = np.fromfile(src, dtype=dtype, count=WIDEN_BLOCK_ROWS)
+            if not len(block):
+                break
+            block.astype(new_dtype).tofile(dst)
+    os.replace(tmp_path, path)
+
+
+class _FactWriter:
+    """
+    Writes interaction chunks to the column files of a fact store, from
+    scratch or after the `rows` rows of an existing one (append=True).
+    """
+
+    def __init__(self, fact_dir, meta=None):
+        self.fact_dir = fact_dir
+        self.append = meta is not None
+        self.rows = meta["rows"] if meta else 0
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in meta["columns"].items()} if meta else {}
+        self.ids, self.codes = {}, {}
+        for id_column in CODES.values():
+            ids = []
+            if self.append:
+                with open(os.path.join(fact_dir, f"{id_column}s.json"), "r", encoding="utf-8") as f:
+                    ids = json.load(f)
+            self.ids[id_column] = ids
+            self.codes[id_column] = {value: code for code, value in enumerate(ids)}
+        self._files = {}
+        for name in list(CODES) + METRICS:
+            path = os.path.join(fact_dir, f"{name}.bin")
+            f = open(path, "r+b" if self.append else "wb")
+            if self.append:
+                # Drop the rows of an append that did not finish
+                f.truncate(self.rows * self.dtypes[name].itemsize)
+                f.seek(0, os.SEEK_END)
+            self._files[name] = f
+
+    def _encode(self, values, id_column):
+        """int32 codes of the ids, adding new ones to the dictionary (-1: missing)."""
+        import pandas as pd
+
+        local, uniques = pd.factorize(values.astype(object).where(values.notna()))
+        codes, ids = self.codes[id_column], self.ids[id_column]
+        mapping = np.empty(len(uniques) + 1, dtype=np.int32)
+        for i, value in enumerate(uniques.tolist()):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(ids)
+                ids.append(value)
+            mapping[i] = code
+        mapping[-1] = -1
+        return mapping[local]
+
+    def _write(self, name, values):
+        dtype = self.dtypes.get(name)
+        if dtype is None:
+            dtype = self.dtypes[name] = values.dtype
+        elif np.result_type(dtype, values.dtype) != dtype:
+            # Whole-table coercion gives one dtype per column (e.g. float once
+            # any value fails to parse as int), so the rows already written follow
+            if self.append:
+                raise _NeedsRebuild(name)
+            new_dtype = np.result_type(dtype, values.dtype)
+            self._files[name].close()
+            path = os.path.join(self.fact_dir, f"{name}.bin")
+            _widen(path, dtype, new_dtype)
+            self._files[name] = open(path, "ab")
+            dtype = self.dtypes[name] = new_dtype
+        values.astype(dtype, copy=False).tofile(self._files[name])
+
+    def write(self, chunk):
+        for code_column, id_column in CODES.items():
+            self._write(code_column, self._encode(chunk[id_column], id_column))
+        for metric in METRICS:
+            # The dtype the analytics load gives (int when every value parses)
+            self._write(metric, to_numeric(chunk[metric]).to_numpy())
+        self.rows += len(chunk)
+
+    def close(self, source):
+        """Close the columns, then write the dictionaries and meta.json (last, so readers see whole rows)."""
+        for f in self._files.values():
+            f.close()
+        for id_column, ids in self.ids.items():
+            _write_json(os.path.join(self.fact_dir, f"{id_column}s.json"), ids)
+        columns = {name: self.dtypes.get(name, np.dtype(np.int32 if name in CODES else np.int64)).str
+                   for name in self._files}
+        _write_json(os.path.join(self.fact_dir, "meta.json"),
+                    {"version": FACT_VERSION, "rows": self.rows, "columns": columns, "source": source}, indent=2)
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+
+
+def _write_json(path, value, indent=None):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def _read_meta(fact_dir):
+    try:
+        with open(os.path.join(fact_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == FACT_VERSION else None
+
+
+def build_fact_store(fact_dir=FACT_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write the fact store from the interactions table, a chunk at a time
+    (memory is one chunk plus the id dictionaries); returns the row count.
+    """
+    with instrument.stage("facts:build") as st:
+        source = table_state(SOURCE_TABLE)
+        tmp_dir = fact_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        writer = _FactWriter(tmp_dir)
+        try:
+            for chunk in iter_table(SOURCE_TABLE, list(CODES.values()) + METRICS, chunk_size):
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close(source)
+        shutil.rmtree(fact_dir, ignore_errors=True)
+        os.replace(tmp_dir, fact_dir)
+
+        st.rows_in = st.rows_out = writer.rows
+        st.bytes_written = instrument.file_size(fact_dir)
+
+    print(f"✅ '{fact_dir}/' written with {writer.rows} interactions.")
+    return writer.rows
+
+
+def update_fact_store(fact_dir=FACT_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Append the interactions added since the store was last written,
+    reading only those rows. Rebuilds the store when it is missing, the
+    interactions table was rewritten rather than appended to, or the new
+    rows change a column's dtype.
+    """
+    meta = _read_meta(fact_dir)
+    if meta is None:
+        return build_fact_store(fact_dir, chunk_size)
+    source = table_state(SOURCE_TABLE)
+    if meta.get("source") == source:
+        print(f"✅ '{fact_dir}/' is up to date.")
+        return meta["rows"]
+    try:
+        chunks = iter_appended(SOURCE_TABLE, meta.get("source"), list(CODES.values()) + METRICS, chunk_size)
+    except ValueError as e:
+        print(f"⚠️ {e}; rebuilding '{fact_dir}/'")
+        return build_fact_store(fact_dir, chunk_size)
+
+    with instrument.stage("facts:append") as st:
+        writer = _FactWriter(fact_dir, meta)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except _NeedsRebuild as e:
+            writer.abort()
+            print(f"⚠️ New '{e}' values change its type; rebuilding '{fact_dir}/'")
+            return build_fact_store(fact_dir, chunk_size)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close(source)
+        st.rows_in = st.rows_out = writer.rows - meta["rows"]
+        st.bytes_written = instrument.file_size(fact_dir)
+
+    print(f"✅ '{fact_dir}/' appended with {writer.rows - meta['rows']} interactions ({writer.rows} in all).")
+    return writer.rows
+
+
+# ---------------------- Read ----------------------
+class InteractionFacts:
+    """Read-only, memory-mapped view of a fact store."""
+
+    def __init__(self, fact_dir=FACT_DIR):
+        self.fact_dir = fact_dir
+        with open(os.path.join(fact_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FACT_VERSION:
+            raise ValueError(f"'{fact_dir}' was written by another version; rebuild it")
+        self.rows = self.meta["rows"]
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """One column as a read-only array backed by the mapped file."""
+        if name not in self._columns:
+            dtype = np.dtype(self.meta["columns"][name])
+            if self.rows == 0:
+                values = np.zeros(0, dtype=dtype)     # an empty file cannot be mapped
+            else:
+                values = np.memmap(os.path.join(self.fact_dir, f"{name}.bin"), dtype=dtype,
+                                   mode="r", shape=(self.rows,))
+            self._columns[name] = values
+        return self._columns[name]
+
+    def ids(self, id_column):
+        """Code -> id for recipe_id or user_id, as an object array."""
+        with open(os.path.join(self.fact_dir, f"{id_column}s.json"), "r", encoding="utf-8") as f:
+            return np.array(json.load(f), dtype=object)
+
+    def to_frame(self, columns):
+        """The given interaction columns as a DataFrame; recipe_id / user_id come back categorical."""
+        import pandas as pd
+
+        data = {}
+        for name in columns:
+            code_column = next((code for code, id_column in CODES.items() if id_column == name), None)
+            if code_column is None:
+                data[name] = self.column(name)
+            else:
+                data[name] = pd.Categorical.from_codes(self.column(code_column), self.ids(name))
+        return pd.DataFrame(data)
+
+
+def open_fact_store(fact_dir=FACT_DIR):
+    """The fact store, or None if it is missing or behind the interactions table."""
+    meta = _read_meta(fact_dir)
+    if meta is None or meta.get("source") != table_state(SOURCE_TABLE):
+        return None
+    return InteractionFacts(fact_dir)
+
+
+# ---------------------- Run ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the memory-mapped interaction fact store.")
+    parser.add_argument("--update", action="store_true",
+                        help="only append interactions added since the last build/update")
+    parser.add_argument("--fact-dir", default=FACT_DIR)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    if args.update:
+        update_fact_store(args.fact_dir)
+    else:
+        build_fact_store(args.fact_dir)
+    instrument.finish()
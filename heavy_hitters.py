@@ -0,0 +1,127 @@
+"""
+Approximate top-k recipes over an unbounded interaction stream, with a
+weighted Space-Saving sketch that keeps at most `capacity` counters.
+
+Every recipe whose true total exceeds (stream total / capacity) is
+guaranteed to be tracked, and each estimate overshoots the true total by
+at most its recorded error. Memory is one chunk of interactions plus
+`capacity` counters, however long the stream runs; the exact insights in
+analytics.py remain the reference.
+
+Usage:
+- python heavy_hitters.py --metric views --top 10 --capacity 1000
+"""
+
+import argparse
+import heapq
+
+import instrument
+from columnar import iter_table, to_numeric
+
+STREAM_METRICS = ["views", "likes", "cook_attempts", "engagement"]
+DEFAULT_CAPACITY = 1000
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+# ---------------------- Sketch ----------------------
+class SpaceSaving:
+    """
+    Weighted Space-Saving (Metwally et al.): a counter per monitored item;
+    an unmonitored item takes over the smallest counter, inheriting its
+    count as the error bound.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}       # item -> (count, error)
+        self._heap = []         # (count, item); entries whose count is outdated are skipped
+
+    def __len__(self):
+        return len(self._counts)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self._counts.get(item, (None,))[0] == count:
+                return item, count
+
+    def update(self, item, weight=1):
+        """Add a non-negative weight for item; other weights are ignored."""
+        if not weight > 0:
+            return
+        self.total += weight
+        if item in self._counts:
+            count, error = self._counts[item]
+            count += weight
+        elif len(self._counts) < self.capacity:
+            count, error = weight, 0
+        else:
+            evicted, error = self._pop_min()
+            del self._counts[evicted]
+            count = error + weight
+        self._counts[item] = (count, error)
+        heapq.heappush(self._heap, (count, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, (count, _) in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def update_many(self, items, weights):
+        for item, weight in zip(items, weights):
+            self.update(item, weight)
+
+    def top(self, k):
+        """The k largest estimates as (item, estimate, error), largest first."""
+        ranked = sorted(self._counts.items(), key=lambda entry: (-entry[1][0], entry[0]))
+        return [(item, count, error) for item, (count, error) in ranked[:k]]
+
+
+# ---------------------- Stream ----------------------
+def stream_top(metric="views", k=10, capacity=DEFAULT_CAPACITY, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Approximate top-k recipe names by total `metric`, reading interactions
+    in chunks. Each chunk is summed per recipe name before it is fed to the
+    sketch, so the sketch sees one update per name per chunk. Interactions
+    whose recipe_id is not in the recipes table are left out, as in the
+    exact insights.
+    """
+    from analytics_engine import load_recipes
+
+    if metric not in STREAM_METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    sources = ["views", "likes", "cook_attempts"] if metric == "engagement" else [metric]
+
+    recipes = load_recipes()
+    recipe_ids = recipes["recipe_id"].astype(str)
+    names = recipes["name"].set_axis(recipe_ids)[~recipe_ids.duplicated().to_numpy()]
+    sketch = SpaceSaving(capacity)
+    with instrument.stage(f"heavy_hitters:{metric}") as st:
+        st.rows_in = 0
+        for chunk in iter_table("interactions", ["recipe_id"] + sources, chunk_size):
+            st.rows_in += len(chunk)
+            weights = sum(to_numeric(chunk[col]).fillna(0) for col in sources)
+            recipe_names = chunk["recipe_id"].astype(str).map(names)
+            per_name = weights.groupby(recipe_names.to_numpy(), dropna=True).sum()
+            sketch.update_many(per_name.index, per_name.to_numpy().tolist())
+        st.rows_out = len(sketch)
+    return sketch.top(k)
+
+
+# ---------------------- CLI ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Approximate top-k recipes over the interaction stream.")
+    parser.add_argument("--metric", choices=STREAM_METRICS, default="views")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                        help="counters kept by the sketch (memory bound)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, metavar="ROWS")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    for name, estimate, error in stream_top(args.metric, args.top, args.capacity, args.chunk_size):
+        print(f"{name:<40} {estimate:>14,.0f}  (error ≤ {error:,.0f})")
+    print(f"🔍 Top {args.top} recipes by {args.metric} (approximate, {args.capacity} counters)")
+    instrument.finish()
@@ -0,0 +1,101 @@
+import csv
+import json
+import os
+import re
+
+# ---------------------- Ingredient Dimension ----------------------
+# The ETL writes two small tables next to ingredients.csv:
+#   ingredient_dim.csv       ingredient_key, ingredient_name (normalized), display_name
+#   recipe_ingredients.csv   recipe_id, ingredient_key (one per ingredients.csv row)
+# so ingredient analytics group by integer keys instead of raw strings.
+# ingredient_dim.state.json records the state of the ingredients table
+# (columnar.table_state) the links were built from.
+DIM_TABLE = "ingredient_dim"
+LINK_TABLE = "recipe_ingredients"
+STATE_FILE = f"{DIM_TABLE}.state.json"
+MISSING_KEY = -1          # ingredient rows without a usable name
+
+# Qualifiers such as "(for chapati)" or "(optional)" do not change the ingredient
+_QUALIFIER = re.compile(r"\([^)]*\)")
+
+
+def display_name(name):
+    """The name without qualifiers and with single spaces, e.g. 'Ghee / Oil'."""
+    if not isinstance(name, str):
+        return ""
+    cleaned = " ".join(_QUALIFIER.sub(" ", name).split())
+    return cleaned or " ".join(name.split())
+
+
+def normalize_ingredient(name):
+    """
+    Canonical form used to reconcile variants of one ingredient:
+    'Whole Wheat Flour (for chapati)', 'whole  wheat flour' -> 'whole wheat flour'.
+    """
+    return display_name(name).lower()
+
+
+def save_links_state(state, file_name=STATE_FILE):
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def load_links_state(file_name=STATE_FILE):
+    """The ingredients table state saved with the links, or None."""
+    try:
+        with open(file_name, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class IngredientVocabulary:
+    """
+    Assigns one integer key per normalized ingredient name, in first-seen
+    order. Each distinct raw name is normalized only once.
+    """
+
+    def __init__(self):
+        self.names = []           # key -> normalized name
+        self.display_names = []   # key -> display name of the first variant seen
+        self._keys = {}           # normalized name -> key
+        self._raw = {}            # raw name -> key
+
+    @classmethod
+    def load(cls, file_name=f"{DIM_TABLE}.csv"):
+        """Vocabulary from an existing ingredient_dim.csv (empty if there is none)."""
+        vocab = cls()
+        if os.path.exists(file_name):
+            with open(file_name, "r", newline="", encoding="utf-8") as f:
+                for row in sorted(csv.DictReader(f), key=lambda r: int(r["ingredient_key"])):
+                    vocab._add(row["ingredient_name"], row["display_name"])
+        return vocab
+
+    def __len__(self):
+        return len(self.names)
+
+    def _add(self, name, display):
+        key = len(self.names)
+        self.names.append(name)
+        self.display_names.append(display)
+        self._keys[name] = key
+        return key
+
+    def code(self, raw_name):
+        """Key of a raw ingredient name, adding it to the vocabulary if new."""
+        key = self._raw.get(raw_name)
+        if key is None:
+            name = normalize_ingredient(raw_name)
+            if not name:
+                key = MISSING_KEY
+            else:
+                key = self._keys.get(name)
+                if key is None:
+                    key = self._add(name, display_name(raw_name))
+            if isinstance(raw_name, str):
+                self._raw[raw_name] = key
+        return key
+
+    def rows(self):
+        """(ingredient_key, ingredient_name, display_name) for every key."""
+        return [(key, name, self.display_names[key]) for key, name in enumerate(self.names)]
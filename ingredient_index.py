@@ -0,0 +1,345 @@
+"""
+Inverted index from normalized ingredient to the recipes that use it.
+
+Built by the ETL from recipe_ingredients / ingredient_dim and the
+recipe_stats rollup, and stored as flat arrays that are memory-mapped
+when opened, so a lookup touches only the posting lists it reads:
+
+    ingredient_index/
+        meta.json               counts, posting dtype and the recipe_ingredients
+                                table state the postings were built from
+        vocabulary.json         normalized ingredient names, by ingredient_key
+        posting_offsets.npy     postings[offsets[k]:offsets[k+1]] = recipes of key k
+        postings.npy            sorted recipe ordinals, smallest unsigned dtype that fits
+        recipe_offsets.npy      recipe_ids.bin[offsets[r]:offsets[r+1]] = id of recipe r
+        recipe_ids.bin          UTF-8 recipe ids, sorted
+        engagement.npy          views + likes + cook_attempts per recipe ordinal
+
+Links are read a chunk at a time. A delta ETL run adds only the links
+appended since the last build to the existing postings.
+
+Usage:
+- python ingredient_index.py build
+- python ingredient_index.py update
+- python ingredient_index.py query --all paneer curd --none onion --top 10
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+import instrument
+from columnar import iter_appended, iter_table, load_table, table_state, to_numeric
+from ingredient_dim import DIM_TABLE, LINK_TABLE, MISSING_KEY, normalize_ingredient
+from recipe_stats import open_recipe_stats
+
+INDEX_DIR = "ingredient_index"
+INDEX_VERSION = 2
+DEFAULT_CHUNK_SIZE = 128 * 1024
+_CODE_BITS = 32     # a posting pair is ingredient_key << 32 | recipe code
+
+
+# ---------------------- Build ----------------------
+def _link_pairs(chunks, codes):
+    """
+    Distinct (ingredient_key, recipe) pairs of link chunks, one int64
+    array per chunk. Recipes are coded through `codes` (recipe_id ->
+    code), where new recipe_ids get the next code.
+    """
+    import pandas as pd
+
+    pairs, rows = [], 0
+    for chunk in chunks:
+        rows += len(chunk)
+        chunk = chunk[(chunk["ingredient_key"] != MISSING_KEY) & chunk["recipe_id"].notna()]
+        local, uniques = pd.factorize(chunk["recipe_id"].astype(str))
+        mapping = np.array([codes.setdefault(recipe_id, len(codes)) for recipe_id in uniques.tolist()],
+                           dtype=np.int64)
+        pairs.append(np.unique((chunk["ingredient_key"].to_numpy(np.int64) << _CODE_BITS) | mapping[local]))
+    return pairs, rows
+
+
+def _engagement(recipe_ids, chunk_size):
+    """
+    views + likes + cook_attempts per recipe: from the recipe_stats rollup,
+    or, when it is missing or stale, summed over interaction chunks.
+    """
+    import pandas as pd
+
+    index = pd.Index(recipe_ids, dtype=object)
+    stats = open_recipe_stats(columns=["engagement"])
+    if stats is not None:
+        engagement = pd.Series(stats["engagement"].to_numpy(np.float64), index=stats.index.astype(str))
+        return engagement.reindex(index).fillna(0).to_numpy(np.float64)
+
+    engagement = np.zeros(len(index), dtype=np.float64)
+    for chunk in iter_table("interactions", ["recipe_id", "views", "likes", "cook_attempts"], chunk_size):
+        at = index.get_indexer(chunk["recipe_id"].astype(str))
+        totals = sum(to_numeric(chunk[col]).fillna(0).to_numpy(np.float64) for col in ("views", "likes", "cook_attempts"))
+        engagement += np.bincount(at[at >= 0], weights=totals[at >= 0], minlength=len(index))
+    return engagement
+
+
+def _write_index(index_dir, vocabulary, pairs, codes, links_state, chunk_size):
+    """Write the index from posting pairs coded through `codes`; returns the number of postings."""
+    pairs = np.unique(np.concatenate(pairs)) if pairs else np.zeros(0, dtype=np.int64)
+    keys, recipe_codes = pairs >> _CODE_BITS, pairs & ((1 << _CODE_BITS) - 1)
+
+    # Ordinals follow the sorted recipe_ids, postings are sorted by ingredient then ordinal
+    recipe_ids = np.array(list(codes), dtype=object)
+    order = np.argsort(recipe_ids.astype(str), kind="stable")
+    recipe_ids = recipe_ids[order]
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    ordinals = rank[recipe_codes]
+    sort = np.lexsort((ordinals, keys))
+    keys, ordinals = keys[sort], ordinals[sort]
+
+    dtype = np.min_scalar_type(max(len(recipe_ids) - 1, 0))
+    posting_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=len(vocabulary)), out=posting_offsets[1:])
+    encoded = [recipe_id.encode("utf-8") for recipe_id in recipe_ids]
+    recipe_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=recipe_offsets[1:])
+
+    # Write next to the old index, then swap it in
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "posting_offsets.npy"), posting_offsets)
+    np.save(os.path.join(tmp_dir, "postings.npy"), ordinals.astype(dtype))
+    np.save(os.path.join(tmp_dir, "recipe_offsets.npy"), recipe_offsets)
+    np.save(os.path.join(tmp_dir, "engagement.npy"), _engagement(recipe_ids, chunk_size))
+    with open(os.path.join(tmp_dir, "recipe_ids.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(tmp_dir, "vocabulary.json"), "w", encoding="utf-8") as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": INDEX_VERSION,
+            "recipes": len(recipe_ids),
+            "ingredients": len(vocabulary),
+            "postings": len(ordinals),
+            "posting_dtype": dtype.name,
+            "links": links_state,
+        }, f, indent=2)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+    return len(ordinals)
+
+
+def _vocabulary():
+    return load_table(DIM_TABLE).sort_values("ingredient_key")["ingredient_name"].tolist()
+
+
+def build_index(index_dir=INDEX_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Build the index from the tables in the current folder, reading the
+    links a chunk at a time; returns the number of postings.
+    """
+    with instrument.stage("index:build") as st:
+        links_state = table_state(LINK_TABLE)
+        vocabulary = _vocabulary()
+        codes = {}
+        pairs, st.rows_in = _link_pairs(iter_table(LINK_TABLE, chunk_size=chunk_size), codes)
+        postings = _write_index(index_dir, vocabulary, pairs, codes, links_state, chunk_size)
+        st.rows_out = postings
+        st.bytes_written = instrument.file_size(index_dir)
+
+    print(f"✅ '{index_dir}/' built with {postings} postings "
+          f"({len(vocabulary)} ingredients, {len(codes)} recipes).")
+    return postings
+
+
+def update_index(index_dir=INDEX_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Add the links appended since the index was built to its postings and
+    refresh the engagement scores, without re-reading the other links.
+    Rebuilds the index when it is missing, or when the links or the
+    ingredient keys were rewritten rather than appended to.
+    """
+    try:
+        index = IngredientIndex(index_dir)
+    except (OSError, ValueError):
+        return build_index(index_dir, chunk_size)
+    vocabulary = _vocabulary()
+    links_state = table_state(LINK_TABLE)
+    try:
+        if vocabulary[:len(index.vocabulary)] != index.vocabulary:
+            raise ValueError(f"'{DIM_TABLE}' keys changed since the index was built")
+        chunks = iter_appended(LINK_TABLE, index.meta["links"], chunk_size=chunk_size)
+    except ValueError as e:
+        print(f"⚠️ {e}; rebuilding '{index_dir}/'")
+        return build_index(index_dir, chunk_size)
+
+    with instrument.stage("index:update") as st:
+        # The existing postings, with recipe ordinals as codes
+        codes = {index.recipe_id(ordinal): ordinal for ordinal in range(len(index))}
+        keys = np.repeat(np.arange(len(index.vocabulary), dtype=np.int64), np.diff(index._posting_offsets))
+        pairs = [(keys << _CODE_BITS) | np.asarray(index._postings, dtype=np.int64)]
+        new_pairs, st.rows_in = _link_pairs(chunks, codes)
+        del index       # release the mapped files before they are replaced
+        postings = _write_index(index_dir, vocabulary, pairs + new_pairs, codes, links_state, chunk_size)
+        st.rows_out = postings
+        st.bytes_written = instrument.file_size(index_dir)
+
+    print(f"✅ '{index_dir}/' updated with {st.rows_in} new links ({postings} postings).")
+    return postings
+
+
+# ---------------------- Sorted Posting Lists ----------------------
+# Posting lists are sorted and duplicate-free, so set operations are
+# merges located with np.searchsorted, without re-sorting either side.
+def _contains(postings, ordinals):
+    """Mask of the sorted `ordinals` that appear in the sorted `postings`."""
+    if not len(postings) or not len(ordinals):
+        return np.zeros(len(ordinals), dtype=bool)
+    at = np.minimum(np.searchsorted(postings, ordinals), len(postings) - 1)
+    return postings[at] == ordinals
+
+
+def _intersect(a, b):
+    small, large = (a, b) if len(a) <= len(b) else (b, a)
+    return np.asarray(small)[_contains(large, small)]
+
+
+def _difference(a, b):
+    a = np.asarray(a)
+    return a[~_contains(b, a)]
+
+
+def _union(a, b):
+    a, b = np.asarray(a), _difference(b, a)
+    if not len(b):
+        return a
+    # Positions of b's entries in the merged list
+    at = np.searchsorted(a, b) + np.arange(len(b))
+    merged = np.empty(len(a) + len(b), dtype=np.result_type(a, b))
+    from_a = np.ones(len(merged), dtype=bool)
+    from_a[at] = False
+    merged[at] = b
+    merged[from_a] = a
+    return merged
+
+
+# ---------------------- Query ----------------------
+class IngredientIndex:
+    """
+    Read-only view of a built index. Posting lists are sorted arrays of
+    recipe ordinals, so AND / OR / NOT are sorted-list intersections,
+    unions and differences; only the lists involved are paged in.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR):
+        def array(name):
+            return np.load(os.path.join(index_dir, name), mmap_mode="r")
+
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"'{index_dir}' was built by another version; rebuild it")
+        with open(os.path.join(index_dir, "vocabulary.json"), "r", encoding="utf-8") as f:
+            self.vocabulary = json.load(f)
+        self._keys = {name: key for key, name in enumerate(self.vocabulary)}
+
+        self._posting_offsets = array("posting_offsets.npy")
+        self._postings = array("postings.npy")
+        self._recipe_offsets = array("recipe_offsets.npy")
+        self.engagement = array("engagement.npy")
+        self._recipe_ids = np.memmap(os.path.join(index_dir, "recipe_ids.bin"), dtype=np.uint8, mode="r") \
+            if self._recipe_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        self._empty = np.zeros(0, dtype=self._postings.dtype)
+
+    def __len__(self):
+        return self.meta["recipes"]
+
+    def postings(self, ingredient):
+        """Sorted recipe ordinals using the ingredient (any spelling that normalizes the same)."""
+        key = self._keys.get(normalize_ingredient(ingredient))
+        if key is None:
+            return self._empty
+        return self._postings[self._posting_offsets[key]:self._posting_offsets[key + 1]]
+
+    def all_of(self, ingredients):
+        lists = sorted((self.postings(name) for name in ingredients), key=len)
+        if not lists:
+            return np.arange(len(self), dtype=self._postings.dtype)
+        result = np.asarray(lists[0])
+        for other in lists[1:]:
+            if not len(result):
+                break
+            result = _intersect(result, other)
+        return result
+
+    def any_of(self, ingredients, none_of=()):
+        """Recipes using at least one of the ingredients (and none of `none_of`)."""
+        excluded = [self.postings(name) for name in none_of]
+        result = self._empty
+        for postings in sorted((self.postings(name) for name in ingredients), key=len):
+            # Exclusions are applied per list, before the union grows
+            for other in excluded:
+                postings = _difference(postings, other)
+            result = _union(result, postings)
+        return result
+
+    def query(self, all_of=(), any_of=(), none_of=()):
+        """Recipe ordinals using every `all_of`, at least one `any_of` and no `none_of` ingredient."""
+        if not all_of and any_of:
+            return self.any_of(any_of, none_of)
+        result = self.all_of(all_of)
+        if any_of:
+            # Keep the matches found in any list instead of building the union
+            found = np.zeros(len(result), dtype=bool)
+            for name in any_of:
+                found |= _contains(self.postings(name), result)
+            result = result[found]
+        for name in none_of:
+            result = _difference(result, self.postings(name))
+        return result
+
+    def recipe_id(self, ordinal):
+        start, end = self._recipe_offsets[ordinal], self._recipe_offsets[ordinal + 1]
+        return self._recipe_ids[start:end].tobytes().decode("utf-8")
+
+    def top_k(self, ordinals, k=10):
+        """The k recipes with the highest engagement, as (recipe_id, engagement) pairs."""
+        ordinals = np.asarray(ordinals)
+        if len(ordinals) > k:
+            # Partial selection, then sort only the k winners
+            ordinals = ordinals[np.argpartition(-self.engagement[ordinals], k - 1)[:k]]
+        scores = self.engagement[ordinals]
+        order = np.lexsort((ordinals, -scores))
+        return [(self.recipe_id(ordinals[i]), float(scores[i])) for i in order]
+
+    def search(self, all_of=(), any_of=(), none_of=(), k=None):
+        """recipe_ids matching the query; with k, the top k by engagement with their scores."""
+        ordinals = self.query(all_of, any_of, none_of)
+        if k is not None:
+            return self.top_k(ordinals, k)
+        return [self.recipe_id(ordinal) for ordinal in ordinals]
+
+
+# ---------------------- CLI ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the ingredient -> recipe index.")
+    parser.add_argument("command", choices=["build", "update", "query"])
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--all", nargs="*", default=[], help="recipes must use all of these")
+    parser.add_argument("--any", nargs="*", default=[], help="recipes must use at least one of these")
+    parser.add_argument("--none", nargs="*", default=[], help="recipes must use none of these")
+    parser.add_argument("--top", type=int, default=None, help="only the top N by engagement")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.index_dir)
+    elif args.command == "update":
+        update_index(args.index_dir)
+    else:
+        index = IngredientIndex(args.index_dir)
+        results = index.search(args.all, args.any, args.none, k=args.top)
+        for result in results:
+            print(*result if args.top is not None else (result,))
+        print(f"🔍 {len(results)} recipes")
@@ -0,0 +1,266 @@
+"""
+Lightweight per-stage instrumentation for the pipeline scripts.
+
+Code marks its stages with
+
+    with instrument.stage("transform:recipes", rows_in=len(recipes)) as st:
+        ...
+        st.rows_out = len(rows)
+
+and, when recording is enabled (--profile / --trace on the scripts), each
+stage records wall time, CPU time, rows in/out, bytes read/written and
+memory. finish() writes a JSON run summary and, optionally, a Chrome
+trace (open it in chrome://tracing or https://ui.perfetto.dev).
+
+Memory is per process: process_peak_rss_bytes is the process's peak RSS
+when the stage ended (including every earlier stage), and
+rss_peak_growth_bytes is how far the stage raised that peak. Stages that
+ran while another thread was in a stage (the pipeline's --jobs) are
+marked "concurrent": their RSS growth and --trace-memory peaks also count
+the other threads' allocations.
+
+When recording is disabled a stage costs one object and no clock reads.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+SUMMARY_FILE = "run_summary.json"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def file_size(path):
+    """Size of a file, or of all files under a directory (Parquet datasets)."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+class Stage:
+    """Counters for one stage; the code being measured fills in what it knows."""
+
+    def __init__(self, name, rows_in=None, bytes_read=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = bytes_read
+        self.bytes_written = None
+        self._peak_alloc = 0
+        self._concurrent = False
+
+
+class Recorder:
+    """Collects finished stages; one per process."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._origin = time.perf_counter()
+        self.started = time.time()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stacks = {}       # thread id -> stack of its running stages
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+            with self._lock:
+                self._stacks[threading.get_ident()] = self._local.stack
+        return self._local.stack
+
+    def _enter(self, stack, st):
+        """Push st; True if a stage of another thread is running (and mark both sides concurrent)."""
+        with self._lock:
+            others = [other for tid, other in self._stacks.items()
+                      if other and tid != threading.get_ident()]
+            for other in others:
+                for running in other:
+                    running._concurrent = True
+            if others:
+                st._concurrent = True
+                for running in stack:
+                    running._concurrent = True
+            stack.append(st)
+        return bool(others)
+
+    @contextmanager
+    def stage(self, st):
+        stack = self._stack()
+        if self.trace_memory:
+            # The parent's peak so far must survive the reset below
+            if stack:
+                stack[-1]._peak_alloc = max(stack[-1]._peak_alloc, tracemalloc.get_traced_memory()[1])
+        # tracemalloc's peak is process-wide: resetting it while another
+        # thread is in a stage would lose that stage's peak
+        if not self._enter(stack, st) and self.trace_memory:
+            tracemalloc.reset_peak()
+
+        rss_start = peak_rss_bytes()
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield st
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            rss_end = peak_rss_bytes()
+            with self._lock:
+                stack.pop()
+
+            record = {
+                "name": st.name,
+                "start": round(start - self._origin, 6),
+                "wall_seconds": round(wall, 6),
+                "cpu_seconds": round(cpu, 6),
+                "rows_in": st.rows_in,
+                "rows_out": st.rows_out,
+                "bytes_read": st.bytes_read,
+                "bytes_written": st.bytes_written,
+                "process_peak_rss_bytes": rss_end,
+                "rss_peak_growth_bytes": rss_end - rss_start if rss_end is not None else None,
+                "concurrent": st._concurrent,
+                "depth": len(stack),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if self.trace_memory:
+                peak = max(st._peak_alloc, tracemalloc.get_traced_memory()[1])
+                record["peak_alloc_bytes"] = peak
+                if stack:
+                    stack[-1]._peak_alloc = max(stack[-1]._peak_alloc, peak)
+            self.stages.append(record)
+
+    def summary(self):
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.perf_counter() - self._origin, 6),
+            "process_peak_rss_bytes": peak_rss_bytes(),
+            "argv": sys.argv,
+            "stages": sorted(self.stages, key=lambda s: s["start"]),
+        }
+
+    def chrome_trace(self):
+        """Stages as complete ("X") events in the Chrome trace event format."""
+        events = []
+        for s in self.stages:
+            args = {k: s[k] for k in ("rows_in", "rows_out", "bytes_read", "bytes_written",
+                                      "process_peak_rss_bytes", "rss_peak_growth_bytes",
+                                      "peak_alloc_bytes", "concurrent", "cpu_seconds")
+                    if s.get(k) is not None}
+            events.append({
+                "name": s["name"],
+                "cat": s["name"].split(":", 1)[0],
+                "ph": "X",
+                "ts": s["start"] * 1e6,
+                "dur": s["wall_seconds"] * 1e6,
+                "pid": s["pid"],
+                "tid": s["tid"],
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+# ---------------------- Module-level API ----------------------
+_recorder = None
+_outputs = {}
+
+
+def enable(summary_path=SUMMARY_FILE, trace_path=None, trace_memory=False):
+    """Start recording stages; finish() writes the summary (and trace) files."""
+    global _recorder
+    _recorder = Recorder(trace_memory)
+    _outputs.update(summary=summary_path, trace=trace_path)
+    return _recorder
+
+
+def enabled():
+    return _recorder is not None
+
+
+@contextmanager
+def stage(name, rows_in=None, bytes_read=None):
+    """Measure the enclosed block as a named stage (a no-op unless enabled)."""
+    st = Stage(name, rows_in, bytes_read)
+    if _recorder is None:
+        yield st
+        return
+    with _recorder.stage(st):
+        yield st
+
+
+def add_stages(records, started):
+    """
+    Add stages measured by another process with a worker_recorder();
+    `started` is that recorder's .started, used to line up the clocks.
+    """
+    if _recorder is None:
+        return
+    offset = started - _recorder.started
+    for record in records:
+        _recorder.stages.append(dict(record, start=round(record["start"] + offset, 6)))
+
+
+def worker_recorder():
+    """A fresh Recorder for a worker process; send .started and .stages back to the parent."""
+    return Recorder()
+
+
+def finish():
+    """Write the run summary (and the Chrome trace, if requested) and stop recording."""
+    global _recorder
+    if _recorder is None:
+        return None
+    summary = _recorder.summary()
+    with open(_outputs["summary"], "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"⏱️ Stage summary saved as '{_outputs['summary']}'")
+
+    if _outputs.get("trace"):
+        with open(_outputs["trace"], "w", encoding="utf-8") as f:
+            json.dump(_recorder.chrome_trace(), f)
+        print(f"⏱️ Chrome trace saved as '{_outputs['trace']}'")
+
+    _recorder = None
+    return summary
+
+
+# ---------------------- CLI Helpers ----------------------
+def add_arguments(parser):
+    """Add --profile / --trace / --trace-memory to a script's argument parser."""
+    parser.add_argument("--profile", nargs="?", const=SUMMARY_FILE, default=None, metavar="FILE",
+                        help=f"record per-stage timings and write a JSON summary (default: {SUMMARY_FILE})")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="also write a Chrome trace of the stages (implies --profile)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="record peak Python allocations per stage with tracemalloc (slower; "
+                             "process-wide, so stages running concurrently share their peaks)")
+
+
+def enable_from_args(args):
+    """Enable recording if the script was run with --profile or --trace."""
+    if args.profile or args.trace or args.trace_memory:
+        enable(args.profile or SUMMARY_FILE, args.trace, args.trace_memory)
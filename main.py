@@ -7,12 +7,19 @@ Seed Firestore with:
 
 Requirements:
 - Place ServiceAccountKey.json in same folder
+  (or set FIRESTORE_EMULATOR_HOST to seed a local Firestore emulator)
 - pip install firebase-admin
+
+Usage:
+- python main.py                      one write per document
+- python main.py --bulk               batched, concurrent writes (see --help)
 """
 
-import firebase_admin # type: ignore
-from firebase_admin import credentials, firestore # type: ignore
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
+import argparse
+import itertools
+import os
 import time
 import random
 import re
@@ -25,12 +32,38 @@ NUM_USERS = 30
 NUM_SYNTHETIC_RECIPES = 20   # + 1 primary => total 21
 MIN_INTERACTIONS_PER_RECIPE = 2
 
+# Bulk loading
+MAX_BATCH_SIZE = 500          # Firestore limit for a single batched write
+DEFAULT_MAX_IN_FLIGHT = 8
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 0.5
+EMULATOR_PROJECT_ID = "demo-recipes"
+
 # ---------------------------
 # INITIALIZE FIRESTORE
 # ---------------------------
-cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+_db = None
+
+def get_db():
+    """
+    Return the Firestore client, initializing Firebase on first use.
+
+    When FIRESTORE_EMULATOR_HOST is set the client talks to the emulator
+    and no service account key is needed.
+    """
+    global _db
+    if _db is None:
+        import firebase_admin # type: ignore
+        from firebase_admin import credentials, firestore # type: ignore
+
+        if os.environ.get("FIRESTORE_EMULATOR_HOST"):
+            project_id = os.environ.get("GCLOUD_PROJECT", EMULATOR_PROJECT_ID)
+            firebase_admin.initialize_app(options={"projectId": project_id})
+        else:
+            cred = credentials.Certificate(SERVICE_ACCOUNT_FILE)
+            firebase_admin.initialize_app(cred)
+        _db = firestore.client()
+    return _db
 
 # ---------------------------
 # HELPERS
@@ -57,8 +90,8 @@ def user_doc_id(index:int):
 # ---------------------------
 # 1) Create Users: user1 .. user30
 # ---------------------------
-def create_users():
-    print("Creating users...")
+def iter_users():
+    """Yield (doc_id, doc) for user1 .. userN."""
     for i in range(1, NUM_USERS + 1):
         uid = user_doc_id(i)
         user_doc = {
@@ -67,7 +100,11 @@ def create_users():
             "email": f"user{i}@example.com",
             "joined_at": now_iso()
         }
-        db.collection("users").document(uid).set(user_doc)
+        yield uid, user_doc
+
+def create_users(bulk=None):
+    print("Creating users...")
+    write_docs("users", iter_users(), bulk)
     print(f"Created {NUM_USERS} users (user1 .. user{NUM_USERS})\n")
 
 # ---------------------------
@@ -168,25 +205,28 @@ def make_synthetic_recipe(idx, name):
 # ---------------------------
 # 4) Insert recipes (primary first, then synthetic)
 # ---------------------------
-def create_recipes():
-    print("Creating recipes (primary first, then synthetic)...")
+def iter_recipes():
+    """Yield (doc_id, doc) for the primary recipe followed by the synthetic ones."""
     # Primary:
     primary = get_primary_recipe()
-    db.collection("recipes").document(primary["recipe_id"]).set(primary)
+    yield primary["recipe_id"], primary
     # Synthetic: recipe2 ... recipe21
     idx = 2
     for name in SYNTHETIC_NAMES[:NUM_SYNTHETIC_RECIPES]:
         rec = make_synthetic_recipe(idx, name)
-        db.collection("recipes").document(rec["recipe_id"]).set(rec)
+        yield rec["recipe_id"], rec
         idx += 1
+
+def create_recipes(bulk=None):
+    print("Creating recipes (primary first, then synthetic)...")
+    write_docs("recipes", iter_recipes(), bulk)
     print(f"Created {1 + NUM_SYNTHETIC_RECIPES} recipes (recipe1..recipe{1+NUM_SYNTHETIC_RECIPES})\n")
 
 # ---------------------------
 # 5) Create interactions (interaction1, interaction2, ...)
 #    At least 2 per recipe; deterministic ascending order
 # ---------------------------
-def create_interactions():
-    print("Creating interactions (ascending interaction IDs)...")
+def seeded_recipe_ids():
     # deterministic lists
     recipe_ids = []
     # primary (recipe1...) then recipe2..recipe21
@@ -196,15 +236,15 @@ def create_interactions():
     for name in SYNTHETIC_NAMES[:NUM_SYNTHETIC_RECIPES]:
         recipe_ids.append(recipe_doc_id(idx, name))
         idx += 1
+    return recipe_ids
 
-    user_ids = [user_doc_id(i) for i in range(1, NUM_USERS + 1)]
-
+def iter_interactions(recipe_ids, user_ids, per_recipe=MIN_INTERACTIONS_PER_RECIPE):
+    """Yield (doc_id, doc) for per_recipe interactions on every recipe, users round-robin."""
     interaction_seq = 1
-    # For each recipe, create exactly MIN_INTERACTIONS_PER_RECIPE interactions (you can expand later)
+    # For each recipe, create exactly per_recipe interactions
     for rid in recipe_ids:
-        # create 2 deterministic interactions using different users
         # choose users in round-robin for deterministic distribution
-        for k in range(MIN_INTERACTIONS_PER_RECIPE):
+        for k in range(per_recipe):
             uid = user_ids[(interaction_seq - 1) % len(user_ids)]
             inter_doc = {
                 "interaction_id": interaction_doc_id(interaction_seq),
@@ -217,21 +257,132 @@ def create_interactions():
                 "timestamp": now_iso()
             }
             # Write with the requested sequential interaction ID
-            db.collection("interactions").document(inter_doc["interaction_id"]).set(inter_doc)
+            yield inter_doc["interaction_id"], inter_doc
             interaction_seq += 1
 
-    print(f"Created {interaction_seq - 1} interactions (at least {MIN_INTERACTIONS_PER_RECIPE} per recipe)\n")
+def create_interactions(bulk=None, per_recipe=MIN_INTERACTIONS_PER_RECIPE):
+    print("Creating interactions (ascending interaction IDs)...")
+    recipe_ids = seeded_recipe_ids()
+    user_ids = [user_doc_id(i) for i in range(1, NUM_USERS + 1)]
+
+    count = write_docs("interactions", iter_interactions(recipe_ids, user_ids, per_recipe), bulk)
+
+    print(f"Created {count} interactions (at least {per_recipe} per recipe)\n")
+
+# ---------------------------
+# 6) Writers: one document at a time, or batched and concurrent
+# ---------------------------
+class BulkOptions:
+    def __init__(self, batch_size=MAX_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 max_retries=MAX_RETRIES):
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.batch_size = batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+
+def write_docs(collection, docs, bulk=None):
+    """
+    Write (doc_id, doc) pairs to a collection and return how many were written.
+
+    With bulk=None every document is its own round trip; otherwise they
+    are sent through bulk_write.
+    """
+    if bulk is not None:
+        return bulk_write(collection, docs, bulk)
+
+    db = get_db()
+    count = 0
+    for doc_id, doc in docs:
+        db.collection(collection).document(doc_id).set(doc)
+        count += 1
+    return count
+
+def _retryable_errors():
+    from google.api_core import exceptions # type: ignore
+    return (
+        exceptions.ResourceExhausted,
+        exceptions.Aborted,
+        exceptions.DeadlineExceeded,
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+    )
+
+def _commit_chunk(collection, chunk, options, retryable):
+    """Commit one chunk as a single batch, backing off while Firestore throttles us."""
+    db = get_db()
+    col_ref = db.collection(collection)
+    for attempt in range(options.max_retries + 1):
+        batch = db.batch()
+        for doc_id, doc in chunk:
+            batch.set(col_ref.document(doc_id), doc)
+        try:
+            batch.commit()
+            return len(chunk)
+        except retryable as e:
+            if attempt == options.max_retries:
+                raise
+            delay = BACKOFF_BASE_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Throttled on '{collection}' ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+def bulk_write(collection, docs, options=None):
+    """
+    Write (doc_id, doc) pairs in batches of up to 500, keeping at most
+    options.max_in_flight batches committing concurrently.
+
+    Chunks are pulled from the iterator only when a slot frees up, so
+    memory stays bounded for arbitrarily long generators. set() is
+    idempotent, which makes retrying a whole chunk safe.
+    """
+    options = options or BulkOptions()
+    retryable = _retryable_errors()
+    docs = iter(docs)
+
+    written = 0
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=options.max_in_flight) as pool:
+        pending = set()
+        while True:
+            while len(pending) < options.max_in_flight:
+                chunk = list(itertools.islice(docs, options.batch_size))
+                if not chunk:
+                    break
+                pending.add(pool.submit(_commit_chunk, collection, chunk, options, retryable))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                written += future.result()
+
+    elapsed = time.time() - t0
+    rate = written / elapsed if elapsed > 0 else float("inf")
+    print(f"Bulk wrote {written} docs to '{collection}' in {elapsed:.2f}s ({rate:.0f} docs/sec)")
+    return written
 
 # ---------------------------
 # MAIN
 # ---------------------------
-def run_all():
+def run_all(bulk=None, per_recipe=MIN_INTERACTIONS_PER_RECIPE):
     t0 = time.time()
-    create_users()
-    create_recipes()
-    create_interactions()
+    create_users(bulk)
+    create_recipes(bulk)
+    create_interactions(bulk, per_recipe)
     elapsed = time.time() - t0
-    print("Seeding completed in {:.2f}s".format(elapsed))
+    total = NUM_USERS + 1 + NUM_SYNTHETIC_RECIPES + (1 + NUM_SYNTHETIC_RECIPES) * per_recipe
+    print("Seeding completed in {:.2f}s ({:.0f} docs/sec)".format(elapsed, total / max(elapsed, 1e-9)))
 
 if __name__ == "__main__":
-    run_all()
+    parser = argparse.ArgumentParser(description="Seed Firestore with users, recipes and interactions.")
+    parser.add_argument("--bulk", action="store_true",
+                        help="group writes into batches and commit them concurrently")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help=f"documents per batch (max {MAX_BATCH_SIZE})")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="batches committing at the same time")
+    parser.add_argument("--interactions-per-recipe", type=int, default=MIN_INTERACTIONS_PER_RECIPE,
+                        help="interactions generated for each recipe")
+    args = parser.parse_args()
+
+    bulk = BulkOptions(args.batch_size, args.max_in_flight) if args.bulk else None
+    run_all(bulk, args.interactions_per_recipe)
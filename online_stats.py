@@ -0,0 +1,230 @@
+"""
+Mergeable one-pass statistics: Welford mean / variance of a stream of
+values, and the co-moment of a stream of (x, y) pairs for covariance and
+correlation.
+
+Accumulators take one value at a time (add, e.g. from the transform
+stage), one array at a time (add_array, e.g. a table chunk) or another
+accumulator (merge, e.g. a partial result from a worker process). Merges
+use the pairwise update of Chan et al., so partials combine into the
+statistics of all their values at once, in constant memory and without
+the cancellation of raw sum-of-squares formulas.
+
+Usage:
+- python online_stats.py                          insights 2, 3 and 5 in one pass over the tables
+- python online_stats.py --chunk-size 50000 --workers 4
+"""
+
+import argparse
+
+import numpy as np
+
+import instrument
+from columnar import iter_table, to_numeric
+
+DEFAULT_CHUNK_SIZE = 128 * 1024
+
+
+# ---------------------- Accumulators ----------------------
+class Moments:
+    """Count, mean and sum of squared deviations (m2) of a stream of values; NaN is skipped."""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        self.n, self.mean, self.m2 = n, mean, m2
+
+    def add(self, x):
+        if x != x:
+            return self
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+        return self
+
+    def add_array(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = float(values.sum()) / len(values)
+            self.merge(Moments(len(values), mean, float(((values - mean) ** 2).sum())))
+        return self
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def average(self):
+        """The mean, or NaN without values."""
+        return self.mean if self.n else float("nan")
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator), NaN below two values."""
+        return self.m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+
+class CoMoments:
+    """
+    Moments of x and y plus their co-moment c_xy = sum((x - mean_x) * (y - mean_y)).
+    Pairs where either side is NaN are skipped.
+    """
+
+    __slots__ = ("n", "mean_x", "mean_y", "m2_x", "m2_y", "c_xy")
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, m2_x=0.0, m2_y=0.0, c_xy=0.0):
+        self.n, self.mean_x, self.mean_y = n, mean_x, mean_y
+        self.m2_x, self.m2_y, self.c_xy = m2_x, m2_y, c_xy
+
+    def add(self, x, y):
+        if x != x or y != y:
+            return self
+        self.n += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.n
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+        return self
+
+    def add_arrays(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keep = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[keep], y[keep]
+        if len(x):
+            mean_x, mean_y = float(x.sum()) / len(x), float(y.sum()) / len(y)
+            dx, dy = x - mean_x, y - mean_y
+            self.merge(CoMoments(len(x), mean_x, mean_y,
+                                 float((dx * dx).sum()), float((dy * dy).sum()), float((dx * dy).sum())))
+        return self
+
+    @classmethod
+    def from_groups(cls, n, mean_x, mean_y, m2_x, m2_y, c_xy):
+        """
+        Merge many partials at once, given as arrays of their fields (or
+        scalars shared by all), e.g. one partial per recipe. Groups with
+        n == 0 are ignored.
+        """
+        n, mean_x, mean_y, m2_x, m2_y, c_xy = np.broadcast_arrays(
+            *(np.asarray(field, dtype=np.float64) for field in (n, mean_x, mean_y, m2_x, m2_y, c_xy)))
+        keep = n > 0
+        n, mean_x, mean_y, m2_x, m2_y, c_xy = (field[keep] for field in (n, mean_x, mean_y, m2_x, m2_y, c_xy))
+        total = float(n.sum())
+        if total == 0:
+            return cls()
+        mx, my = float((n * mean_x).sum()) / total, float((n * mean_y).sum()) / total
+        dx, dy = mean_x - mx, mean_y - my
+        return cls(int(total), mx, my,
+                   float((m2_x + n * dx * dx).sum()),
+                   float((m2_y + n * dy * dy).sum()),
+                   float((c_xy + n * dx * dy).sum()))
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            for field in self.__slots__:
+                setattr(self, field, getattr(other, field))
+            return self
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.m2_x += other.m2_x + dx * dx * weight
+        self.m2_y += other.m2_y + dy * dy * weight
+        self.c_xy += other.c_xy + dx * dy * weight
+        self.n = n
+        return self
+
+    @property
+    def covariance(self):
+        return self.c_xy / (self.n - 1) if self.n > 1 else float("nan")
+
+    @property
+    def correlation(self):
+        """Pearson correlation; NaN below two pairs or when either side has no variance."""
+        if self.n < 2 or self.m2_x <= 0 or self.m2_y <= 0:
+            return float("nan")
+        return float(self.c_xy / np.sqrt(self.m2_x * self.m2_y))
+
+
+# ---------------------- One Pass over the Tables ----------------------
+_prep_times = None      # recipe_id -> prep_time, set once per worker process
+
+
+def _set_prep_times(prep_times):
+    global _prep_times
+    _prep_times = prep_times
+
+
+def _likes_partial(chunk):
+    prep_time = chunk["recipe_id"].astype(str).map(_prep_times)
+    return CoMoments().add_arrays(prep_time, to_numeric(chunk["likes"]))
+
+
+def table_stats(chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """
+    Average prep time, average cook time and the prep time / likes
+    correlation in one pass over recipes and interactions, a chunk at a
+    time: memory is one chunk plus a prep_time per recipe. With
+    workers > 1 interaction chunks are reduced on a process pool and
+    their partials merged; the prep times are sent to each worker once.
+    """
+    import pandas as pd
+
+    from analytics_engine import map_partials
+
+    prep, cook, prep_times = Moments(), Moments(), []
+    for chunk in iter_table("recipes", ["recipe_id", "prep_time", "cook_time"], chunk_size):
+        prep_time = to_numeric(chunk["prep_time"])
+        prep.add_array(prep_time)
+        cook.add_array(to_numeric(chunk["cook_time"]))
+        prep_times.append(pd.Series(prep_time.to_numpy(), index=chunk["recipe_id"].astype(str)))
+    prep_times = pd.concat(prep_times) if prep_times else pd.Series(dtype=np.float64)
+    prep_times = prep_times[~prep_times.index.duplicated()]
+
+    likes = CoMoments()
+    chunks = iter_table("interactions", ["recipe_id", "likes"], chunk_size)
+    jobs = ((chunk,) for chunk in chunks)
+    for partial in map_partials(_likes_partial, jobs, workers, _set_prep_times, (prep_times,)):
+        likes.merge(partial)
+
+    return {
+        "avg_prep_time": prep.average,
+        "avg_cook_time": cook.average,
+        "prep_likes_correlation": likes.correlation,
+    }
+
+
+# ---------------------- CLI ----------------------
+if __name__ == "__main__":
+    from analytics import print_insights
+
+    parser = argparse.ArgumentParser(description="Averages and the prep time / likes correlation in one pass.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, metavar="ROWS")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="reduce interaction chunks on this many processes")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    with instrument.stage("online_stats"):
+        values = table_stats(args.chunk_size, args.workers)
+    print_insights(values)
+    instrument.finish()
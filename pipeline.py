@@ -0,0 +1,340 @@
+"""
+Run the whole pipeline as one dependency graph of stages:
+
+    export:<collection>  (only with --export)
+      -> transform:recipes / transform:interactions
+        -> save:<table> (x4), save:ingredient_dim
+        -> validate
+          -> index, facts, stats
+          -> engine -> analytics, graphs, engagement
+
+Stages whose dependencies are done run concurrently on a thread pool, and
+rows are handed to the next stage in memory (analytics and all charts
+share one AnalyticsEngine). The transforms check every row with one
+validate.RowValidator, like transfer.py --validate: failing rows go to
+rejects.csv instead of the tables, and the validate stage writes the
+reports. A stage whose output files are newer than its input
+files is skipped, like make; --force runs everything.
+
+Usage:
+- python pipeline.py                  ETL + validation + analytics + charts
+- python pipeline.py --export         export from Firestore first
+- python pipeline.py --dry-run        show which stages would run
+"""
+
+import argparse
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Charts are drawn from worker threads, which no GUI backend supports
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import analytics
+import analytics_graphs
+import columnar
+import engagement_ingredients
+import exportfile
+import fact_store
+import ingredient_index
+import instrument
+import recipe_stats
+import transfer
+import validate
+from analytics_engine import AnalyticsEngine
+from ingredient_dim import DIM_TABLE, LINK_TABLE, STATE_FILE, IngredientVocabulary
+from result_cache import ResultCache
+
+DEFAULT_JOBS = 4
+TABLES = ["recipes", "ingredients", "steps", "interactions"]
+ANALYTICS_TABLES = ["recipes", "ingredients", "interactions", LINK_TABLE, DIM_TABLE]
+ENGAGEMENT_CHART = os.path.join("charts", "high_engagement_ingredients.png")
+
+
+# ---------------------- Stage Graph ----------------------
+class Stage:
+    """
+    One node of the pipeline graph.
+
+    run(results) gets the return values of the stages in `deps` (None for a
+    dependency that was skipped) and returns what its dependents receive.
+    A stage without output files only passes data along, so it runs when
+    a dependent runs. always=True stages run on every invocation.
+    """
+
+    def __init__(self, name, run, deps=(), inputs=(), outputs=(), always=False):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.always = always
+
+
+def _mtime(path):
+    """Latest modification time of a file, or of the files in a directory."""
+    if os.path.isdir(path):
+        times = [
+            os.path.getmtime(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        ]
+        return max(times, default=None)
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+def _files_stale(stage):
+    output_times = [_mtime(path) for path in stage.outputs]
+    if None in output_times:
+        return True
+    input_times = [t for t in (_mtime(path) for path in stage.inputs) if t is not None]
+    return bool(input_times) and max(input_times) > min(output_times)
+
+
+def plan(stages, force=False):
+    """
+    Return the names of the stages that have to run, in dependency order.
+
+    A stage with output files runs if it is forced, if its outputs are
+    missing or older than its inputs, or if anything upstream of it runs.
+    A stage without outputs runs only if one of its dependents runs.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    order = _topological_order(stages)
+
+    dirty = {}
+    for name in order:
+        stage = by_name[name]
+        upstream = any(dirty[dep] for dep in stage.deps)
+        if stage.outputs or stage.always:
+            dirty[name] = force or stage.always or upstream or _files_stale(stage)
+        else:
+            dirty[name] = upstream
+
+    runs = {name for name in order if dirty[name] and (by_name[name].outputs or by_name[name].always)}
+    for name in reversed(order):
+        if name in runs:
+            runs.update(dep for dep in by_name[name].deps if not by_name[dep].outputs)
+    return [name for name in order if name in runs]
+
+
+def _topological_order(stages):
+    by_name = {stage.name: stage for stage in stages}
+    order, state = [], {}
+
+    def visit(name):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Pipeline has a dependency cycle through '{name}'")
+        state[name] = "visiting"
+        for dep in by_name[name].deps:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+            visit(dep)
+        state[name] = "done"
+        order.append(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return order
+
+
+def run_stages(stages, force=False, jobs=DEFAULT_JOBS):
+    """
+    Run the stages that are not up to date, each as soon as its
+    dependencies have finished, with up to `jobs` running at once.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    to_run = plan(stages, force)
+    for stage in stages:
+        if stage.name not in to_run:
+            print(f"⏭️ Skipping '{stage.name}' (up to date)")
+
+    results = {name: None for name in by_name}
+    pending = list(to_run)
+    finished = set(by_name) - set(to_run)
+
+    def execute(stage):
+        print(f"🔄 Running '{stage.name}'...")
+        with instrument.stage(f"pipeline:{stage.name}"):
+            return stage.run({dep: results[dep] for dep in stage.deps})
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        running = {}
+        while pending or running:
+            for name in [n for n in pending if all(dep in finished for dep in by_name[n].deps)]:
+                pending.remove(name)
+                running[pool.submit(execute, by_name[name])] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                # A failure stops the run once the stages already started are done
+                results[name] = future.result()
+                finished.add(name)
+
+    return results
+
+
+# ---------------------- Pipeline Stages ----------------------
+def table_outputs(table, parquet):
+    return [f"{table}.csv"] + ([f"{table}{columnar.PARQUET_SUFFIX}"] if parquet else [])
+
+
+def analytics_inputs():
+    paths = [f"{table}.csv" for table in ANALYTICS_TABLES]
+    paths += [f"{table}{columnar.PARQUET_SUFFIX}" for table in ANALYTICS_TABLES]
+    return paths
+
+
+def build_stages(export=False, parquet=False, graph_workers=None, cache=None, workers=exportfile.DEFAULT_WORKERS):
+    stages = []
+
+    # ---------------------- Export (one stage per collection) ----------------------
+    export_deps = {}
+    if export:
+        for col in exportfile.COLLECTIONS:
+            stages.append(Stage(
+                f"export:{col}",
+                lambda results, col=col: exportfile.export_collection_paginated(col, workers),
+                outputs=[f"{col}.json"],
+                always=True,
+            ))
+        export_deps = {col: [f"export:{col}"] for col in exportfile.COLLECTIONS}
+
+    # ---------------------- Transform (rows stay in memory) ----------------------
+    # One RowValidator for both transforms, opened when the first one runs.
+    # Whenever a transform runs the validate stage does too (and runs both
+    # transforms), so the reports always cover every table.
+    validator = []
+    validator_lock = threading.Lock()
+
+    def row_validator():
+        with validator_lock:
+            if not validator:
+                validator.append(validate.RowValidator())
+            return validator[0]
+
+    def transform_recipes(results):
+        recipes_rows, ingredients_rows, steps_rows = transfer.transform_recipes(
+            transfer.load_json("recipes.json"), row_validator())
+        return {"recipes": recipes_rows, "ingredients": ingredients_rows, "steps": steps_rows}
+
+    def transform_interactions(results):
+        return {"interactions": transfer.transform_interactions(transfer.load_json("interactions.json"),
+                                                                row_validator())}
+
+    stages.append(Stage("transform:recipes", transform_recipes, deps=export_deps.get("recipes", [])))
+    stages.append(Stage("transform:interactions", transform_interactions,
+                        deps=export_deps.get("interactions", [])))
+
+    # ---------------------- Table Writes (one stage per table) ----------------------
+    def save(table, source):
+        def run(results):
+            rows = results[source][table]
+            transfer.save_table(table, rows, parquet)
+            return rows
+        return run
+
+    for table in TABLES:
+        source = "transform:interactions" if table == "interactions" else "transform:recipes"
+        json_file = "interactions.json" if table == "interactions" else "recipes.json"
+        stages.append(Stage(f"save:{table}", save(table, source), deps=[source],
+                            inputs=[json_file], outputs=table_outputs(table, parquet)))
+
+    def save_ingredient_dim(results):
+        vocab = IngredientVocabulary()
+        links = transfer.link_ingredients(results["transform:recipes"]["ingredients"], vocab)
+        transfer.save_table(LINK_TABLE, links, parquet)
+        transfer.save_ingredient_dim(vocab, parquet)
+
+    # After save:ingredients, whose table state is recorded with the links
+    stages.append(Stage("save:ingredient_dim", save_ingredient_dim,
+                        deps=["transform:recipes", "save:ingredients"], inputs=["recipes.json"],
+                        outputs=table_outputs(LINK_TABLE, parquet) + table_outputs(DIM_TABLE, parquet) + [STATE_FILE]))
+
+    # ---------------------- Interaction Fact Store ----------------------
+    stages.append(Stage("facts", lambda results: fact_store.build_fact_store(),
+                        deps=["save:interactions"], inputs=table_outputs("interactions", parquet),
+                        outputs=[fact_store.FACT_DIR]))
+
+    # ---------------------- Per-Recipe Stats Rollup ----------------------
+    stages.append(Stage("stats", lambda results: recipe_stats.build_recipe_stats(),
+                        deps=["save:interactions"], inputs=table_outputs("interactions", parquet),
+                        outputs=[recipe_stats.STATS_DIR]))
+
+    # ---------------------- Ingredient -> Recipe Index ----------------------
+    # Engagement scores come from the rollup, so the index follows the stats stage
+    index_inputs = [path for table in (LINK_TABLE, DIM_TABLE, "interactions")
+                    for path in table_outputs(table, parquet)]
+    stages.append(Stage("index", lambda results: ingredient_index.build_index(),
+                        deps=["save:ingredient_dim", "stats"],
+                        inputs=index_inputs, outputs=[ingredient_index.INDEX_DIR]))
+
+    # ---------------------- Validation ----------------------
+    # The rows were checked as they were transformed; write the reports and close rejects.csv
+    stages.append(Stage("validate", lambda results: row_validator().close(),
+                        deps=["transform:recipes", "transform:interactions"] + [f"save:{t}" for t in TABLES],
+                        inputs=["recipes.json", "interactions.json"],
+                        outputs=[validate.REPORT_FILE, validate.RULE_REPORT_FILE, "rejects.csv"]))
+
+    # ---------------------- Analytics & Charts (one shared engine) ----------------------
+    def load_engine(results):
+        engine = AnalyticsEngine()
+        # Build the shared aggregates before the consumers run side by side
+        engine.name_stats
+        engine.ingredient_counts
+        engine.ingredient_keys
+        return engine
+
+    engine_deps = [f"save:{t}" for t in ("recipes", "ingredients", "interactions")]
+    engine_deps += ["save:ingredient_dim", "facts", "stats"]
+    stages.append(Stage("engine", load_engine, deps=engine_deps))
+
+    chart_outputs = [os.path.join(analytics_graphs.GRAPHS_DIR, spec[0]) for spec in analytics_graphs.CHART_SPECS]
+    stages.append(Stage("analytics", lambda results: analytics.run_analytics(results["engine"], cache),
+                        deps=["engine"], inputs=analytics_inputs(), outputs=["analytics_output.csv"]))
+    stages.append(Stage("graphs",
+                        lambda results: analytics_graphs.run_graphs(results["engine"], graph_workers, cache),
+                        deps=["engine"], inputs=analytics_inputs(), outputs=chart_outputs))
+    stages.append(Stage("engagement",
+                        lambda results: engagement_ingredients.run_engagement_ingredients(results["engine"]),
+                        deps=["engine"], inputs=analytics_inputs(), outputs=[ENGAGEMENT_CHART]))
+    return stages
+
+
+def run_pipeline(export=False, parquet=False, force=False, jobs=DEFAULT_JOBS, graph_workers=None,
+                 cache=None, dry_run=False):
+    if parquet and not columnar.parquet_available():
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+
+    stages = build_stages(export, parquet, graph_workers, cache)
+    if dry_run:
+        to_run = plan(stages, force)
+        for stage in stages:
+            print(f"{'▶️' if stage.name in to_run else '⏭️'} {stage.name}")
+        return None
+
+    results = run_stages(stages, force, jobs)
+    print("\n🎉 Pipeline completed successfully!")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run export, ETL, validation, analytics and charts as one pipeline.")
+    parser.add_argument("--export", action="store_true", help="export the collections from Firestore first")
+    parser.add_argument("--parquet", action="store_true", help="also write typed Parquet tables (needs pyarrow)")
+    parser.add_argument("--force", action="store_true", help="run every stage, even if up to date")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="stages running at the same time")
+    parser.add_argument("--graph-workers", type=int, default=None,
+                        help="chart rendering processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="do not reuse cached insights and charts")
+    parser.add_argument("--dry-run", action="store_true", help="only show which stages would run")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    run_pipeline(args.export, args.parquet, args.force, args.jobs, args.graph_workers,
+                 cache=None if args.no_cache else ResultCache(), dry_run=args.dry_run)
+    instrument.finish()
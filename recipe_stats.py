@@ -0,0 +1,182 @@
+"""
+Materialized per-recipe interaction rollup, maintained by the ETL.
+
+    recipe_stats/
+        meta.json           version, column dtypes, and the interactions
+                            table state (CSV size / Parquet parts) folded in
+        recipe_stats.csv    one row per recipe_id: views, likes, likes_count,
+                            likes_sq, likes_m2, rating_sum, rating_count,
+                            cook_attempts, interactions, engagement;
+                            <column>@<i> for the limbs of sums of float metrics
+
+The analytics read this table instead of aggregating every interaction.
+A delta ETL run folds in only the interaction rows appended since the last
+run. Float sums are also kept exactly, as the integer limbs of
+analytics_engine.exact_sums, so an updated table is bit-identical to one
+rebuilt from all interactions.
+
+Usage:
+- python recipe_stats.py             rebuild from the interactions table
+- python recipe_stats.py --update    fold in interactions appended since the last run
+"""
+
+import argparse
+import json
+import os
+import shutil
+from itertools import chain
+
+import instrument
+from columnar import iter_appended, iter_table, table_state
+
+STATS_DIR = "recipe_stats"
+STATS_FILE = "recipe_stats.csv"
+STATS_VERSION = 3
+SOURCE_TABLE = "interactions"
+DEFAULT_CHUNK_SIZE = 128 * 1024
+
+
+# ---------------------- Read ----------------------
+def _read_meta(stats_dir):
+    try:
+        with open(os.path.join(stats_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == STATS_VERSION else None
+
+
+def _read_table(stats_dir, meta, columns):
+    import pandas as pd
+
+    file_name = os.path.join(stats_dir, STATS_FILE)
+    known = {**meta["columns"], **meta["limbs"]}
+    dtypes = {col: known.get(col, object) for col in columns}
+    if meta["str_ids"]:
+        dtypes["recipe_id"] = str
+    with instrument.stage(f"load:{file_name}", bytes_read=instrument.file_size(file_name)) as st:
+        df = pd.read_csv(file_name, usecols=["recipe_id"] + columns, dtype=dtypes,
+                         float_precision="round_trip")
+        st.rows_out = len(df)
+    return df.set_index(pd.Index(df.pop("recipe_id"), dtype=object, name="recipe_id"))
+
+
+def open_recipe_stats(stats_dir=STATS_DIR, columns=None):
+    """
+    The per-recipe aggregates (as aggregate_interactions returns them, or
+    only `columns`), or None if the table is missing or behind the
+    interactions table.
+    """
+    meta = _read_meta(stats_dir)
+    if meta is None or meta["source"] != table_state(SOURCE_TABLE):
+        return None
+    return _read_table(stats_dir, meta, list(columns or meta["columns"]))
+
+
+def _read_partial(stats_dir, meta):
+    """The stored table as an exact partial aggregate (see add_partials)."""
+    from analytics_engine import DERIVED_COLUMNS, SUM_COLUMNS
+
+    float_metrics = set(meta["float_metrics"])
+    exact = {col for metric in float_metrics for col in SUM_COLUMNS[metric]}
+    columns = [col for col in meta["columns"] if col not in DERIVED_COLUMNS and col not in exact]
+    return _read_table(stats_dir, meta, columns + list(meta["limbs"])), float_metrics
+
+
+# ---------------------- Write ----------------------
+def _write(stats_dir, partial, source):
+    from analytics_engine import finish_partial
+
+    table = finish_partial(partial)
+    float_metrics = sorted(partial[1]) if partial is not None else []
+    meta = {
+        "version": STATS_VERSION,
+        "rows": len(table),
+        "interactions": int(table["interactions"].sum()),
+        "float_metrics": float_metrics,
+        "str_ids": all(isinstance(recipe_id, str) for recipe_id in table.index),
+        "columns": {col: table[col].dtype.str for col in table.columns},
+        "limbs": {},
+        "source": source,
+    }
+    if partial is not None:
+        totals = partial[0].reindex(table.index)
+        for col in totals.columns:
+            if "@" in col:
+                table[col] = totals[col]
+                meta["limbs"][col] = totals[col].dtype.str
+
+    tmp_dir = stats_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    table.to_csv(os.path.join(tmp_dir, STATS_FILE))
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(stats_dir, ignore_errors=True)
+    os.replace(tmp_dir, stats_dir)
+    return meta
+
+
+def build_recipe_stats(stats_dir=STATS_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Rebuild the table from the whole interactions table; returns the number of recipes."""
+    from analytics_engine import INTERACTION_COLUMNS, add_partials, chunk_partials
+
+    with instrument.stage("recipe_stats:build") as st:
+        partial = add_partials(chunk_partials(iter_table(SOURCE_TABLE, INTERACTION_COLUMNS, chunk_size)))
+        meta = _write(stats_dir, partial, table_state(SOURCE_TABLE))
+        st.rows_out = meta["rows"]
+        st.bytes_written = instrument.file_size(stats_dir)
+
+    print(f"✅ '{stats_dir}/' built with {meta['rows']} recipes ({meta['interactions']} interactions).")
+    return meta["rows"]
+
+
+def update_recipe_stats(stats_dir=STATS_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fold the interactions appended since the table was last written into
+    it, reading only those rows. Rebuilds the table when it is missing or
+    the interactions table was rewritten rather than appended to.
+    """
+    from analytics_engine import INTERACTION_COLUMNS, add_partials, chunk_partials
+
+    meta = _read_meta(stats_dir)
+    if meta is None:
+        return build_recipe_stats(stats_dir, chunk_size)
+    if meta["source"] == table_state(SOURCE_TABLE):
+        print(f"✅ '{stats_dir}/' is up to date.")
+        return meta["rows"]
+    try:
+        chunks = iter_appended(SOURCE_TABLE, meta["source"], INTERACTION_COLUMNS, chunk_size)
+    except ValueError as e:
+        print(f"⚠️ {e}; rebuilding '{stats_dir}/'")
+        return build_recipe_stats(stats_dir, chunk_size)
+
+    with instrument.stage("recipe_stats:update") as st:
+        stored = [_read_partial(stats_dir, meta)] if meta["rows"] else []
+        partial = add_partials(chain(stored, chunk_partials(chunks)))
+        before = meta["interactions"]
+        meta = _write(stats_dir, partial, table_state(SOURCE_TABLE))
+        st.rows_in = meta["interactions"] - before
+        st.rows_out = meta["rows"]
+        st.bytes_written = instrument.file_size(stats_dir)
+
+    print(f"✅ '{stats_dir}/' updated with {meta['interactions'] - before} new interactions "
+          f"({meta['rows']} recipes).")
+    return meta["rows"]
+
+
+# ---------------------- Run ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the materialized per-recipe stats.")
+    parser.add_argument("--update", action="store_true",
+                        help="only fold in interactions appended since the last build/update")
+    parser.add_argument("--stats-dir", default=STATS_DIR)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrument.enable_from_args(args)
+    if args.update:
+        update_recipe_stats(args.stats_dir)
+    else:
+        build_recipe_stats(args.stats_dir)
+    instrument.finish()
@@ -0,0 +1,285 @@
+import argparse
+import atexit
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows: only the threads of one process are serialized
+    fcntl = None
+
+CACHE_DIR = ".analytics_cache"
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+TOUCH_BATCH = 64        # cache hits whose last_used times are written to the index together
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+TABLES = ["recipes", "ingredients", "interactions", "ingredient_dim", "recipe_ingredients"]
+HASH_CHUNK_SIZE = 1024 * 1024
+# Modules whose code defines the analytics results
+ENGINE_MODULES = ["analytics_engine", "columnar", "online_stats", "ingredient_dim", "recipe_stats", "fact_store"]
+
+
+# ---------------------- Fingerprints ----------------------
+def make_key(*parts):
+    """Stable cache key from JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _table_files(table):
+    files = [f"{table}.csv"]
+    parquet_dir = f"{table}.parquet"
+    if os.path.isdir(parquet_dir):
+        files += sorted(os.path.join(parquet_dir, p) for p in os.listdir(parquet_dir))
+    return files
+
+
+def inputs_fingerprint(tables=TABLES, content_hash=False):
+    """
+    Fingerprint of the input tables (CSV and Parquet parts): mtime+size by
+    default, or a SHA-256 of the contents with content_hash=True.
+    """
+    parts = []
+    for table in tables:
+        for path in _table_files(table):
+            if not os.path.exists(path):
+                parts.append([path, None])
+            elif content_hash:
+                parts.append([path, _file_digest(path)])
+            else:
+                stat = os.stat(path)
+                parts.append([path, stat.st_size, stat.st_mtime_ns])
+    return make_key(*parts)
+
+
+def module_fingerprint(*names):
+    """
+    Hash of the source files of modules by name, read without importing
+    them (so a cache hit does not pay for their imports).
+    """
+    digest = hashlib.sha256()
+    for name in names:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin and os.path.isfile(spec.origin):
+            with open(spec.origin, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(name.encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ---------------------- Cache ----------------------
+class ResultCache:
+    """
+    On-disk cache of analytics results (pickled values) and rendered
+    charts (files), keyed by make_key(...). Entries are evicted least
+    recently used first once the cache grows beyond max_bytes.
+
+    Several processes can share a cache: every change to the index is a
+    read-modify-write of the file under an flock, written to a temp file
+    and renamed over it, like the entries themselves. Hits do not write
+    the index; their last_used times are added in batches, and always
+    before entries are evicted.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index_path = os.path.join(cache_dir, INDEX_FILE)
+        self._lock_path = os.path.join(cache_dir, LOCK_FILE)
+        self._index = self._load_index()
+        self._touched = {}
+        # The pipeline runs analytics and charts from several threads
+        self._lock = threading.RLock()
+        atexit.register(self._flush_at_exit)
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return {}
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A corrupt index only costs recomputation
+            return {}
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold the index against this process's threads and, with fcntl, other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _update_index(self, change=None):
+        """
+        Re-read the index (other processes may have changed it), add the
+        pending last_used times, apply change(index) and write it back.
+        """
+        with self._index_lock():
+            index = self._load_index()
+            for key, used in self._touched.items():
+                if key in index:
+                    index[key]["last_used"] = max(index[key]["last_used"], used)
+            self._touched = {}
+            if change is not None:
+                change(index)
+            self._index = index
+            _write_replace(self._index_path, "w", lambda f: json.dump(index, f, indent=2))
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                # Another process may have added it since the index was read
+                self._index = self._load_index()
+                entry = self._index.get(key)
+            if entry is None or not os.path.exists(self._path(key, entry["suffix"])):
+                return None
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self.flush()
+            return dict(entry)
+
+    def _record(self, key, suffix, label):
+        now = time.time()
+        entry = {
+            "label": label,
+            "suffix": suffix,
+            "size": os.path.getsize(self._path(key, suffix)),
+            "created": now,
+            "last_used": now,
+        }
+
+        def change(index):
+            index[key] = entry
+            self._evict(index)
+
+        self._update_index(change)
+
+    def _evict(self, index):
+        total = sum(entry["size"] for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            path = self._path(key, entry["suffix"])
+            if os.path.exists(path):
+                os.remove(path)
+            total -= entry["size"]
+            del index[key]
+
+    def flush(self):
+        """Write the last_used times of the hits not yet in the index."""
+        with self._lock:
+            if self._touched:
+                self._update_index()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except OSError:
+            pass        # the cache directory is gone; there is nothing to keep in order
+
+    # ---- values ----
+    def get_or_compute(self, key, compute, label=""):
+        """Return the cached value for key, computing and storing it on a miss."""
+        if self._lookup(key) is not None:
+            try:
+                with open(self._path(key, ".pkl"), "rb") as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+
+        value = compute()
+        _write_replace(self._path(key, ".pkl"), "wb",
+                       lambda f: pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL))
+        self._record(key, ".pkl", label)
+        return value
+
+    # ---- files ----
+    def get_file(self, key, dest_path):
+        """Copy a cached file to dest_path; return False on a miss."""
+        entry = self._lookup(key)
+        if entry is None:
+            return False
+        try:
+            shutil.copyfile(self._path(key, entry["suffix"]), dest_path)
+        except FileNotFoundError:
+            return False        # evicted by another process meanwhile
+        return True
+
+    def put_file(self, key, src_path, label=""):
+        suffix = os.path.splitext(src_path)[1]
+        with open(src_path, "rb") as src:
+            _write_replace(self._path(key, suffix), "wb", lambda f: shutil.copyfileobj(src, f))
+        self._record(key, suffix, label)
+
+    # ---- maintenance ----
+    def entries(self):
+        """(key, entry) pairs, most recently used first."""
+        return sorted(self._index.items(), key=lambda item: item[1]["last_used"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            removed = len(self._load_index())
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._index, self._touched = {}, {}
+        return removed
+
+
+def _write_replace(path, mode, write):
+    """write(f) to a temp file next to path, then rename it over path, so readers never see half a file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# ---------------------- CLI ----------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clear the analytics result cache.")
+    parser.add_argument("command", choices=["list", "clear"])
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir)
+    if args.command == "list":
+        entries = cache.entries()
+        total = 0
+        for key, entry in entries:
+            used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["last_used"]))
+            print(f"{key[:12]}  {entry['size']:>10}  {used}  {entry['label']}")
+            total += entry["size"]
+        print(f"📦 {len(entries)} entries, {total} bytes in '{args.cache_dir}'")
+    else:
+        print(f"🧹 Removed {cache.clear()} cache entries from '{args.cache_dir}'")
@@ -0,0 +1,24 @@
+import os
+import sys
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import etl_data
+
+
+@pytest.fixture
+def dataset_size():
+    """(recipes, interactions) written by the dataset fixture; a test module can override it."""
+    return 20, 150
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch, dataset_size):
+    """A small export (recipes.json, interactions.json) in a fresh working directory."""
+    recipe_count, interaction_count = dataset_size
+    monkeypatch.chdir(tmp_path)
+    etl_data.write_json("recipes.json", etl_data.recipes(recipe_count))
+    etl_data.write_json("interactions.json", etl_data.interactions(interaction_count, recipe_count))
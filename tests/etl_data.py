@@ -0,0 +1,45 @@
+"""Small exported datasets for ETL and analytics tests."""
+
+import json
+
+import numpy as np
+
+INGREDIENT_NAMES = ["Salt", "salt ", "Whole Wheat Flour (for chapati)", "whole  wheat flour", "Ghee / Oil", "", "Cumin"]
+
+
+def recipes(n, seed=0, start=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        "id": f"r{k:03d}",
+        "name": f"Recipe {k % max(n // 2, 1)}",       # duplicate names
+        "category": "Main",
+        "prep_time": int(rng.integers(0, 60)),
+        "cook_time": int(rng.integers(0, 90)),
+        "servings": 2,
+        "difficulty": ["Easy", "Medium", "Hard"][k % 3],
+        "ingredients": [{"name": str(rng.choice(INGREDIENT_NAMES)), "quantity": "1 cup"}
+                        for _ in range(int(rng.integers(0, 5)))],
+        "steps": ["Mix", "Cook"],
+    } for k in range(start, start + n)]
+
+
+def interactions(n, recipe_count, seed=0, start=0, unknown=0.1):
+    rng = np.random.default_rng(seed + 1)
+    docs = []
+    for k in range(start, start + n):
+        recipe = int(rng.integers(0, recipe_count))
+        docs.append({
+            "id": f"i{k:05d}",
+            "user_id": f"u{int(rng.integers(0, 20))}",
+            "recipe_id": f"x{recipe}" if rng.random() < unknown else f"r{recipe:03d}",
+            "views": int(rng.integers(0, 500)),
+            "likes": "" if rng.random() < 0.1 else int(rng.integers(0, 50)),
+            "rating": round(float(rng.uniform(1, 5)), 1),
+            "cook_attempts": int(rng.integers(0, 5)),
+        })
+    return docs
+
+
+def write_json(file_name, docs):
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(docs, f)
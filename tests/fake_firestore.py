@@ -0,0 +1,244 @@
+"""
+In-memory stand-in for the parts of the Firestore client API that
+exportfile.py uses: order_by / where / limit / start_at / start_after /
+end_before queries, stream(), document refs and collection-group
+partitions, in a sync (Client) and an asyncio (AsyncClient) flavour;
+plus the write batches of main.py's bulk loader.
+"""
+
+import asyncio
+import sys
+import threading
+import types
+from collections import Counter
+
+DOCUMENT_ID = "__name__"
+
+
+class FieldFilter:
+    def __init__(self, field, op, value):
+        if op != ">=":
+            raise NotImplementedError(op)
+        self.field, self.op, self.value = field, op, value
+
+
+def install_field_filter():
+    """Make `from google.cloud.firestore_v1.base_query import FieldFilter` import the fake."""
+    for name in ("google", "google.cloud", "google.cloud.firestore_v1", "google.cloud.firestore_v1.base_query"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["google.cloud.firestore_v1.base_query"].FieldFilter = FieldFilter
+
+
+def install_api_core_exceptions():
+    """
+    Make `from google.api_core import exceptions` work without
+    google-api-core installed, and return that module.
+    """
+    try:
+        from google.api_core import exceptions
+        return exceptions
+    except ImportError:
+        pass
+    exceptions = types.ModuleType("google.api_core.exceptions")
+    for name in ("ResourceExhausted", "Aborted", "DeadlineExceeded", "ServiceUnavailable", "InternalServerError"):
+        setattr(exceptions, name, type(name, (Exception,), {}))
+    sys.modules.setdefault("google", types.ModuleType("google"))
+    sys.modules.setdefault("google.api_core", types.ModuleType("google.api_core")).exceptions = exceptions
+    sys.modules["google.api_core.exceptions"] = exceptions
+    return exceptions
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocRef:
+    def __init__(self, doc_id, collection=None):
+        self.id = doc_id
+        self.collection = collection
+
+
+class FakeQuery:
+    def __init__(self, client, name, filters=(), orders=(), limit=None, start=None, end=None):
+        self.client, self.name = client, name
+        self.filters, self.orders, self._limit = filters, orders, limit
+        self._start, self._end = start, end     # (cursor, inclusive)
+
+    def _copy(self, **changes):
+        fields = dict(filters=self.filters, orders=self.orders, limit=self._limit,
+                      start=self._start, end=self._end)
+        fields.update(changes)
+        return type(self)(self.client, self.name, **fields)
+
+    def order_by(self, field):
+        return self._copy(orders=self.orders + (field,))
+
+    def where(self, filter):
+        return self._copy(filters=self.filters + (filter,))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def start_at(self, cursor):
+        return self._copy(start=(cursor, True))
+
+    def start_after(self, cursor):
+        return self._copy(start=(cursor, False))
+
+    def end_before(self, cursor):
+        return self._copy(end=(cursor, False))
+
+    def _key(self, doc_id, data):
+        orders = self.orders or (DOCUMENT_ID,)
+        return tuple(doc_id if field == DOCUMENT_ID else data.get(field) for field in orders)
+
+    def _cursor_key(self, cursor):
+        if isinstance(cursor, list):
+            cursor = cursor[0]
+        data = self.client.collections[self.name].get(cursor.id, {})
+        return self._key(cursor.id, data)
+
+    def _results(self):
+        self.client.queries += 1
+        if self.client.queries == self.client.fail_at_query:
+            raise ConnectionError(f"query {self.client.queries} failed")
+        docs = [
+            (self._key(doc_id, data), doc_id, data)
+            for doc_id, data in self.client.collections.get(self.name, {}).items()
+            if all(data.get(f.field) is not None and data[f.field] >= f.value for f in self.filters)
+        ]
+        docs.sort(key=lambda item: (item[0], item[1]))
+        if self._start is not None:
+            key, inclusive = self._cursor_key(self._start[0]), self._start[1]
+            docs = [d for d in docs if d[0] > key or (inclusive and d[0] == key)]
+        if self._end is not None:
+            key = self._cursor_key(self._end[0])
+            docs = [d for d in docs if d[0] < key]
+        if self._limit is not None:
+            docs = docs[:self._limit]
+        return [FakeDoc(doc_id, dict(data)) for _, doc_id, data in docs]
+
+    def stream(self):
+        return iter(self._results())
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id):
+        return FakeDocRef(doc_id, self.name)
+
+
+class FakePartition:
+    """Like QueryPartition: start_at / end_at are document references, None at the open ends."""
+
+    def __init__(self, start, end):
+        self.start_at = FakeDocRef(start) if start is not None else None
+        self.end_at = FakeDocRef(end) if end is not None else None
+
+
+class FakeCollectionGroup:
+    def __init__(self, client, name):
+        self.client, self.name = client, name
+
+    def get_partitions(self, count):
+        ids = sorted(self.client.collections.get(self.name, {}))
+        step = max(1, -(-len(ids) // count))
+        cuts = ids[step::step]
+        bounds = [None] + cuts + [None]
+        for start, end in zip(bounds, bounds[1:]):
+            yield FakePartition(start, end)
+
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self.client = client
+        self._writes = []
+
+    def set(self, ref, data):
+        self._writes.append((ref, dict(data)))
+
+    def commit(self):
+        self.client._commit(self._writes)
+
+
+class FakeClient:
+    """
+    collections: {collection name: {document id: data}}. With
+    fail_at_query=n, the n-th query raises ConnectionError; with
+    commit_failures=n, the first n commits of every batch (the same
+    documents) raise commit_error.
+
+    commits records (size, succeeded) per batch commit and writes counts
+    the committed sets per (collection, document id).
+    """
+
+    def __init__(self, collections, fail_at_query=None, commit_failures=0, commit_error=ConnectionError):
+        self.collections = collections
+        self.queries = 0
+        self.fail_at_query = fail_at_query
+        self.commit_failures = commit_failures
+        self.commit_error = commit_error
+        self.commits = []
+        self.writes = Counter()
+        self._failed = Counter()
+        self._lock = threading.Lock()     # batches are committed from several threads
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        return FakeCollectionGroup(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def _commit(self, writes):
+        key = tuple((ref.collection, ref.id) for ref, _ in writes)
+        with self._lock:
+            failing = self._failed[key] < self.commit_failures
+            self.commits.append((len(writes), not failing))
+            if failing:
+                self._failed[key] += 1
+                raise self.commit_error(f"commit of {len(writes)} writes failed")
+            for ref, data in writes:
+                self.collections.setdefault(ref.collection, {})[ref.id] = data
+                self.writes[ref.collection, ref.id] += 1
+
+
+# ---------------------- asyncio flavour ----------------------
+class FakeAsyncQuery(FakeQuery):
+    async def _stream(self):
+        client = self.client
+        client.in_flight += 1
+        client.max_in_flight = max(client.max_in_flight, client.in_flight)
+        try:
+            await asyncio.sleep(client.latency)
+            docs = self._results()
+        finally:
+            client.in_flight -= 1
+        for doc in docs:
+            yield doc
+
+    def stream(self):
+        return self._stream()
+
+
+class FakeAsyncCollection(FakeAsyncQuery, FakeCollection):
+    pass
+
+
+class FakeAsyncClient(FakeClient):
+    """Every page query waits `latency` seconds; tracks the most queries in flight at once."""
+
+    def __init__(self, collections, latency=0.0):
+        super().__init__(collections)
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def collection(self, name):
+        return FakeAsyncCollection(self, name)
@@ -0,0 +1,48 @@
+import math
+
+import pandas as pd
+import pytest
+
+import analytics
+import etl_data
+import fact_store
+import transfer
+from analytics_engine import AnalyticsEngine
+
+
+@pytest.fixture
+def tied_dataset(tmp_path, monkeypatch):
+    """Interactions with few distinct values, so sums, means and rankings tie."""
+    monkeypatch.chdir(tmp_path)
+    docs = etl_data.interactions(400, 60)
+    for k, doc in enumerate(docs):
+        doc["views"] = 10 * (k % 4)
+        doc["likes"] = "" if k % 11 == 0 else k % 3
+        doc["rating"] = [4.0, 4.5, 0.1][k % 3]
+        doc["cook_attempts"] = 1
+    etl_data.write_json("recipes.json", etl_data.recipes(60))
+    etl_data.write_json("interactions.json", docs)
+
+
+def assert_same_insights(result, expected):
+    assert list(result) == list(expected) == [insight.name for insight in analytics.INSIGHTS]
+    for name, value in expected.items():
+        if isinstance(value, pd.Series):
+            pd.testing.assert_series_equal(result[name], value, check_exact=True, obj=name)
+        elif isinstance(value, pd.DataFrame):
+            pd.testing.assert_frame_equal(result[name], value, check_exact=True, obj=name)
+        else:
+            assert result[name] == value or (math.isnan(result[name]) and math.isnan(value)), name
+
+
+@pytest.mark.parametrize("source", ["tables", "facts", "rollup"])
+@pytest.mark.parametrize("options", [{}, {"chunk_size": 7}, {"chunk_size": 64, "workers": 2}, {"workers": 2}])
+def test_insights_do_not_depend_on_how_interactions_are_aggregated(tied_dataset, source, options):
+    transfer.run_etl(stream=True, derived=False)
+    expected = analytics.compute_insights(engine=AnalyticsEngine.load())
+    if source == "facts":
+        fact_store.build_fact_store()
+    elif source == "rollup":
+        transfer.build_derived()
+
+    assert_same_insights(analytics.compute_insights(**options), expected)
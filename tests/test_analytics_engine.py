@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analytics_engine
+import etl_data
+import transfer
+from analytics_engine import INGREDIENT_COLUMNS, load_ingredient_keys, top
+from columnar import load_table
+from fact_store import open_fact_store
+
+
+def sorted_top(series, n=analytics_engine.TOP_N):
+    return series.sort_values(ascending=False).head(n)
+
+
+# ---------------------- Partial-Selection Top-k ----------------------
+@pytest.mark.parametrize("seed", range(20))
+def test_top_selects_the_same_entries_as_a_full_sort(seed):
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(1, 400))
+    values = rng.integers(0, int(rng.integers(2, 50)), size).astype(np.float64)
+    values[rng.random(size) < 0.1] = np.nan
+    series = pd.Series(values, index=[f"recipe {k:03d}" for k in range(size)])
+
+    result, expected = top(series), sorted_top(series)
+    assert result.index.tolist() == expected.index.tolist()
+    assert result.to_numpy().tolist() == pytest.approx(expected.to_numpy().tolist(), nan_ok=True)
+
+
+@pytest.mark.parametrize("tied", [2, 3, 12])
+@pytest.mark.parametrize("seed", range(3))
+def test_top_orders_ties_like_a_full_sort(tied, seed):
+    # Distinct values above the tie, `tied` equal values around the n-th place, smaller ones below
+    rng = np.random.default_rng(seed)
+    values = np.concatenate([100.0 + np.arange(analytics_engine.TOP_N - 2), np.full(tied, 50.0),
+                             rng.integers(0, 40, 500).astype(np.float64), [np.nan] * 3])
+    series = pd.Series(values, index=[f"recipe {k:03d}" for k in range(len(values))]).sample(frac=1, random_state=seed)
+    assert top(series).index.tolist() == sorted_top(series).index.tolist()
+
+
+@pytest.fixture
+def dataset_size():
+    return 40, 300
+
+
+def ingredient_names(recipe_ids, keys, dim):
+    names = dim["ingredient_name"].reindex(keys).to_numpy()
+    return sorted(zip(recipe_ids.tolist(), [name if isinstance(name, str) else "" for name in names]))
+
+
+# ---------------------- Ingredient Keys ----------------------
+def test_ingredient_keys_are_rebuilt_after_a_same_size_rewrite(dataset):
+    transfer.run_etl(stream=True)
+    ingredients = pd.read_csv("ingredients.csv", dtype=str, keep_default_na=False)
+    assert ingredient_names(*load_ingredient_keys()) == \
+        ingredient_names(*load_ingredient_keys(load_table("ingredients", INGREDIENT_COLUMNS)))
+
+    # Same row count, other names
+    ingredients["ingredient_name"] = ingredients["ingredient_name"].iloc[::-1].to_numpy()
+    ingredients.to_csv("ingredients.csv", index=False)
+    expected = ingredient_names(*load_ingredient_keys(load_table("ingredients", INGREDIENT_COLUMNS)))
+    assert ingredient_names(*load_ingredient_keys()) == expected
+
+
+# ---------------------- High-Engagement Ingredients ----------------------
+def exploded_mean_likes(ingredients, interactions):
+    """The exploded-join groupby().mean(), over the display names of the normalized ingredients."""
+    recipe_ids, keys, dim = load_ingredient_keys(ingredients)
+    links = pd.DataFrame({"recipe_id": recipe_ids,
+                          "ingredient_name": dim["display_name"].reindex(keys).to_numpy()})
+    merged = pd.merge(links, interactions.astype({"recipe_id": object}), on="recipe_id")
+    return top(merged.groupby("ingredient_name")["likes"].mean())
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_mean_likes_per_ingredient_equals_the_exploded_join(seed):
+    rng = np.random.default_rng(seed)
+    recipe_count = int(rng.integers(1, 30))
+    size = int(rng.integers(0, 120))
+    ingredients = pd.DataFrame({
+        "recipe_id": [f"r{k}" for k in rng.integers(0, recipe_count + 5, size)],    # recipes without interactions
+        "ingredient_name": rng.choice(etl_data.INGREDIENT_NAMES + ["Paneer", "paneer"], size),  # duplicates
+    })
+    n = int(rng.integers(1, 400))
+    likes = rng.integers(0, 50, n).astype(np.float64)
+    likes[rng.random(n) < 0.2] = np.nan
+    interactions = pd.DataFrame({
+        "recipe_id": [f"r{k}" if k < recipe_count else f"x{k}" for k in rng.integers(0, recipe_count + 3, n)],
+        "views": 1, "likes": likes, "rating": 4.0, "cook_attempts": 0,
+    })
+    engine = analytics_engine.AnalyticsEngine(pd.DataFrame(columns=["recipe_id", "name", "prep_time"]),
+                                              ingredients, interactions)
+    assert engine.high_engagement_ingredients().equals(exploded_mean_likes(ingredients, interactions))
+
+
+def test_mean_likes_per_ingredient_equals_the_exploded_join_on_etl_tables(dataset):
+    transfer.run_etl(stream=True)
+    engine = analytics_engine.AnalyticsEngine.load()
+    expected = exploded_mean_likes(load_table("ingredients", INGREDIENT_COLUMNS), analytics_engine.load_interactions())
+    assert engine.high_engagement_ingredients().equals(expected)
+
+
+# ---------------------- Prep Time / Likes Correlation ----------------------
+@pytest.mark.parametrize("offset", [0, 10**8])
+def test_correlation_has_no_cancellation_for_large_likes(offset):
+    rng = np.random.default_rng(7)
+    recipes = pd.DataFrame({"recipe_id": [f"r{k}" for k in range(30)], "name": [f"R{k}" for k in range(30)],
+                            "prep_time": rng.integers(5, 60, 30).astype(float), "cook_time": 10.0,
+                            "difficulty": "Easy"})
+    recipe_ids = rng.integers(0, 30, 2000)
+    likes = recipes["prep_time"].to_numpy()[recipe_ids] // 10 + rng.integers(0, 4, 2000)
+    interactions = pd.DataFrame({"recipe_id": [f"r{k}" for k in recipe_ids], "views": 1,
+                                 "likes": likes.astype(np.int64) + offset, "rating": 4.0, "cook_attempts": 0})
+    engine = analytics_engine.AnalyticsEngine(recipes, pd.DataFrame(columns=INGREDIENT_COLUMNS), interactions)
+
+    expected = np.corrcoef(recipes["prep_time"].to_numpy()[recipe_ids], likes)[0, 1]
+    assert engine.prep_likes_correlation() == pytest.approx(expected, rel=1e-7)
+
+
+# ---------------------- Partial Aggregates ----------------------
+def assert_same_bits(result, expected):
+    pd.testing.assert_frame_equal(result.sort_index(), expected.sort_index(), check_exact=True)
+
+
+def test_partials_of_any_split_add_up_to_the_whole(dataset):
+    transfer.run_etl(stream=True)
+    interactions = analytics_engine.load_interactions()
+    interactions.loc[interactions.index[::7], "rating"] = 0.1      # inexact float sums
+    expected = analytics_engine.aggregate_interactions(interactions)
+
+    rng = np.random.default_rng(3)
+    cuts = np.sort(rng.choice(len(interactions), 6, replace=False))
+    chunks = [interactions.iloc[start:stop] for start, stop in zip([0, *cuts], [*cuts, len(interactions)])]
+    assert_same_bits(analytics_engine.aggregate_chunks(chunks), expected)
+    assert_same_bits(analytics_engine.aggregate_chunks(chunks, workers=2), expected)
+
+
+def test_fact_store_slices_add_up_to_the_whole(dataset):
+    transfer.run_etl(stream=True)
+    facts = open_fact_store()
+    expected = analytics_engine.aggregate_interactions(analytics_engine.load_interactions())
+    assert_same_bits(analytics_engine.aggregate_facts(facts), expected)
+    assert_same_bits(analytics_engine.aggregate_facts(facts, workers=3), expected)
@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+import columnar
+import transfer
+
+pytest.importorskip("pyarrow")
+
+
+def rows(n, views):
+    return [{"interaction_id": f"i{k}", "user_id": "u1", "recipe_id": f"r{k % 3}", "views": views,
+             "likes": 1, "rating": 4.0, "cook_attempts": 0} for k in range(n)]
+
+
+def views(table="interactions"):
+    return sorted(set(columnar.load_table(table, ["views"])["views"].astype(int)))
+
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+# ---------------------- Stale Parquet Datasets ----------------------
+def test_csv_only_rewrite_removes_the_parquet_dataset(tables):
+    transfer.save_table("interactions", rows(4, 375), parquet=True)
+    assert columnar.parquet_source("interactions")
+    transfer.save_table("interactions", rows(4, 100150))
+    assert not os.path.isdir("interactions.parquet")
+    assert views() == [100150]
+
+    with transfer.TableWriters("interactions", parquet=True) as writers:
+        writers.writerows(rows(2, 375))
+    with transfer.TableWriters("interactions") as writers:
+        writers.writerows(rows(2, 100150))
+    assert not os.path.isdir("interactions.parquet")
+    assert views() == [100150]
+
+
+def test_csv_newer_than_the_parquet_dataset_is_read_instead(tables):
+    transfer.save_table("interactions", rows(4, 375), parquet=True)
+    time.sleep(0.01)
+    transfer.save_csv("interactions.csv", transfer.INTERACTION_FIELDS, rows(4, 100150))
+    assert not columnar.parquet_source("interactions")
+    assert views() == [100150]
+    assert [int(v) for chunk in columnar.iter_table("interactions", ["views"]) for v in chunk["views"]] == [100150] * 4
+    assert columnar.table_state("interactions")["format"] == "csv"
+
+
+def test_append_extends_the_parquet_source(tables):
+    transfer.save_table("interactions", rows(4, 375), parquet=True)
+    with transfer.TableWriters("interactions", append=True) as writers:
+        writers.writerows(rows(2, 100150))
+    assert columnar.parquet_source("interactions")
+    assert views() == [375, 100150]
+    assert len(columnar.load_table("interactions", ["views"])) == 6
+
+
+def test_parquet_int_columns_keep_only_integral_values(tables):
+    values = [12.7, "12.7", "12.0", 5.0, "3", 7, "1e3", "x", float("inf"), float("nan")]
+    table_rows = [dict(row, views=value) for row, value in zip(rows(len(values), 0), values)]
+    transfer.save_table("interactions", table_rows, parquet=True)
+    assert columnar.parquet_source("interactions")
+    loaded = columnar.load_table("interactions", ["views"])["views"]
+    assert loaded.tolist()[2:7] == [12, 5, 3, 7, 1000]
+    assert loaded.isna().tolist() == [True, True] + [False] * 5 + [True] * 3
@@ -0,0 +1,140 @@
+import asyncio
+import json
+
+import pytest
+
+import exportfile
+import transfer
+from fake_firestore import FakeAsyncClient, FakeClient, install_field_filter
+
+
+def interactions(n, start=0):
+    return {
+        f"i{k:04d}": {"user_id": "u1", "recipe_id": f"r{k % 3}", "views": k, "likes": 1,
+                      "rating": 4.0, "cook_attempts": 0, "timestamp": f"2025-01-01T00:{k // 60:02d}:{k % 60:02d}Z"}
+        for k in range(start, start + n)
+    }
+
+
+@pytest.fixture
+def firestore(tmp_path, monkeypatch):
+    install_field_filter()
+    monkeypatch.chdir(tmp_path)
+    client = FakeClient({"interactions": interactions(25)})
+    monkeypatch.setattr(exportfile, "_db", client)
+    return client
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ---------------------- High-Water Marks ----------------------
+@pytest.mark.parametrize("export", [
+    lambda: exportfile.export_collection_to_json("interactions"),
+    lambda: exportfile.export_collection_paginated("interactions", workers=3, page_size=4),
+])
+def test_full_export_records_the_high_water_mark(firestore, export):
+    export()
+    mark = exportfile.load_export_state()["interactions"]
+    assert mark["value"] == "2025-01-01T00:00:24Z"
+    assert mark["ids_at_value"] == ["i0024"]
+
+    # The next delta holds only what was created after the full export
+    assert exportfile.export_collection_delta("interactions", exportfile.load_export_state(), page_size=4) == 0
+    firestore.collections["interactions"].update(interactions(3, start=25))
+    state = exportfile.load_export_state()
+    assert exportfile.export_collection_delta("interactions", state, page_size=4) == 3
+    assert sorted(doc["id"] for doc in read_json("interactions.delta.json")) == ["i0025", "i0026", "i0027"]
+
+
+def test_async_export_records_the_high_water_mark(firestore):
+    client = FakeAsyncClient(firestore.collections)
+    asyncio.run(exportfile.export_collections_async(["interactions"], page_size=4, db=client))
+    assert exportfile.load_export_state()["interactions"]["value"] == "2025-01-01T00:00:24Z"
+
+
+def test_delta_without_mark_refuses_to_dump_onto_a_full_export(firestore):
+    with open("interactions.json", "w", encoding="utf-8") as f:
+        json.dump([], f)
+    with pytest.raises(RuntimeError, match="run a full export first"):
+        exportfile.export_collection_delta("interactions", {}, page_size=4)
+
+
+def test_full_export_then_delta_merge_does_not_duplicate_rows(firestore):
+    exportfile.export_collection_paginated("interactions", workers=2, page_size=4)
+    with open("recipes.json", "w", encoding="utf-8") as f:
+        json.dump([], f)
+    transfer.run_etl(stream=True)
+
+    firestore.collections["interactions"].update(interactions(2, start=25))
+    exportfile.export_collection_delta("interactions", exportfile.load_export_state(), page_size=4)
+    transfer.merge_deltas()
+
+    with open("interactions.csv", encoding="utf-8") as f:
+        ids = [line.split(",")[0] for line in f.read().splitlines()[1:]]
+    assert len(ids) == 27 and len(set(ids)) == 27
+
+
+def test_partitioned_export_uses_the_partition_cursors(firestore):
+    assert exportfile.split_key_range("interactions", 3) == [(None, "i0009"), ("i0009", "i0018"), ("i0018", None)]
+
+
+def test_interrupted_export_resumes_from_its_checkpoint(firestore, monkeypatch):
+    # Pages of 4: the 5th query fails after 16 documents were written and checkpointed
+    monkeypatch.setattr(exportfile, "_db", FakeClient(firestore.collections, fail_at_query=5))
+    with pytest.raises(ConnectionError):
+        exportfile.export_collection_paginated("interactions", workers=1, page_size=4)
+    [part] = exportfile.ExportCheckpoint.load("interactions", 4).partitions
+    assert (part["last_id"], part["count"], part["done"]) == ("i0015", 16, False)
+
+    resumed = FakeClient(firestore.collections)
+    monkeypatch.setattr(exportfile, "_db", resumed)
+    assert exportfile.export_collection_paginated("interactions", workers=1, page_size=4) == 25
+    assert [doc["id"] for doc in read_json("interactions.json")] == [f"i{k:04d}" for k in range(25)]
+    assert resumed.queries == 3         # i0016-i0019, i0020-i0023, i0024
+    assert exportfile.ExportCheckpoint.load("interactions", 4) is None
+    assert exportfile.load_export_state()["interactions"]["value"] == "2025-01-01T00:00:24Z"
+
+
+def test_two_delta_exports_before_one_merge_keep_both_batches(firestore):
+    exportfile.export_collection_paginated("interactions", workers=2, page_size=4)
+    with open("recipes.json", "w", encoding="utf-8") as f:
+        json.dump([], f)
+    transfer.run_etl(stream=True)
+
+    firestore.collections["interactions"].update(interactions(3, start=25))
+    assert exportfile.export_collection_delta("interactions", exportfile.load_export_state(), page_size=4) == 3
+    assert exportfile.export_collection_delta("interactions", exportfile.load_export_state(), page_size=4) == 0
+    firestore.collections["interactions"].update(interactions(2, start=28))
+    assert exportfile.export_collection_delta("interactions", exportfile.load_export_state(), page_size=4) == 2
+    assert transfer.pending_deltas("interactions") == ["interactions.delta.json", "interactions.delta.1.json"]
+
+    transfer.merge_deltas()
+    assert transfer.pending_deltas("interactions") == []
+    with open("interactions.csv", encoding="utf-8") as f:
+        ids = [line.split(",")[0] for line in f.read().splitlines()[1:]]
+    assert ids == [f"i{k:04d}" for k in range(30)]
+
+
+# ---------------------- Asyncio Export ----------------------
+def test_async_export_bounds_queries_and_matches_the_sync_export(firestore):
+    firestore.collections.update({
+        "users": {f"u{k:03d}": {"name": f"User {k}"} for k in range(30)},
+        "recipes": {f"r{k:03d}": {"name": f"Recipe {k}", "category": "Main"} for k in range(18)},
+    })
+    collections = ["users", "recipes", "interactions"]
+    expected = {}
+    for name in collections:
+        exportfile.export_collection_to_json(name)
+        expected[name] = read_json(f"{name}.json")
+
+    client = FakeAsyncClient(firestore.collections, latency=0.05)
+    counts = asyncio.run(exportfile.export_collections_async(collections, page_size=4,
+                                                             max_concurrent_queries=2, db=client))
+
+    assert 1 < client.max_in_flight <= 2
+    assert counts == {name: len(docs) for name, docs in expected.items()}
+    for name in collections:
+        assert read_json(f"{name}.json") == expected[name]
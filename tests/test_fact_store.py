@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import etl_data
+import fact_store
+import transfer
+from analytics_engine import INTERACTION_COLUMNS, load_interactions
+
+
+def decoded(facts):
+    frame = facts.to_frame(INTERACTION_COLUMNS + ["user_id"])
+    return frame.astype({"recipe_id": object, "user_id": object})
+
+
+def expected_frame():
+    interactions = load_interactions()
+    users = pd.read_csv("interactions.csv", usecols=["user_id"], dtype=str)["user_id"]
+    return interactions.assign(user_id=users).astype({"recipe_id": object, "user_id": object})
+
+
+# ---------------------- Chunked, Appended Fact Store ----------------------
+def test_chunked_build_gives_the_whole_table_types(dataset):
+    transfer.run_etl(stream=True)
+    rows = pd.read_csv("interactions.csv", dtype=str, keep_default_na=False)
+    rows.loc[140, "views"] = "n/a"          # the last chunk turns views into floats
+    rows.to_csv("interactions.csv", index=False)
+
+    fact_store.build_fact_store(chunk_size=16)
+    facts = fact_store.open_fact_store()
+    assert facts.column("views").dtype == np.float64 and facts.column("cook_attempts").dtype == np.int64
+    pd.testing.assert_frame_equal(decoded(facts), expected_frame()[decoded(facts).columns], check_exact=True)
+
+
+@pytest.mark.parametrize("dirty", [False, True])
+def test_delta_append_equals_rebuild(dataset, dirty):
+    transfer.run_etl(stream=True)
+    delta = etl_data.interactions(60, 25, seed=9, start=150)    # new recipe and user ids too
+    if dirty:
+        delta[3]["views"] = "abc"
+    etl_data.write_json("interactions.delta.json", delta)
+    before = os.path.getsize(os.path.join(fact_store.FACT_DIR, "views.bin"))
+    transfer.run_etl(delta=True)
+
+    facts = fact_store.open_fact_store()
+    assert len(facts) == 210
+    if not dirty:
+        assert os.path.getsize(os.path.join(fact_store.FACT_DIR, "views.bin")) == before * 210 // 150
+    pd.testing.assert_frame_equal(decoded(facts), expected_frame()[decoded(facts).columns], check_exact=True)
+
+
+def test_store_is_stale_after_a_rewrite(dataset):
+    transfer.run_etl(stream=True)
+    assert fact_store.open_fact_store() is not None
+    transfer.save_csv("interactions.csv", transfer.INTERACTION_FIELDS, [])
+    assert fact_store.open_fact_store() is None
+    assert fact_store.update_fact_store() == 0
@@ -0,0 +1,109 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import etl_data
+import ingredient_index
+import recipe_stats
+import transfer
+from columnar import load_table
+from ingredient_dim import DIM_TABLE, LINK_TABLE, MISSING_KEY
+
+
+def contents(index_dir):
+    index = ingredient_index.IngredientIndex(index_dir)
+    recipe_ids = [index.recipe_id(ordinal) for ordinal in range(len(index))]
+    postings = {name: [recipe_ids[ordinal] for ordinal in index.postings(name)] for name in index.vocabulary}
+    return index.vocabulary, recipe_ids, postings, np.asarray(index.engagement)
+
+
+def expected():
+    """Postings and engagement from the whole tables."""
+    links = load_table(LINK_TABLE)
+    links = links[links["ingredient_key"] != MISSING_KEY]
+    vocabulary = load_table(DIM_TABLE).sort_values("ingredient_key")["ingredient_name"].tolist()
+    recipe_ids = sorted(set(links["recipe_id"].astype(str)))
+    postings = {name: sorted(set(links.loc[links["ingredient_key"] == key, "recipe_id"].astype(str)))
+                for key, name in enumerate(vocabulary)}
+    interactions = load_table("interactions")
+    totals = sum(pd.to_numeric(interactions[col], errors="coerce").fillna(0)
+                 for col in ("views", "likes", "cook_attempts"))
+    engagement = totals.groupby(interactions["recipe_id"].astype(str)).sum().reindex(recipe_ids).fillna(0)
+    return vocabulary, recipe_ids, postings, engagement.to_numpy()
+
+
+def assert_index_equal(actual, wanted):
+    assert actual[:3] == wanted[:3]
+    np.testing.assert_array_equal(actual[3], wanted[3])
+
+
+# ---------------------- Chunked, Incremental Index ----------------------
+@pytest.mark.parametrize("chunk_size", [7, ingredient_index.DEFAULT_CHUNK_SIZE])
+def test_chunked_build_matches_the_whole_tables(dataset, chunk_size):
+    transfer.run_etl(stream=True)
+    ingredient_index.build_index(chunk_size=chunk_size)
+    assert_index_equal(contents(ingredient_index.INDEX_DIR), expected())
+
+    # Without an up-to-date rollup the engagement is summed from the interactions
+    shutil.rmtree(recipe_stats.STATS_DIR)
+    ingredient_index.build_index("rebuilt", chunk_size=chunk_size)
+    assert_index_equal(contents("rebuilt"), expected())
+
+
+def test_delta_update_equals_rebuild(dataset):
+    transfer.run_etl(stream=True)
+    before = contents(ingredient_index.INDEX_DIR)
+    etl_data.write_json("recipes.delta.json", etl_data.recipes(10, seed=3, start=20))
+    etl_data.write_json("interactions.delta.json", etl_data.interactions(60, 30, seed=9, start=150))
+    transfer.run_etl(delta=True)
+
+    updated = contents(ingredient_index.INDEX_DIR)
+    assert len(updated[1]) > len(before[1])
+    ingredient_index.build_index("rebuilt")
+    assert_index_equal(updated, contents("rebuilt"))
+    assert_index_equal(updated, expected())
+
+
+def test_update_rebuilds_after_a_rewrite(dataset):
+    transfer.run_etl(stream=True)
+    etl_data.write_json("recipes.json", etl_data.recipes(8, seed=4))
+    transfer.stream_recipes("recipes.json")
+    recipe_stats.update_recipe_stats()
+    ingredient_index.update_index()
+    assert_index_equal(contents(ingredient_index.INDEX_DIR), expected())
+    assert os.listdir(".").count(ingredient_index.INDEX_DIR + ".tmp") == 0
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_sorted_list_operations_match_numpy_set_operations(seed):
+    rng = np.random.default_rng(seed)
+
+    def postings(dtype):
+        size = int(rng.integers(0, 60))
+        return np.unique(rng.integers(0, 80, size)).astype(dtype)
+
+    for _ in range(20):
+        a, b = postings(np.uint8), postings(np.uint16)
+        np.testing.assert_array_equal(ingredient_index._intersect(a, b), np.intersect1d(a, b))
+        np.testing.assert_array_equal(ingredient_index._difference(a, b), np.setdiff1d(a, b))
+        np.testing.assert_array_equal(ingredient_index._union(a, b), np.union1d(a, b))
+
+
+def test_queries_match_set_semantics(dataset):
+    transfer.run_etl(stream=True)
+    index = ingredient_index.IngredientIndex()
+    sets = {name: set(index.postings(name).tolist()) for name in index.vocabulary}
+    every = set(range(len(index)))
+    names = index.vocabulary + ["unknown"]
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        all_of, any_of, none_of = ([str(name) for name in rng.choice(names, int(rng.integers(0, 3)), replace=False)]
+                                   for _ in range(3))
+        expected = every.intersection(*(sets.get(name, set()) for name in all_of))
+        if any_of:
+            expected &= set().union(*(sets.get(name, set()) for name in any_of))
+        expected -= set().union(*(sets.get(name, set()) for name in none_of))
+        assert index.query(all_of, any_of, none_of).tolist() == sorted(expected)
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+import instrument
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = instrument.enable(str(tmp_path / "run_summary.json"), trace_memory=True)
+    yield recorder
+    instrument.finish()
+
+
+def records(recorder):
+    return {record["name"]: record for record in recorder.stages}
+
+
+# ---------------------- Per-Stage Memory ----------------------
+def test_stage_records_its_growth_of_the_process_peak(recorder):
+    with instrument.stage("small"):
+        pass
+    with instrument.stage("large"):
+        block = bytearray(64 * 2**20)
+        block[::4096] = b"x" * len(block[::4096])
+        del block
+
+    small, large = records(recorder)["small"], records(recorder)["large"]
+    if large["process_peak_rss_bytes"] is None:
+        pytest.skip("no resource module")
+    assert large["rss_peak_growth_bytes"] >= 32 * 2**20
+    assert small["rss_peak_growth_bytes"] < 32 * 2**20
+    assert large["peak_alloc_bytes"] >= 64 * 2**20 > small["peak_alloc_bytes"]
+    assert not small["concurrent"] and not large["concurrent"]
+
+
+def test_overlapping_stages_of_two_threads_are_marked_concurrent(recorder):
+    started, done = threading.Event(), threading.Event()
+
+    def worker():
+        with instrument.stage("worker"):
+            started.set()
+            done.wait(5)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait(5)
+    with instrument.stage("main"):
+        pass
+    done.set()
+    thread.join()
+    with instrument.stage("after"):
+        pass
+
+    stages = records(recorder)
+    assert stages["worker"]["concurrent"] and stages["main"]["concurrent"]
+    assert not stages["after"]["concurrent"]
@@ -0,0 +1,57 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from fake_firestore import FakeClient, install_api_core_exceptions
+
+
+@pytest.fixture
+def firestore(monkeypatch):
+    """Install a FakeClient built by the returned function; sleeps are recorded, not slept."""
+    exceptions = install_api_core_exceptions()
+    sleeps = []
+    monkeypatch.setattr(main, "time", SimpleNamespace(time=time.time, sleep=sleeps.append))
+
+    def install(**options):
+        client = FakeClient({}, commit_error=exceptions.ServiceUnavailable, **options)
+        client.sleeps = sleeps
+        monkeypatch.setattr(main, "_db", client)
+        return client
+
+    return install
+
+
+def docs(n):
+    return [(f"d{k:05d}", {"k": k}) for k in range(n)]
+
+
+@pytest.mark.parametrize("n, options, sizes", [
+    (1234, {"max_in_flight": 2}, [234, 500, 500]),
+    (1000, {"max_in_flight": 1}, [500, 500]),
+    (7, {"batch_size": 3, "max_in_flight": 2}, [1, 3, 3]),
+])
+def test_transient_failures_are_retried_and_every_doc_is_written_once(firestore, n, options, sizes):
+    client = firestore(commit_failures=2)
+    written = main.bulk_write("items", iter(docs(n)), main.BulkOptions(**options))
+
+    assert written == n
+    assert sorted(size for size, ok in client.commits if ok) == sizes
+    assert sorted(size for size, ok in client.commits if not ok) == sorted(sizes * 2)
+    assert len(client.sleeps) == 2 * len(sizes)
+    assert client.writes == {("items", doc_id): 1 for doc_id, _ in docs(n)}
+    assert client.collections["items"] == dict(docs(n))
+
+
+def test_retries_back_off_and_give_up_after_max_retries(firestore):
+    client = firestore(commit_failures=4)
+    with pytest.raises(client.commit_error):
+        main.bulk_write("items", docs(10), main.BulkOptions(max_retries=3))
+
+    assert client.commits == [(10, False)] * 4
+    assert len(client.sleeps) == 3
+    for attempt, delay in enumerate(client.sleeps):
+        base = main.BACKOFF_BASE_SECONDS * 2 ** attempt
+        assert 0.5 * base <= delay <= 1.5 * base
+    assert "items" not in client.collections
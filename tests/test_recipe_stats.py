@@ -0,0 +1,75 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import analytics_engine
+import columnar
+import etl_data
+import fact_store
+import ingredient_index
+import recipe_stats
+import transfer
+
+
+def read(stats_dir):
+    with open(os.path.join(stats_dir, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(os.path.join(stats_dir, recipe_stats.STATS_FILE), encoding="utf-8") as f:
+        return meta, f.read()
+
+
+def delta(n=60, start=150, seed=9):
+    docs = etl_data.interactions(n, 25, seed=seed, start=start)     # new recipe ids too
+    for doc in docs[::5]:
+        doc["rating"] = 0.1                                           # inexact float sums
+    return docs
+
+
+# ---------------------- recipe_stats Rollup ----------------------
+@pytest.mark.parametrize("parquet", [False, True])
+def test_delta_merge_equals_rebuild(dataset, parquet, capsys):
+    if parquet:
+        pytest.importorskip("pyarrow")
+    transfer.run_etl(stream=True, parquet=parquet)
+    for k, seed in enumerate([9, 11]):
+        etl_data.write_json("interactions.delta.json", delta(start=150 + 60 * k, seed=seed))
+        transfer.run_etl(delta=True, parquet=parquet)
+        assert "updated with 60 new interactions" in capsys.readouterr().out     # folded in, not rebuilt
+
+    merged = read(recipe_stats.STATS_DIR)
+    assert merged[0]["interactions"] == 270
+    recipe_stats.build_recipe_stats("rebuilt")
+    assert merged == read("rebuilt")
+
+    expected = analytics_engine.aggregate_interactions(analytics_engine.load_interactions())
+    stats = recipe_stats.open_recipe_stats()
+    pd.testing.assert_frame_equal(stats.sort_index(), expected[stats.columns].sort_index(), check_exact=True)
+
+
+def test_rewritten_interactions_are_rebuilt(dataset):
+    transfer.run_etl(stream=True)
+    etl_data.write_json("interactions.json", delta())
+    transfer.stream_interactions("interactions.json")
+    assert recipe_stats.open_recipe_stats() is None
+    recipe_stats.update_recipe_stats()
+
+    assert recipe_stats.open_recipe_stats() is not None
+    assert columnar.table_state("interactions") == read(recipe_stats.STATS_DIR)[0]["source"]
+    recipe_stats.build_recipe_stats("rebuilt")
+    assert read(recipe_stats.STATS_DIR) == read("rebuilt")
+
+
+def test_etl_can_leave_the_derived_structures_out(dataset):
+    transfer.run_etl(stream=True, derived=False)
+    assert not any(os.path.exists(d) for d in (fact_store.FACT_DIR, recipe_stats.STATS_DIR, ingredient_index.INDEX_DIR))
+
+    transfer.build_derived()
+    assert recipe_stats.open_recipe_stats() is not None and fact_store.open_fact_store() is not None
+    etl_data.write_json("interactions.delta.json", delta())
+    transfer.run_etl(delta=True, derived=False)
+    assert recipe_stats.open_recipe_stats() is None and fact_store.open_fact_store() is None    # stale, not used
+
+    transfer.build_derived(delta=True)
+    assert read(recipe_stats.STATS_DIR)[0]["interactions"] == 210
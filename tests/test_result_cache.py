@@ -0,0 +1,84 @@
+import ast
+import itertools
+import json
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+
+import result_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def local_imports(module):
+    with open(os.path.join(ROOT, f"{module}.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    # Imports of the CLI block do not define results
+    tree.body = [node for node in tree.body if not (isinstance(node, ast.If) and "__main__" in ast.unparse(node.test))]
+    names = {node.module for node in ast.walk(tree) if isinstance(node, ast.ImportFrom) and node.module}
+    names |= {alias.name for node in ast.walk(tree) if isinstance(node, ast.Import) for alias in node.names}
+    return {name for name in names if os.path.exists(os.path.join(ROOT, f"{name}.py"))}
+
+
+# ---------------------- Definition Fingerprint ----------------------
+def test_engine_fingerprint_covers_the_modules_it_imports():
+    # instrument only records timings; it does not change results
+    seen, pending = {"analytics_engine", "instrument"}, ["analytics_engine"]
+    while pending:
+        for name in local_imports(pending.pop()) - seen:
+            assert name in result_cache.ENGINE_MODULES, f"{name} defines results but is not fingerprinted"
+            seen.add(name)
+            pending.append(name)
+
+
+def test_module_fingerprint_changes_with_the_source(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "engine_part.py").write_text("X = 1\n")
+    before = result_cache.module_fingerprint("engine_part")
+    (tmp_path / "engine_part.py").write_text("X = 2\n")
+    assert result_cache.module_fingerprint("engine_part") != before
+
+
+# ---------------------- Shared Index ----------------------
+def record_values(cache_dir, worker):
+    cache = result_cache.ResultCache(cache_dir)
+    for k in range(25):
+        cache.get_or_compute(f"{worker}-{k}", lambda: k)
+
+
+def test_processes_sharing_a_cache_keep_every_entry(tmp_path):
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(record_values, [str(tmp_path)] * 4, range(4)))
+    cache = result_cache.ResultCache(str(tmp_path))
+    assert {key for key, _ in cache.entries()} == {f"{worker}-{k}" for worker in range(4) for k in range(25)}
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def fake_clock(monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+
+
+def test_hits_are_written_to_the_index_in_batches(tmp_path, monkeypatch):
+    fake_clock(monkeypatch)
+    cache = result_cache.ResultCache(str(tmp_path))
+    cache.get_or_compute("a", lambda: 1)
+    index = tmp_path / result_cache.INDEX_FILE
+    written = index.read_text()
+    for _ in range(3):
+        assert cache.get_or_compute("a", lambda: 2) == 1
+    assert index.read_text() == written
+
+    cache.flush()
+    assert json.loads(index.read_text())["a"]["last_used"] > json.loads(written)["a"]["last_used"]
+
+
+def test_eviction_sees_the_hits_not_yet_written(tmp_path, monkeypatch):
+    fake_clock(monkeypatch)
+    value = b"x" * 100
+    cache = result_cache.ResultCache(str(tmp_path), max_bytes=2 * len(result_cache.pickle.dumps(value)) + 50)
+    cache.get_or_compute("a", lambda: value)
+    cache.get_or_compute("b", lambda: value)
+    cache.get_or_compute("a", lambda: None)         # a hit: a is now more recent than b
+    cache.get_or_compute("c", lambda: value)
+    assert [key for key, _ in cache.entries()] == ["c", "a"]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import transfer
+from transfer import iter_json_array
+
+DOCS = [
+    {"id": "r1", "name": "Quote \" and backslash \\ and ]}, inside", "tags": ["a", "b,c"], "empty": {}},
+    {"name": "café 🍳", "escaped": "tab\tnewline\nunicode\\u0041", "steps": [[1, 2], []]},
+    12345,
+    -0.5e-3,
+    "string with \\\" escaped quote",
+    [True, False, None],
+    {"nested": {"deep": [{"k": "v"}]}, "number": 1e300},
+]
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, transfer.READ_CHUNK_SIZE])
+def test_elements_straddling_chunk_boundaries(tmp_path, chunk_size):
+    # Split \uXXXX escapes (ensure_ascii) as well as raw non-ASCII characters
+    for ensure_ascii in (True, False):
+        text = " \n\t [\n" + ",\n  ".join(json.dumps(doc, ensure_ascii=ensure_ascii) for doc in DOCS) + "\n]\n"
+        assert list(iter_json_array(write(tmp_path / "docs.json", text), chunk_size)) == DOCS
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5])
+def test_numbers_are_not_cut_at_a_boundary(tmp_path, chunk_size):
+    # "1." and "1e" are complete numbers on their own: 1
+    numbers = [123456, 7, -89, 1.25, 1e-7, 0]
+    path = write(tmp_path / "numbers.json", "[" + ",".join(json.dumps(n) for n in numbers) + "]")
+    assert list(iter_json_array(path, chunk_size)) == numbers
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]", "\n[\n]\n"])
+@pytest.mark.parametrize("chunk_size", [1, 4096])
+def test_empty_array(tmp_path, text, chunk_size):
+    assert list(iter_json_array(write(tmp_path / "empty.json", text), chunk_size)) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 4096])
+def test_truncated_input_raises(tmp_path, chunk_size):
+    text = json.dumps(DOCS[:3])
+    for cut in range(len(text)):
+        path = write(tmp_path / "truncated.json", text[:cut])
+        with pytest.raises(ValueError):
+            list(iter_json_array(path, chunk_size))
+
+
+def test_top_level_must_be_an_array(tmp_path):
+    with pytest.raises(ValueError, match="expected a top-level JSON array"):
+        list(iter_json_array(write(tmp_path / "object.json", ' {"a": 1}'), 2))
@@ -0,0 +1,115 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+import etl_data
+import transfer
+import validate
+
+
+def read(file_name):
+    with open(file_name, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+# ---------------------- Validation in Delta Runs ----------------------
+def test_delta_run_extends_the_validation_reports(workdir):
+    recipes = etl_data.recipes(30)
+    base, delta = etl_data.interactions(200, 30), etl_data.interactions(80, 30, seed=5, start=200)
+
+    os.mkdir("full")
+    os.chdir("full")
+    etl_data.write_json("recipes.json", recipes)
+    etl_data.write_json("interactions.json", base + delta)
+    transfer.run_etl(stream=True, validate=True)
+
+    os.chdir(workdir)
+    etl_data.write_json("recipes.json", recipes)
+    etl_data.write_json("interactions.json", base)
+    transfer.run_etl(stream=True, validate=True)
+    etl_data.write_json("interactions.delta.json", delta)
+    transfer.run_etl(delta=True, validate=True)
+
+    for file_name in ("validation_report.csv", "validation_rules_report.csv"):
+        assert read(file_name) == read(os.path.join("full", file_name))
+    assert "required:likes" in read("validation_rules_report.csv")
+    assert sorted(read("rejects.csv").splitlines()) == sorted(read("full/rejects.csv").splitlines())
+
+
+# ---------------------- Column-Wise Validation ----------------------
+# Texts around the edges of int() / float() parsing
+VALUES = ["", " ", "0", "12", " 7 ", "+5", "-0", "007", "1_000", "1__0", "_1", "1_", "1.5", ".5", "5.",
+          "1e3", "1E-2", "1e", "e3", "nan", "NaN", "inf", "-Infinity", "infinit", "0x10", "abc", "1,5",
+          "\u0661\u0662", "\u00bd", "1 2", "--1", "+.5e+1", "True"]
+
+
+def row_wise_invalid(rows, rules):
+    """Invalid row indices as the row-wise validate.py (before the column rules) found them."""
+    invalid = []
+    for index, row in enumerate(rows):
+        if any(row[field] in ("", None) for field in rules.get("required", [])):
+            invalid.append(index)
+            continue
+        try:
+            for field in rules.get("int", []):
+                int(row[field])
+            for field in rules.get("float", []):
+                float(row[field])
+        except ValueError:
+            invalid.append(index)
+    return invalid
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("table", list(validate.TABLE_RULES))
+def test_column_rules_match_the_row_wise_checks(workdir, table, seed):
+    rng = np.random.default_rng(seed)
+    rules = validate.TABLE_RULES[table]
+    fields = rules["required"]
+    rows = [{field: str(rng.choice(VALUES)) if rng.random() < 0.3 else str(rng.integers(0, 100))
+             for field in fields} for _ in range(300)]
+    with open(f"{table}.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(f"{table}.csv", newline="", encoding="utf-8") as f:
+        expected = row_wise_invalid(list(csv.DictReader(f)), rules)
+
+    result = validate.validate_table(validate.load_csv(f"{table}.csv"), rules)
+    invalid = sorted(set().union(*result.failures.values()))
+    assert invalid == expected
+    assert (result.valid, result.invalid) == (len(rows) - len(expected), len(expected))
+    assert [index for index, row in enumerate(rows) if validate.check_row(row, rules)] == expected
+
+
+def test_pipeline_quarantines_the_same_rows_as_the_etl(workdir):
+    import pipeline
+
+    recipes, interactions = etl_data.recipes(30), etl_data.interactions(200, 30)
+    recipes[4]["name"] = ""
+    interactions[7]["views"] = "many"
+    for directory in ("etl", "pipeline"):
+        os.mkdir(workdir / directory)
+        os.chdir(workdir / directory)
+        etl_data.write_json("recipes.json", recipes)
+        etl_data.write_json("interactions.json", interactions)
+
+    os.chdir(workdir / "etl")
+    transfer.run_etl(validate=True)
+    os.chdir(workdir / "pipeline")
+    stages = [stage for stage in pipeline.build_stages() if stage.name.startswith(("transform:", "save:", "validate"))]
+    pipeline.run_stages(stages)
+
+    for file_name in ("validation_report.csv", "validation_rules_report.csv", "recipes.csv", "ingredients.csv",
+                      "steps.csv", "interactions.csv", "recipe_ingredients.csv"):
+        assert read(file_name) == read(os.path.join(workdir, "etl", file_name)), file_name
+    assert sorted(read("rejects.csv").splitlines()) == sorted(read("../etl/rejects.csv").splitlines())
+    assert "many" not in read("interactions.csv") and "many" in read("rejects.csv")
@@ -1,6 +1,117 @@
+import argparse
 import json
 import csv
 import os
+import re
+import sys
+from collections import namedtuple
+
+import columnar
+import instrument
+from ingredient_dim import DIM_TABLE, LINK_TABLE, IngredientVocabulary, save_links_state
+from fact_store import build_fact_store, update_fact_store
+from ingredient_index import build_index, update_index
+from recipe_stats import build_recipe_stats, update_recipe_stats
+from validate import RowValidator
+
+# ---------------------- Table Schemas ----------------------
+RECIPE_FIELDS = ["recipe_id", "name", "category", "prep_time", "cook_time", "servings", "difficulty"]
+INGREDIENT_FIELDS = ["ingredient_id", "recipe_id", "ingredient_name", "quantity"]
+STEP_FIELDS = ["step_id", "recipe_id", "step_number", "instruction"]
+INTERACTION_FIELDS = ["interaction_id", "user_id", "recipe_id", "views", "likes", "rating", "cook_attempts"]
+INGREDIENT_DIM_FIELDS = ["ingredient_key", "ingredient_name", "display_name"]
+RECIPE_INGREDIENT_FIELDS = ["recipe_id", "ingredient_key"]
+
+TABLE_FIELDS = {
+    "recipes": RECIPE_FIELDS,
+    "ingredients": INGREDIENT_FIELDS,
+    "steps": STEP_FIELDS,
+    "interactions": INTERACTION_FIELDS,
+    DIM_TABLE: INGREDIENT_DIM_FIELDS,
+    LINK_TABLE: RECIPE_INGREDIENT_FIELDS,
+}
+
+READ_CHUNK_SIZE = 1024 * 1024
+DELTA_SUFFIX = ".delta.json"          # written by exportfile.py --delta
+MERGED_DELTA_SUFFIX = ".merged.json"
+_INCOMPLETE = object()
+_ELEMENT_END = re.compile(r"[ \t\r\n,\]]")
+
+
+# ---------------------- Compact Rows ----------------------
+# Transform output rows are tuples rather than dicts: no per-row hash
+# table, repeated strings (ids, ingredient names) interned to one object,
+# and the derived ingredient/step ids only built when a row is written.
+# row.get(field) and row.as_dict() keep them usable where a dict was.
+class _CompactRow:
+    __slots__ = ()
+    fieldnames = ()
+
+    def csv_values(self):
+        """Values in the table's column order, as the CSV writer takes them."""
+        return self
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def as_dict(self):
+        return dict(zip(self.fieldnames, self.csv_values()))
+
+
+class RecipeRow(_CompactRow, namedtuple("RecipeRow", RECIPE_FIELDS)):
+    __slots__ = ()
+    fieldnames = RECIPE_FIELDS
+
+
+class IngredientRow(_CompactRow, namedtuple("IngredientRow", ["recipe_id", "position", "ingredient_name", "quantity"])):
+    __slots__ = ()
+    fieldnames = INGREDIENT_FIELDS
+
+    @property
+    def ingredient_id(self):
+        return f"{self.recipe_id}_ing{self.position}"
+
+    def csv_values(self):
+        return (self.ingredient_id, self.recipe_id, self.ingredient_name, self.quantity)
+
+
+class StepRow(_CompactRow, namedtuple("StepRow", ["recipe_id", "step_number", "instruction"])):
+    __slots__ = ()
+    fieldnames = STEP_FIELDS
+
+    @property
+    def step_id(self):
+        return f"{self.recipe_id}_step{self.step_number}"
+
+    def csv_values(self):
+        return (self.step_id, self.recipe_id, self.step_number, self.instruction)
+
+
+class InteractionRow(_CompactRow, namedtuple("InteractionRow", INTERACTION_FIELDS)):
+    __slots__ = ()
+    fieldnames = INTERACTION_FIELDS
+
+
+class IngredientDimRow(_CompactRow, namedtuple("IngredientDimRow", INGREDIENT_DIM_FIELDS)):
+    __slots__ = ()
+    fieldnames = INGREDIENT_DIM_FIELDS
+
+
+class RecipeIngredientRow(_CompactRow, namedtuple("RecipeIngredientRow", RECIPE_INGREDIENT_FIELDS)):
+    __slots__ = ()
+    fieldnames = RECIPE_INGREDIENT_FIELDS
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def csv_values(row, fieldnames):
+    """A compact row's values, or a dict row's values in fieldnames order."""
+    if isinstance(row, dict):
+        return [row.get(field, "") for field in fieldnames]
+    return row.csv_values()
+
 
 # ---------------------- Helper Functions ----------------------
 def load_json(file_name):
@@ -8,121 +119,464 @@ def load_json(file_name):
     Load JSON file from current folder.
     """
     file_path = os.path.join(os.getcwd(), file_name)
+    with instrument.stage(f"load:{file_name}", bytes_read=instrument.file_size(file_path)) as st:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        st.rows_out = len(data)
+    return data
+
+def iter_json_array(file_name, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    Only one element (plus one read chunk) is held in memory, so the
+    file size does not matter.
+    """
+    decoder = json.JSONDecoder()
+    file_path = os.path.join(os.getcwd(), file_name)
+
     with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        buf, pos, eof = "", 0, False
+        started = False
+
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"{file_name}: unexpected end of JSON array")
+                buf, pos = f.read(chunk_size), 0
+                eof = not buf
+                continue
+
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"{file_name}: expected a top-level JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                item, end = _INCOMPLETE, len(buf)
+
+            # The element may continue in the next chunk: "1" of "12", or
+            # "1." of "1.5" (which decodes as 1), until something ends it
+            if not eof and _ELEMENT_END.search(buf, end) is None:
+                more = f.read(chunk_size)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+                continue
+
+            if item is _INCOMPLETE:
+                raise ValueError(f"{file_name}: malformed JSON element at offset {pos}")
+
+            yield item
+            pos = end
 
 def save_csv(file_name, fieldnames, rows):
     """
     Save list of dictionaries to CSV.
     """
-    with open(file_name, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+    with instrument.stage(f"save_csv:{file_name}", rows_in=len(rows)) as st:
+        with open(file_name, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(csv_values(row, fieldnames) for row in rows)
+        st.rows_out = len(rows)
+        st.bytes_written = instrument.file_size(file_name)
     print(f"✅ '{file_name}' created with {len(rows)} records.")
 
+def save_parquet(table, rows):
+    """
+    Save list of dictionaries to <table>.parquet/ with the table's typed schema.
+    """
+    with instrument.stage(f"save_parquet:{table}", rows_in=len(rows)) as st:
+        with columnar.ParquetTableWriter(table) as writer:
+            writer.writerows(rows)
+        st.rows_out = len(rows)
+        st.bytes_written = instrument.file_size(f"{table}.parquet")
+
+def save_table(table, rows, parquet=False):
+    save_csv(f"{table}.csv", TABLE_FIELDS[table], rows)
+    if parquet:
+        save_parquet(table, rows)
+    else:
+        columnar.remove_parquet(table)
+
+
+class CsvTableWriter:
+    """
+    Incremental CSV writer that keeps a row count, used by the streaming ETL.
+    With append=True rows are added to an existing file (header only if new).
+    """
+
+    def __init__(self, file_name, fieldnames, append=False):
+        self.file_name = file_name
+        self.append = append
+        self.count = 0
+        is_new = not (append and os.path.exists(file_name) and os.path.getsize(file_name) > 0)
+        self._file = open(file_name, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.fieldnames = fieldnames
+        self._writer = csv.writer(self._file)
+        if is_new:
+            self._writer.writerow(fieldnames)
+
+    def writerow(self, row):
+        self._writer.writerow(csv_values(row, self.fieldnames))
+        self.count += 1
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        self._file.close()
+        if self.append:
+            print(f"✅ '{self.file_name}' appended with {self.count} new records.")
+        else:
+            print(f"✅ '{self.file_name}' created with {self.count} records.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TableWriters:
+    """
+    Fans each row out to the CSV writer and, optionally, the Parquet writer
+    of a table. With a validator, rows failing it go to the reject file
+    instead. A CSV-only rewrite removes the table's Parquet dataset, and
+    an append also extends the dataset when it is the table's source, so
+    the two never disagree.
+    """
+
+    def __init__(self, table, append=False, parquet=False, validator=None):
+        if append:
+            parquet = parquet or columnar.parquet_source(table)
+        elif not parquet:
+            columnar.remove_parquet(table)
+        self.table = table
+        self.validator = validator
+        self.paths = [f"{table}.csv"] + ([f"{table}.parquet"] if parquet else [])
+        # Appends only count the bytes they add
+        self._initial_bytes = sum(instrument.file_size(p) for p in self.paths) if append else 0
+        self.writers = [CsvTableWriter(f"{table}.csv", TABLE_FIELDS[table], append)]
+        if parquet:
+            self.writers.append(columnar.ParquetTableWriter(table, append))
+
+    def writerow(self, row):
+        """Write the row; False if the validator rejected it."""
+        if self.validator is not None and not self.validator.check(self.table, row):
+            return False
+        for writer in self.writers:
+            writer.writerow(row)
+        return True
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    @property
+    def count(self):
+        return self.writers[0].count
+
+    def bytes_written(self):
+        return sum(instrument.file_size(p) for p in self.paths) - self._initial_bytes
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 # ---------------------- Transform Recipes ----------------------
-def transform_recipes(recipes):
+def recipe_to_rows(recipe):
+    """
+    Flatten one recipe document into its recipe, ingredient and step rows.
+    """
+    recipe_id = _intern(recipe.get("id", ""))
+
+    # Recipes table
+    recipe_row = RecipeRow(
+        recipe_id=recipe_id,
+        name=recipe.get("name", ""),
+        category=_intern(recipe.get("category", "")),
+        prep_time=recipe.get("prep_time", ""),   # Included
+        cook_time=recipe.get("cook_time", ""),   # Included
+        servings=recipe.get("servings", ""),
+        difficulty=_intern(recipe.get("difficulty", ""))
+    )
+
+    # Ingredients (nested); ingredient_id is derived from recipe_id + position
+    ingredients_rows = [
+        IngredientRow(recipe_id, i, _intern(ing.get("name", "")), _intern(ing.get("quantity", "")))
+        for i, ing in enumerate(recipe.get("ingredients", []), start=1)
+    ]
+
+    # Steps (nested); step_id is derived from recipe_id + step_number
+    steps_rows = [
+        StepRow(recipe_id, i, step)
+        for i, step in enumerate(recipe.get("steps", []), start=1)
+    ]
+
+    return recipe_row, ingredients_rows, steps_rows
+
+
+def _accept(validator, table, row):
+    return validator is None or validator.check(table, row)
+
+
+def transform_recipes(recipes, validator=None):
     recipes_rows = []
     ingredients_rows = []
     steps_rows = []
 
-    for recipe in recipes:
-        recipe_id = recipe.get("id", "")
-
-        # Recipes table
-        recipes_rows.append({
-            "recipe_id": recipe_id,
-            "name": recipe.get("name", ""),
-            "category": recipe.get("category", ""),
-            "prep_time": recipe.get("prep_time", ""),   # Included
-            "cook_time": recipe.get("cook_time", ""),   # Included
-            "servings": recipe.get("servings", ""),
-            "difficulty": recipe.get("difficulty", "")
-        })
-
-        # Ingredients (nested)
-        for i, ing in enumerate(recipe.get("ingredients", []), start=1):
-            ingredients_rows.append({
-                "ingredient_id": f"{recipe_id}_ing{i}",
-                "recipe_id": recipe_id,
-                "ingredient_name": ing.get("name", ""),
-                "quantity": ing.get("quantity", "")
-            })
-
-        # Steps (nested)
-        for i, step in enumerate(recipe.get("steps", []), start=1):
-            steps_rows.append({
-                "step_id": f"{recipe_id}_step{i}",
-                "recipe_id": recipe_id,
-                "step_number": i,
-                "instruction": step
-            })
+    with instrument.stage("transform:recipes", rows_in=len(recipes)) as st:
+        for recipe in recipes:
+            recipe_row, ing_rows, step_rows = recipe_to_rows(recipe)
+            if _accept(validator, "recipes", recipe_row):
+                recipes_rows.append(recipe_row)
+            ingredients_rows.extend(r for r in ing_rows if _accept(validator, "ingredients", r))
+            steps_rows.extend(r for r in step_rows if _accept(validator, "steps", r))
+        st.rows_out = len(recipes_rows) + len(ingredients_rows) + len(steps_rows)
 
     return recipes_rows, ingredients_rows, steps_rows
 
 
+# ---------------------- Ingredient Dimension ----------------------
+def link_ingredients(ingredients_rows, vocab):
+    """recipe_ingredients rows (recipe_id, integer ingredient_key), one per ingredient row."""
+    return [RecipeIngredientRow(row.recipe_id, vocab.code(row.ingredient_name)) for row in ingredients_rows]
+
+
+def save_ingredient_dim(vocab, parquet=False):
+    """Write ingredient_dim once the ingredients and their links are written."""
+    save_table(DIM_TABLE, [IngredientDimRow(*row) for row in vocab.rows()], parquet)
+    save_links_state(columnar.table_state("ingredients"))
+
+
 # ---------------------- Transform Interactions ----------------------
-def transform_interactions(interactions):
+def interaction_to_row(inter):
+    return InteractionRow(
+        interaction_id=inter.get("id", ""),
+        user_id=_intern(inter.get("user_id", "")),
+        recipe_id=_intern(inter.get("recipe_id", "")),
+        views=inter.get("views", 0),
+        likes=inter.get("likes", 0),
+        rating=inter.get("rating", ""),
+        cook_attempts=inter.get("cook_attempts", 0)
+    )
+
+
+def transform_interactions(interactions, validator=None):
     rows = []
-    for inter in interactions:
-        rows.append({
-            "interaction_id": inter.get("id", ""),
-            "user_id": inter.get("user_id", ""),
-            "recipe_id": inter.get("recipe_id", ""),
-            "views": inter.get("views", 0),
-            "likes": inter.get("likes", 0),
-            "rating": inter.get("rating", ""),
-            "cook_attempts": inter.get("cook_attempts", 0)
-        })
+    with instrument.stage("transform:interactions", rows_in=len(interactions)) as st:
+        for inter in interactions:
+            row = interaction_to_row(inter)
+            if _accept(validator, "interactions", row):
+                rows.append(row)
+        st.rows_out = len(rows)
     return rows
 
 
+# ---------------------- Streaming ETL ----------------------
+def stream_recipes(file_name="recipes.json", append=False, parquet=False, validator=None):
+    """
+    Transform recipes one document at a time, writing all three tables as we go.
+    """
+    # Appends keep the existing ingredient keys stable
+    vocab = IngredientVocabulary.load() if append else IngredientVocabulary()
+
+    with instrument.stage(f"stream:{file_name}", rows_in=0, bytes_read=instrument.file_size(file_name)) as st:
+        with TableWriters("recipes", append, parquet, validator) as recipes_out, \
+             TableWriters("ingredients", append, parquet, validator) as ingredients_out, \
+             TableWriters("steps", append, parquet, validator) as steps_out, \
+             TableWriters(LINK_TABLE, append, parquet) as links_out:
+
+            for recipe in iter_json_array(file_name):
+                recipe_row, ing_rows, step_rows = recipe_to_rows(recipe)
+                recipes_out.writerow(recipe_row)
+                for row in ing_rows:
+                    if ingredients_out.writerow(row):
+                        links_out.writerow(RecipeIngredientRow(row.recipe_id, vocab.code(row.ingredient_name)))
+                steps_out.writerows(step_rows)
+                st.rows_in += 1
+
+        save_ingredient_dim(vocab, parquet)
+        outputs = (recipes_out, ingredients_out, steps_out, links_out)
+        st.rows_out = sum(out.count for out in outputs)
+        st.bytes_written = sum(out.bytes_written() for out in outputs)
+
+
+def stream_interactions(file_name="interactions.json", append=False, parquet=False, validator=None):
+    with instrument.stage(f"stream:{file_name}", rows_in=0, bytes_read=instrument.file_size(file_name)) as st:
+        with TableWriters("interactions", append, parquet, validator) as interactions_out:
+            for inter in iter_json_array(file_name):
+                interactions_out.writerow(interaction_to_row(inter))
+                st.rows_in += 1
+
+        st.rows_out = interactions_out.count
+        st.bytes_written = interactions_out.bytes_written()
+
+
+# ---------------------- Delta Merge ----------------------
+def pending_deltas(collection):
+    """
+    The unmerged delta files of a collection in export order:
+    <collection>.delta.json, then <collection>.delta.1.json, .2, ...
+    """
+    files, n = [], 0
+    delta_file = f"{collection}{DELTA_SUFFIX}"
+    while os.path.exists(delta_file):
+        files.append(delta_file)
+        n += 1
+        delta_file = f"{collection}.delta.{n}.json"
+    return files
+
+
+def merge_deltas(parquet=False, validator=None):
+    """
+    Append the rows from the recipes / interactions delta files (see
+    pending_deltas) to the existing tables, so the cost follows the size
+    of the deltas. Parquet tables get one new part file per delta.
+
+    Delta files only hold documents created after the previous export's
+    high-water mark, so appending never duplicates a row. Each file is
+    renamed to <name>.merged.json once merged, which keeps a re-run from
+    appending it twice.
+    """
+    merged_any = False
+    for collection, stream in (("recipes", stream_recipes), ("interactions", stream_interactions)):
+        delta_files = pending_deltas(collection)
+        if not delta_files:
+            print(f"⚠️ No '{collection}{DELTA_SUFFIX}' to merge")
+            continue
+        for delta_file in delta_files:
+            stream(delta_file, append=True, parquet=parquet, validator=validator)
+            os.replace(delta_file, delta_file[:-len(".json")] + MERGED_DELTA_SUFFIX)
+        merged_any = True
+    return merged_any
+
+
+# ---------------------- Derived Structures ----------------------
+def build_derived(delta=False):
+    """
+    Bring the interaction fact store, the recipe_stats rollup and the
+    ingredient -> recipe index (whose engagement scores come from the
+    rollup) up to date with the written tables; a delta run only adds the
+    new rows to each. Each is its own instrument stage (facts:*,
+    recipe_stats:*, index:*), so --profile shows what they cost.
+    """
+    if delta:
+        update_fact_store()
+        update_recipe_stats()
+        update_index()
+    else:
+        build_fact_store()
+        build_recipe_stats()
+        build_index()
+
+
+def _skip_derived():
+    print("⚠️ Fact store, recipe_stats and ingredient index not updated: the analytics read the tables "
+          "until they are (fact_store.py --update, recipe_stats.py --update, ingredient_index.py update).")
+
+
 # ---------------------- Main ETL (no users.json) ----------------------
-def run_etl():
+def run_etl(stream=False, delta=False, parquet=False, validate=False, derived=True):
+    """
+    Transform the exported JSON into the normalized tables. With
+    validate=True each row is checked as it is produced: bad rows go to
+    rejects.csv and validation_report.csv is written at the end, so no
+    separate validate.py pass is needed. Every mode finishes with
+    build_derived unless derived=False.
+    """
+    if parquet and not columnar.parquet_available():
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+
+    validator = RowValidator(append=delta) if validate else None
+    finish = (lambda: build_derived(delta)) if derived else _skip_derived
+
+    if delta:
+        print("🔄 Merging delta exports...")
+        merge_deltas(parquet, validator)
+        finish()
+        if validator is not None:
+            validator.close()
+        print("🎉 Delta ETL completed successfully (users.json excluded).")
+        return
+
+    if stream:
+        print("🔄 Streaming JSON files...")
+        stream_recipes("recipes.json", parquet=parquet, validator=validator)
+        stream_interactions("interactions.json", parquet=parquet, validator=validator)
+        finish()
+        if validator is not None:
+            validator.close()
+        print("🎉 ETL completed successfully (users.json excluded).")
+        return
+
     print("🔄 Loading JSON files...")
 
     recipes = load_json("recipes.json")
     interactions = load_json("interactions.json")
 
     # ---- Transform Recipes ----
-    recipes_rows, ingredients_rows, steps_rows = transform_recipes(recipes)
-
-    save_csv(
-        "recipes.csv",
-        ["recipe_id", "name", "category", "prep_time", "cook_time", "servings", "difficulty"],
-        recipes_rows
-    )
+    recipes_rows, ingredients_rows, steps_rows = transform_recipes(recipes, validator)
 
-    save_csv(
-        "ingredients.csv",
-        ["ingredient_id", "recipe_id", "ingredient_name", "quantity"],
-        ingredients_rows
-    )
+    save_table("recipes", recipes_rows, parquet)
+    save_table("ingredients", ingredients_rows, parquet)
+    save_table("steps", steps_rows, parquet)
 
-    save_csv(
-        "steps.csv",
-        ["step_id", "recipe_id", "step_number", "instruction"],
-        steps_rows
-    )
+    # ---- Ingredient Dimension ----
+    vocab = IngredientVocabulary()
+    save_table(LINK_TABLE, link_ingredients(ingredients_rows, vocab), parquet)
+    save_ingredient_dim(vocab, parquet)
 
     # ---- Transform Interactions ----
-    interactions_rows = transform_interactions(interactions)
+    interactions_rows = transform_interactions(interactions, validator)
 
-    save_csv(
-        "interactions.csv",
-        ["interaction_id", "user_id", "recipe_id", "views", "likes", "rating", "cook_attempts"],
-        interactions_rows
-    )
+    save_table("interactions", interactions_rows, parquet)
 
+    # ---- Interaction Facts, Recipe Stats & Ingredient -> Recipe Index ----
+    finish()
+
+    if validator is not None:
+        validator.close()
     print("🎉 ETL completed successfully (users.json excluded).")
 
 
 # ---------------------- Run ----------------------
 if __name__ == "__main__":
-    run_etl()
-
-
-
+    parser = argparse.ArgumentParser(description="Transform exported JSON into normalized CSV tables.")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the JSON arrays element by element with flat memory use")
+    parser.add_argument("--delta", action="store_true",
+                        help="append rows from the *.delta.json files written by exportfile.py --delta")
+    parser.add_argument("--parquet", action="store_true",
+                        help="also write typed <table>.parquet/ datasets (needs pyarrow)")
+    parser.add_argument("--validate", action="store_true",
+                        help="validate rows while writing them (rejects.csv + validation_report.csv)")
+    parser.add_argument("--no-derived", dest="derived", action="store_false",
+                        help="skip the fact store, recipe_stats rollup and ingredient index updates")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
 
+    instrument.enable_from_args(args)
+    run_etl(stream=args.stream, delta=args.delta, parquet=args.parquet, validate=args.validate,
+            derived=args.derived)
+    instrument.finish()
@@ -1,104 +1,293 @@
+import argparse
 import csv
-import os
+import json
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+# ---------------------- Validation Rules ----------------------
+# Every required field must be non-empty; numeric fields must parse the way
+# int() / float() would parse the CSV text.
+TABLE_RULES = {
+    "recipes": {
+        "required": ["recipe_id", "name", "category", "prep_time", "cook_time", "servings", "difficulty"],
+    },
+    "ingredients": {
+        "required": ["ingredient_id", "recipe_id", "ingredient_name", "quantity"],
+    },
+    "steps": {
+        "required": ["step_id", "recipe_id", "step_number", "instruction"],
+        "int": ["step_number"],
+    },
+    "interactions": {
+        "required": ["interaction_id", "user_id", "recipe_id", "views", "likes", "rating", "cook_attempts"],
+        "int": ["views", "likes", "cook_attempts"],
+        "float": ["rating"],
+    },
+}
+
+# Literals accepted by int() / float() (underscores, exponents, inf/nan)
+INT_PATTERN = r"\s*[+-]?\d(?:_?\d)*\s*"
+FLOAT_PATTERN = (
+    r"\s*[+-]?(?:"
+    r"(?:\d(?:_?\d)*\.?(?:\d(?:_?\d)*)?|\.\d(?:_?\d)*)(?:[eE][+-]?\d(?:_?\d)*)?"
+    r"|inf|infinity|nan"
+    r")\s*"
+)
+
+ValidationResult = namedtuple("ValidationResult", ["valid", "invalid", "failures"])
+
+REPORT_FILE = "validation_report.csv"
+RULE_REPORT_FILE = "validation_rules_report.csv"
+
 
 # ---------------------- Helper: Load CSV ----------------------
 def load_csv(file_name):
-    rows = []
-    with open(file_name, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows.append(row)
-    return rows
-
-# ---------------------- Validation Functions ----------------------
-
-def validate_recipes(rows):
-    required = ["recipe_id", "name", "category", "prep_time", "cook_time", "servings", "difficulty"]
-
-    valid = 0
-    invalid = 0
-
-    for r in rows:
-        if any(r[field] in ("", None) for field in required):
-            invalid += 1
-        else:
-            valid += 1
+    """
+    Load a CSV as raw text columns: nothing is type-inferred and empty
+    fields stay "" so the rules see exactly what is in the file.
+    """
+    with instrument.stage(f"load:{file_name}", bytes_read=instrument.file_size(file_name)) as st:
+        df = pd.read_csv(file_name, dtype=str, keep_default_na=False)
+        st.rows_out = len(df)
+    return df
+
+
+# ---------------------- Column Checks ----------------------
+# Each check takes a column and returns a numpy boolean mask over its rows.
+def _is_missing(df, field):
+    if field not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    col = df[field]
+    return (col.isna() | (col == "")).to_numpy()
+
+
+def _matches(values, pattern, **kwargs):
+    return values.str.fullmatch(pattern, **kwargs).fillna(False).to_numpy(dtype=bool)
+
+
+def _parses_as_int(values):
+    parsed = pd.to_numeric(values, errors="coerce")
+    if pd.api.types.is_integer_dtype(parsed):
+        # Fast path: every value was an integer literal
+        return np.ones(len(values), dtype=bool)
+    return _matches(values, INT_PATTERN)
+
+
+def _parses_as_float(values):
+    ok = pd.to_numeric(values, errors="coerce").notna().to_numpy()
+    if not ok.all():
+        # nan/inf literals and underscores are valid for float() too
+        rest = ~ok
+        ok[rest] = _matches(values[rest], FLOAT_PATTERN, case=False)
+    return ok
+
+
+def validate_table(df, rules):
+    """
+    Check every rule as a column operation over the whole table.
+
+    Returns a ValidationResult with the valid/invalid row counts and, per
+    failing rule ("required:<field>", "int:<field>", "float:<field>"), the
+    0-based indices of the data rows that failed it. A numeric rule only
+    fails on non-empty values, since empty ones already fail "required".
+    """
+    failed = {}
+    for field in rules.get("required", []):
+        failed[f"required:{field}"] = _is_missing(df, field)
+
+    for kind, check in (("int", _parses_as_int), ("float", _parses_as_float)):
+        for field in rules.get(kind, []):
+            present = ~_is_missing(df, field)
+            bad = np.zeros(len(df), dtype=bool)
+            if present.any():
+                bad[present] = ~check(df.loc[present, field].astype(str))
+            failed[f"{kind}:{field}"] = bad
+
+    any_failed = np.zeros(len(df), dtype=bool)
+    for mask in failed.values():
+        any_failed |= mask
+
+    failures = {
+        rule: np.flatnonzero(mask).tolist()
+        for rule, mask in failed.items()
+        if mask.any()
+    }
+    invalid = int(any_failed.sum())
+    return ValidationResult(len(df) - invalid, invalid, failures)
+
+
+# ---------------------- Row Checks (used inside the ETL) ----------------------
+def _csv_text(value):
+    # What the csv module writes for this value
+    return "" if value is None else str(value)
+
+
+def check_row(row, rules):
+    """
+    Return the rules a single row fails, with the same semantics as
+    validate_table applied to the CSV text of the row.
+    """
+    failed = []
+    for field in rules.get("required", []):
+        if _csv_text(row.get(field)) == "":
+            failed.append(f"required:{field}")
+
+    for kind, parse in (("int", int), ("float", float)):
+        for field in rules.get(kind, []):
+            text = _csv_text(row.get(field))
+            if text == "":
+                continue
+            try:
+                parse(text)
+            except ValueError:
+                failed.append(f"{kind}:{field}")
+    return failed
+
+
+class RowValidator:
+    """
+    Validation hook for the ETL: checks each row as it is produced,
+    diverts failing rows to a reject file and keeps the counts for
+    validation_report.csv, so pipeline runs skip the separate read pass.
+
+    Failing row indices are positions in the transform output of each
+    table (rejected rows included), not lines of the written CSV. With
+    append=True (delta runs) the counts and failing rows of the existing
+    reports are carried over and new indices continue after them, like
+    the rows appended to the reject file.
+
+    Tables may be checked from different threads (one thread per table).
+    """
+
+    def __init__(self, reject_file="rejects.csv", append=False):
+        self.reject_file = reject_file
+        self._counts = {table: [0, 0] for table in TABLE_RULES}
+        self._failures = {table: {} for table in TABLE_RULES}
+        if append:
+            for table, result in read_reports().items():
+                if table in self._counts:
+                    self._counts[table] = [result.valid, result.invalid]
+                    self._failures[table] = result.failures
+        self._file = open(reject_file, "a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._lock = threading.Lock()
+        if self._file.tell() == 0:
+            self._writer.writerow(["collection", "rules", "record"])
+
+    def check(self, table, row):
+        """Return True if the row is valid; otherwise record it as a reject."""
+        counts = self._counts[table]
+        index = counts[0] + counts[1]
+        failed = check_row(row, TABLE_RULES[table])
+        if not failed:
+            counts[0] += 1
+            return True
+
+        counts[1] += 1
+        for rule in failed:
+            self._failures[table].setdefault(rule, []).append(index)
+        record = row if isinstance(row, dict) else row.as_dict()
+        line = [table, " ".join(failed), json.dumps(record, ensure_ascii=False, default=str)]
+        with self._lock:
+            self._writer.writerow(line)
+        return False
+
+    def results(self):
+        return {
+            table: ValidationResult(valid, invalid, self._failures[table])
+            for table, (valid, invalid) in self._counts.items()
+        }
+
+    def close(self):
+        """Close the reject file and write the same reports as run_validation."""
+        self._file.close()
+        results = self.results()
+        write_validation_report(results)
+        write_rule_report(results)
+        rejected = sum(result.invalid for result in results.values())
+        print(f"🚫 {rejected} rejected rows written to '{self.reject_file}'")
+        return results
 
-    return valid, invalid
 
+# ---------------------- Validation Functions ----------------------
+def _validate(table, df):
+    with instrument.stage(f"validate:{table}", rows_in=len(df)) as st:
+        result = validate_table(df, TABLE_RULES[table])
+        st.rows_out = result.valid
+    return result
 
-def validate_ingredients(rows):
-    required = ["ingredient_id", "recipe_id", "ingredient_name", "quantity"]
 
-    valid = 0
-    invalid = 0
+def validate_recipes(df):
+    return _validate("recipes", df)
 
-    for r in rows:
-        if any(r[field] in ("", None) for field in required):
-            invalid += 1
-        else:
-            valid += 1
 
-    return valid, invalid
+def validate_ingredients(df):
+    return _validate("ingredients", df)
 
 
-def validate_steps(rows):
-    required = ["step_id", "recipe_id", "step_number", "instruction"]
+def validate_steps(df):
+    # step_number should be numeric
+    return _validate("steps", df)
 
-    valid = 0
-    invalid = 0
 
-    for r in rows:
-        # step_number should be numeric
-        if any(r[field] in ("", None) for field in required):
-            invalid += 1
-            continue
+def validate_interactions(df):
+    # Validate numeric fields
+    return _validate("interactions", df)
 
-        try:
-            int(r["step_number"])
-            valid += 1
-        except:
-            invalid += 1
 
-    return valid, invalid
+# ---------------------- Write Final Validation CSV ----------------------
+def write_validation_report(results):
+    output_file = REPORT_FILE
 
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["collection", "valid", "invalid"])
 
-def validate_interactions(rows):
-    required = ["interaction_id", "user_id", "recipe_id", "views", "likes", "rating", "cook_attempts"]
+        for collection, result in results.items():
+            writer.writerow([collection, result.valid, result.invalid])
 
-    valid = 0
-    invalid = 0
+    print(f"✅ Validation completed. Report saved as '{output_file}'")
 
-    for r in rows:
-        if any(r[field] in ("", None) for field in required):
-            invalid += 1
-            continue
 
-        # Validate numeric fields
-        try:
-            int(r["views"])
-            int(r["likes"])
-            float(r["rating"])
-            int(r["cook_attempts"])
-            valid += 1
-        except:
-            invalid += 1
+def write_rule_report(results):
+    """
+    Per-rule failure counts and the failing row indices (0-based, header excluded).
+    """
+    output_file = RULE_REPORT_FILE
 
-    return valid, invalid
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["collection", "rule", "failures", "failed_rows"])
 
+        for collection, result in results.items():
+            for rule, rows in result.failures.items():
+                writer.writerow([collection, rule, len(rows), " ".join(map(str, rows))])
 
-# ---------------------- Write Final Validation CSV ----------------------
-def write_validation_report(results):
-    output_file = "validation_report.csv"
+    print(f"✅ Rule failures saved as '{output_file}'")
 
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["collection", "valid", "invalid"])
 
-        for collection, (valid_count, invalid_count) in results.items():
-            writer.writerow([collection, valid_count, invalid_count])
+def read_reports():
+    """The results stored in the two report files ({} if there is no report)."""
+    try:
+        with open(REPORT_FILE, "r", newline="", encoding="utf-8") as f:
+            counts = {row["collection"]: (int(row["valid"]), int(row["invalid"])) for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return {}
 
-    print(f"✅ Validation completed. Report saved as '{output_file}'")
+    failures = {table: {} for table in counts}
+    try:
+        with open(RULE_REPORT_FILE, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                rows = [int(index) for index in row["failed_rows"].split()]
+                failures.setdefault(row["collection"], {})[row["rule"]] = rows
+    except FileNotFoundError:
+        pass
+    return {table: ValidationResult(valid, invalid, failures[table]) for table, (valid, invalid) in counts.items()}
 
 
 # ---------------------- Main ----------------------
@@ -120,19 +309,19 @@ def run_validation():
         "interactions": validate_interactions(interactions)
     }
 
-    # Create final CSV
+    # Create final CSVs
     write_validation_report(results)
+    write_rule_report(results)
 
     print("\n🎉 Validation completed successfully!")
 
 
 # ---------------------- Run ----------------------
 if __name__ == "__main__":
-    run_validation()
-
-
-
-
-
-
+    parser = argparse.ArgumentParser(description="Validate the normalized CSV tables.")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
 
+    instrument.enable_from_args(args)
+    run_validation()
+    instrument.finish()